@@ -12,6 +12,8 @@ from pathlib import Path
 import numpy as np
 import pandas as pd
 
+from utils.export import write_tables_file
+
 # ========= CONFIG =========
 BASE_DIR = Path()
 F_NECT = BASE_DIR / "NectarinAm.xlsx"
@@ -20,6 +22,7 @@ F_DIS = BASE_DIR / "Disminucion.xlsx"
 F_CRU = BASE_DIR / "Cruce de Variables.xlsx"
 OUT_XLSX = BASE_DIR / "Asignacion_NectarinAm_por_MercadoCliente.xlsx"
 CHECK_LOTE = None  # ej. 806 para crear hoja "Check_806"; None para omitir
+OUT_FORMATOS = ["xlsx"]  # además: "parquet", "arrow", "csv" (zip con manifest.json)
 
 
 # ========= UTILIDADES =========
@@ -302,6 +305,12 @@ def build_check_sheet_for_lote(lote_id: int) -> pd.DataFrame:
 
 
 # ========= ESCRITURA =========
+# Formatos columnares para sistemas downstream (mismas tablas que el Excel)
+for formato in OUT_FORMATOS:
+    if formato != "xlsx":
+        hojas = [("AsignacionDetalle", detalle), ("ResumenMC", res_mc), ("ResumenLote", res_lote)]
+        print(f"Archivo generado: {write_tables_file(hojas, OUT_XLSX, formato).resolve()}")
+
 # Seleccionar motor disponible
 try:
     import xlsxwriter  # noqa
@@ -310,15 +319,16 @@ try:
 except ImportError:
     writer_engine = "openpyxl"  # requiere 'pip install openpyxl'
 
-with pd.ExcelWriter(OUT_XLSX, engine=writer_engine) as xw:
-    detalle.to_excel(xw, index=False, sheet_name="AsignacionDetalle")
-    res_mc.to_excel(xw, index=False, sheet_name="ResumenMC")
-    res_lote.to_excel(xw, index=False, sheet_name="ResumenLote")
-    if CHECK_LOTE is not None:
-        build_check_sheet_for_lote(CHECK_LOTE).to_excel(
-            xw,
-            index=False,
-            sheet_name=f"Check_{CHECK_LOTE}",
-        )
-
-print(f"Archivo generado: {OUT_XLSX.resolve()}")
+if "xlsx" in OUT_FORMATOS:
+    with pd.ExcelWriter(OUT_XLSX, engine=writer_engine) as xw:
+        detalle.to_excel(xw, index=False, sheet_name="AsignacionDetalle")
+        res_mc.to_excel(xw, index=False, sheet_name="ResumenMC")
+        res_lote.to_excel(xw, index=False, sheet_name="ResumenLote")
+        if CHECK_LOTE is not None:
+            build_check_sheet_for_lote(CHECK_LOTE).to_excel(
+                xw,
+                index=False,
+                sheet_name=f"Check_{CHECK_LOTE}",
+            )
+
+    print(f"Archivo generado: {OUT_XLSX.resolve()}")
@@ -2,13 +2,58 @@
 Carozosapp - Sistema de asignación de frutas
 """
 
-from io import BytesIO
+import functools
+import os
+import threading
+import time
 
-import pandas as pd
 import streamlit as st
 
-from utils.data_loader import get_especies_disponibles, get_lineas_producto
-from utils.processor import process_species_linea
+from utils.cache import LRUCache, PipelineCache
+from utils.cluster_editor import EditJournal, update_clusters
+from utils.cluster_processor import CLUSTER_METHODS
+from utils.data_loader import get_especies_disponibles
+from utils.detalle import (
+    columnas_orden,
+    filtrar_detalle,
+    ordenar_posiciones,
+    pagina_detalle,
+    reglas_fallidas,
+)
+from utils.diagnostico import (
+    desglose_etapas,
+    memoria_mb,
+    motor_evaluacion,
+    tamanos_entrada,
+)
+from utils.diff import diff_results
+from utils.export import (
+    FORMATOS_EXPORT,
+    XLSX_MIME,
+    ediciones_to_excel_bytes,
+    resultados_to_bytes,
+    write_tables_bytes,
+)
+from utils.instrumentation import Instrumentacion
+from utils.jobs import JobManager
+from utils.reglas import resumen_reglas
+from utils.store import ResultStore
+from utils.watcher import InputWatcher
+
+# Almacén persistente de análisis (resultados por hash de entradas y parámetros)
+STORE_DIR = ".carozos_store"
+# Presupuesto de memoria de la caché compartida por todas las sesiones
+MEMORIA_MB = int(os.environ.get("CAROZOS_MEMORIA_MB", "1024"))
+# Origen de las tolerancias: 'especie' (Tolerancia_*.xlsx) o 'consolidado' (utils.tolerancias_total)
+TOLERANCIAS = os.environ.get("CAROZOS_TOLERANCIAS", "especie")
+# Motor de evaluación de reglas de la asignación (ver utils.data_processor.MOTORES_ASIGNACION)
+MOTOR = os.environ.get("CAROZOS_MOTOR", "filas")
+# Segundos entre revisiones de los archivos de entrada (0 = sin vigilancia)
+VIGILAR_SEGUNDOS = float(os.environ.get("CAROZOS_VIGILAR_SEGUNDOS", "5"))
+# Latencia objetivo por interacción (ms) con los resultados ya en caché
+LATENCIA_OBJETIVO_MS = 100
+# Snapshot de la capa de carga (Excel parseados de todas las especies) para el warm-up
+SNAPSHOT_PATH = ".carozos_snapshot.pkl"
 
 # Configuración de página
 st.set_page_config(
@@ -17,24 +62,275 @@ st.set_page_config(
     layout="wide",
     initial_sidebar_state="expanded",
 )
+_inicio_app = time.perf_counter()
+
+
+@st.cache_resource
+def get_arranque():
+    """Tiempos de arranque del servidor, medidos desde su primera ejecución de la app."""
+    return {
+        "inicio": time.time(),
+        "warmup": None,
+        "primer_interactivo": None,
+        "primer_resultado": None,
+        "watcher": None,
+    }
+
+
+arranque = get_arranque()
+
+
+@st.cache_resource
+def get_job_manager():
+    """Pool de procesos en segundo plano compartido por las sesiones."""
+    return JobManager()
+
+
+@st.cache_resource
+def get_export_cache():
+    """Exportaciones generadas, por (run_id, formato); se generan solo al pedir la descarga."""
+    return LRUCache(8)
+
+
+@st.cache_data(max_entries=8, show_spinner=False)
+def comparar_runs(id_a, id_b):
+    """Diff entre dos análisis guardados (por id, sin hashear los DataFrames)."""
+    pipeline = get_pipeline_cache()
+    return diff_results(pipeline.load_run(id_a), pipeline.load_run(id_b))
+
+
+@st.cache_resource
+def get_pipeline_cache():
+    """Caché del pipeline compartida por todas las sesiones del servidor.
+
+    Carga, asignación y clustering se memoizan por separado (LRU acotada), de modo
+    que cambiar K o los percentiles solo re-ejecuta el clustering. Los resultados
+    se guardan además en disco, así que sobreviven al fin de la sesión.
+
+    Todas las sesiones referencian los mismos resultados: cada sesión guarda solo
+    los parámetros de su análisis y un journal de sus ediciones por celda.
+
+    Al crearse lanza el warm-up en segundo plano: precarga los Excel de todas
+    las especies (desde el snapshot si está al día), así la primera sesión no
+    espera el parseo.
+    """
+    pipeline = PipelineCache(
+        store=ResultStore(STORE_DIR),
+        max_bytes=MEMORIA_MB * 2**20,
+        tolerancias=TOLERANCIAS,
+    )
+    threading.Thread(target=_warmup, args=(pipeline, get_arranque()), daemon=True).start()
+    return pipeline
+
+
+def _warmup(pipeline, arranque):
+    resumen = pipeline.warm(snapshot=SNAPSHOT_PATH)
+    # Si alguna especie se leyó de Excel, el snapshot se reescribe para el próximo inicio
+    if any(e["origen"] == "excel" for e in resumen["especies"].values()):
+        pipeline.write_snapshot(SNAPSHOT_PATH)
+    arranque["warmup"] = resumen
+    # Archivos de Data/ reemplazados durante el día: se invalida y reconstruye lo
+    # que dependía de ellos, y el snapshot queda al día para el próximo inicio
+    if VIGILAR_SEGUNDOS > 0:
+        arranque["watcher"] = InputWatcher(
+            pipeline,
+            intervalo=VIGILAR_SEGUNDOS,
+            reconstruir=True,
+            on_cambio=lambda _evento: pipeline.write_snapshot(SNAPSHOT_PATH),
+        ).start()
+
 
 # Título principal
 st.title("🍑 Carozosapp - Tolerancias por Clusters")
 st.markdown("---")
 
-# Session State
-if "resultados" not in st.session_state:
-    st.session_state.resultados = None
+# Session State: la sesión guarda solo los parámetros del análisis (los
+# resultados viven en la caché compartida) y el journal de ediciones
+if "analisis" not in st.session_state:
+    st.session_state.analisis = None
+
+if "journal" not in st.session_state:
+    st.session_state.journal = None
+
+# Análisis cuyos resultados ya no se pudieron recuperar (ver resultados_sesion)
+if "analisis_perdido" not in st.session_state:
+    st.session_state.analisis_perdido = None
 
 if "configuracion" not in st.session_state:
     st.session_state.configuracion = {
         "especie": None,
         "linea_producto": None,
         "clusters": 5,
+        "metodo": "quantiles",
         "qmin": [0.9, 0.7, 0.5, 0.3, 0.1],
         "qmax": [0.1, 0.3, 0.5, 0.7, 0.9],
     }
 
+if "job" not in st.session_state:
+    st.session_state.job = None
+
+if "ultimo_job" not in st.session_state:
+    st.session_state.ultimo_job = None
+
+# Duración de la última ejecución de la app y de cada sección (ms)
+if "latencias" not in st.session_state:
+    st.session_state.latencias = {}
+
+
+def ejecutar_pipeline(pipeline, progress=None, cancel=None, **params):
+    """Pipeline completo (se ejecuta en segundo plano), con medición por etapa."""
+    return pipeline.run(
+        progress=progress,
+        cancel=cancel,
+        instrumentacion=Instrumentacion(),
+        **params,
+    )
+
+
+def enviar_analisis(**params):
+    """Lanza el análisis en segundo plano y re-ejecuta la app para mostrar el avance."""
+    params.setdefault("motor", MOTOR)
+    st.session_state.ultimo_job = None
+    st.session_state.job = get_job_manager().submit(
+        ejecutar_pipeline,
+        pipeline=get_pipeline_cache(),
+        **params,
+    )
+    st.rerun()
+
+
+def descarga_diferida(clave, generar):
+    """Callable para st.download_button: genera el archivo recién al descargar.
+
+    El resultado se guarda en la caché de exportaciones bajo `clave` (basada en
+    run_id), sin hashear el contenido de los DataFrames.
+    """
+    exportaciones = get_export_cache()
+    return lambda: exportaciones.get_or_compute(clave, generar)[0]
+
+
+def medir_latencia(nombre):
+    """Registra en la sesión la duración (ms) de cada ejecución de una sección.
+
+    Se aplica a los fragmentos, que se re-ejecutan solos al interactuar con
+    sus widgets, para verificar la latencia por interacción.
+    """
+
+    def decorador(func):
+        @functools.wraps(func)
+        def envoltura(*args, **kwargs):
+            t0 = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                st.session_state.latencias[nombre] = (time.perf_counter() - t0) * 1000
+
+        return envoltura
+
+    return decorador
+
+
+def _finalizar_job(job):
+    """Incorpora el resultado del proceso terminado a la sesión."""
+    st.session_state.job = None
+    st.session_state.ultimo_job = {
+        "estado": job.estado,
+        "duracion": job.duracion,
+        "error": job.error,
+        "cache": job.resultado["cache"] if job.resultado else {},
+        "run_id": job.resultado["run_id"] if job.resultado else None,
+        "instrumentacion": job.resultado.get("instrumentacion") if job.resultado else None,
+    }
+    if job.estado == "completado":
+        params = {k: v for k, v in job.kwargs.items() if k != "pipeline"}
+        anterior = st.session_state.analisis
+        if anterior is None or anterior["run_id"] != job.resultado["run_id"]:
+            st.session_state.journal = None
+        st.session_state.analisis = {"run_id": job.resultado["run_id"], "params": params}
+        st.session_state.analisis_perdido = None
+        if arranque["primer_resultado"] is None:
+            arranque["primer_resultado"] = job.duracion
+    # El job ya no retiene los resultados: quedan solo en la caché compartida
+    get_job_manager().forget(job.id)
+    job.resultado = None
+
+
+def resultados_sesion():
+    """Resultados del análisis de la sesión, por su run_id, desde la caché compartida.
+
+    Si fueron expulsados de memoria se recuperan del store; nunca se recalculan
+    en el hilo de la app. Si ya no están disponibles (archivo de entrada movido
+    o modificado) se descarta el análisis de la sesión y se ofrece re-enviarlo.
+    """
+    analisis = st.session_state.analisis
+    if analisis is None:
+        return None
+    try:
+        with st.spinner("Recuperando resultados..."):
+            resultados = get_pipeline_cache().resultado(analisis["run_id"])
+        if resultados is None:
+            raise ValueError(f"El análisis {analisis['run_id']} ya no está en memoria ni guardado")
+    except (FileNotFoundError, ValueError) as e:
+        st.session_state.analisis = None
+        st.session_state.journal = None
+        st.session_state.analisis_perdido = {"params": analisis["params"], "motivo": str(e)}
+        return None
+    return resultados
+
+
+def aviso_analisis_perdido():
+    """Aviso del análisis que ya no se pudo recuperar, con opción de re-enviarlo."""
+    perdido = st.session_state.analisis_perdido
+    if perdido is None:
+        return
+    st.warning(
+        f"⚠️ Los resultados del análisis ya no están disponibles: {perdido['motivo']}. "
+        "Re-envíelo para calcularlo con los archivos actuales.",
+    )
+    if st.button("🔄 Re-enviar análisis", disabled=st.session_state.job is not None):
+        st.session_state.analisis_perdido = None
+        enviar_analisis(**perdido["params"])
+
+
+_job = st.session_state.job
+_intervalo_job = 0.5 if _job is not None and not _job.terminado else None
+
+
+@st.fragment(run_every=_intervalo_job)
+def panel_job():
+    """Barra de avance del proceso en curso, con opción de cancelar."""
+    job = st.session_state.job
+    if job is None:
+        return
+    if job.terminado:
+        _finalizar_job(job)
+        st.rerun()
+    st.progress(
+        job.avance,
+        text=f"Procesando... etapa: {job.descripcion_etapa()} · {job.duracion:.0f} s",
+    )
+    if st.button("⛔ Cancelar", key=f"cancelar_{job.id}"):
+        job.cancel()
+        st.info("Cancelando...")
+
+
+@st.fragment(run_every=_intervalo_job)
+def panel_parcial():
+    """Resumen por mercado-cliente parcial a medida que se completan shards de lotes."""
+    job = st.session_state.job
+    if job is None or job.terminado:
+        return
+    st.progress(job.avance, text=f"Procesando... etapa: {job.descripcion_etapa()}")
+    parcial = job.parcial.get("evaluacion")
+    if parcial and "resumen_mc" in parcial:
+        st.subheader("⏳ Resumen parcial por Mercado-Cliente")
+        if "total_filas" in parcial:
+            st.caption(
+                f"{parcial['filas']:,} de {parcial['total_filas']:,} combinaciones lote × MC evaluadas",
+            )
+        st.dataframe(parcial["resumen_mc"], use_container_width=True)
+
+
 # Sidebar - Información
 with st.sidebar:
     st.header("ℹ️ Información")
@@ -51,13 +347,18 @@ with st.sidebar:
     st.markdown("---")
     st.markdown("**Desarrollado por:** Carozosapp Team")
 
-# Pestañas principales
-tab1, tab2, tab3, tab4 = st.tabs(
-    ["📥 Carga de Datos", "⚙️ Configuración", "📊 Resultados", "✏️ Edición"],
-)
+# Cada pestaña (y cada editor) es un fragmento: un widget re-ejecuta solo su
+# fragmento. Lo que cambia el estado de otras pestañas (selección, lanzar un
+# análisis, deshacer) pide una re-ejecución completa con st.rerun().
+
+
+@st.fragment
+@medir_latencia("seleccion")
+def seccion_seleccion():
+    """Pestaña 'Carga de Datos': especie, línea y análisis guardados."""
+    configuracion = st.session_state.configuracion
+    seleccion_previa = (configuracion["especie"], configuracion["linea_producto"])
 
-# TAB 1: Carga de Datos
-with tab1:
     st.header("Selección de Especie y Línea de Producto")
 
     col1, col2 = st.columns(2)
@@ -78,12 +379,12 @@ with tab1:
             ),
             help="Seleccione la especie frutícola a procesar",
         )
-        st.session_state.configuracion["especie"] = especie_seleccionada
+        configuracion["especie"] = especie_seleccionada
 
     with col2:
         if especie_seleccionada:
             try:
-                lineas = get_lineas_producto(especie_seleccionada)
+                lineas = get_pipeline_cache().lineas(especie_seleccionada)
                 if len(lineas) == 0:
                     st.warning("⚠️ No se encontraron líneas de producto para esta especie")
                     linea_seleccionada = None
@@ -102,13 +403,18 @@ with tab1:
                         ),
                         help="Seleccione la línea de producto específica",
                     )
-                    st.session_state.configuracion["linea_producto"] = linea_seleccionada
+                    configuracion["linea_producto"] = linea_seleccionada
             except Exception as e:
                 st.error(f"❌ Error al cargar líneas de producto: {e!s}")
                 linea_seleccionada = None
         else:
             linea_seleccionada = None
 
+    # La configuración depende de la selección: al cambiarla se re-ejecuta la app
+    seleccion = (configuracion["especie"], configuracion["linea_producto"])
+    if seleccion_previa[0] is not None and seleccion != seleccion_previa:
+        st.rerun()
+
     st.markdown("---")
 
     # Información sobre selección
@@ -118,8 +424,54 @@ with tab1:
             "💡 Continúe a la pestaña 'Configuración' para ajustar los parámetros del análisis.",
         )
 
-# TAB 2: Configuración
-with tab2:
+    # Análisis guardados en el store persistente
+    store = get_pipeline_cache().store
+    guardados = store.list_runs(tipo="clusters") if store is not None else None
+    if guardados is not None and not guardados.empty:
+        with st.expander(f"🗂️ Análisis guardados ({len(guardados)})", expanded=False):
+            st.dataframe(
+                guardados[
+                    [
+                        "id",
+                        "especie",
+                        "linea_producto",
+                        "k",
+                        "method",
+                        "qmin",
+                        "qmax",
+                        "creado",
+                        "ultimo_acceso",
+                    ]
+                ],
+                use_container_width=True,
+                hide_index=True,
+            )
+            run_guardado = st.selectbox(
+                "Análisis:",
+                options=guardados["id"].tolist(),
+                format_func=lambda rid: (
+                    "{especie} · {linea_producto} · K={k} · {method} ({creado})".format(
+                        **guardados.set_index("id").loc[rid].to_dict(),
+                    )
+                ),
+            )
+            if st.button("📂 Cargar análisis", key="cargar_guardado"):
+                meta = guardados.set_index("id").loc[run_guardado]
+                # Con los mismos archivos de entrada se lee del store en milisegundos
+                enviar_analisis(
+                    especie=meta["especie"],
+                    linea_producto=meta["linea_producto"],
+                    k=int(meta["k"]),
+                    qmin=list(meta["qmin"]) if meta["qmin"] else None,
+                    qmax=list(meta["qmax"]) if meta["qmax"] else None,
+                    method=meta["method"],
+                )
+
+
+@st.fragment
+@medir_latencia("configuracion")
+def seccion_configuracion():
+    """Pestaña 'Configuración': K, método, percentiles y lanzamiento del análisis."""
     st.header("Configuración de Clusters y Percentiles")
 
     if (
@@ -152,6 +504,20 @@ with tab2:
                 "💡 **Nota:** Si hay valores duplicados de kilos asignables, el número real de clusters puede ser menor que K. El sistema ajustará automáticamente.",
             )
 
+            metodos = list(CLUSTER_METHODS)
+            metodo = st.selectbox(
+                "Método de Clustering:",
+                options=metodos,
+                index=metodos.index(st.session_state.configuracion.get("metodo", "quantiles")),
+                format_func=lambda m: {
+                    "quantiles": "Cuantiles (rango)",
+                    "ckmeans": "K-means 1-D óptimo (Ckmeans)",
+                    "jenks": "Cortes naturales (Jenks)",
+                }.get(m, m),
+                help="Cuantiles divide por ranking; Ckmeans/Jenks minimiza la varianza intra-cluster de los kilos asignables (mejor con distribuciones sesgadas).",
+            )
+            st.session_state.configuracion["metodo"] = metodo
+
         with col2:
             st.markdown("**Configuración de Percentiles**")
             st.markdown(
@@ -218,34 +584,48 @@ with tab2:
 
         st.markdown("---")
 
-        # Botón de procesamiento
-        if st.button("🔄 Procesar Análisis", type="primary", use_container_width=True):
-            with st.spinner("Procesando datos... Esto puede tardar unos segundos."):
-                try:
-                    resultados = process_species_linea(
-                        especie=st.session_state.configuracion["especie"],
-                        linea_producto=st.session_state.configuracion["linea_producto"],
-                        k=k,
-                        qmin=qmin_values,
-                        qmax=qmax_values,
-                    )
-                    st.session_state.resultados = resultados
-                    st.success("✅ Análisis completado exitosamente!")
-                    st.balloons()
-                except Exception as e:
-                    st.error(f"❌ Error al procesar: {e!s}")
-                    st.exception(e)
-
-# TAB 3: Resultados
-with tab3:
-    st.header("Resultados del Análisis")
+        # Botón de procesamiento: el análisis corre en segundo plano
+        job_activo = st.session_state.job is not None and not st.session_state.job.terminado
+        if st.button(
+            "🔄 Procesar Análisis",
+            type="primary",
+            use_container_width=True,
+            disabled=job_activo,
+        ):
+            enviar_analisis(
+                especie=st.session_state.configuracion["especie"],
+                linea_producto=st.session_state.configuracion["linea_producto"],
+                k=k,
+                qmin=qmin_values,
+                qmax=qmax_values,
+                method=metodo,
+            )
 
-    if st.session_state.resultados is None:
+        panel_job()
+
+        ultimo = st.session_state.ultimo_job
+        if ultimo is not None and ultimo["estado"] == "completado":
+            st.success(f"✅ Análisis completado exitosamente en {ultimo['duracion']:.1f} s!")
+            st.caption(
+                "Caché: "
+                + " · ".join(f"{etapa} {estado}" for etapa, estado in ultimo["cache"].items()),
+            )
+        elif ultimo is not None and ultimo["estado"] == "cancelado":
+            st.warning("⛔ Análisis cancelado. Se mantienen los resultados anteriores.")
+        elif ultimo is not None and ultimo["estado"] == "error":
+            st.error(f"❌ Error al procesar: {ultimo['error']!s}")
+            st.exception(ultimo["error"])
+
+
+@st.fragment
+@medir_latencia("resultados")
+def seccion_resultados(resultados):
+    """Pestaña 'Resultados': tablas del análisis y descarga."""
+    if resultados is None:
         st.info(
             "ℹ️ No hay resultados disponibles. Por favor, realice el análisis en la pestaña 'Configuración'.",
         )
     else:
-        resultados = st.session_state.resultados
         clusters = resultados["clusters"]
 
         # Resumen de configuración
@@ -263,6 +643,13 @@ with tab3:
         # Resumen de Clusters
         st.subheader("📊 Resumen de Clusters")
         st.dataframe(clusters["clusters_summary"], use_container_width=True)
+        if "clusters_calidad" in clusters:
+            calidad = clusters["clusters_calidad"].iloc[0]
+            st.caption(
+                f"Método: **{calidad['METODO']}** · Varianza intra-cluster: "
+                f"{calidad['VARIANZA_INTRA']:,.2f} · Varianza explicada: "
+                f"{calidad['VARIANZA_EXPLICADA']:.1%}",
+            )
 
         st.markdown("---")
 
@@ -305,345 +692,654 @@ with tab3:
 
         st.markdown("---")
 
-        # Descarga de Excel
+        # Descarga de resultados (Excel o formatos columnares)
         st.subheader("💾 Descargar Resultados")
 
-        @st.cache_data
-        def to_excel_bytes(resultados):
-            """Convierte resultados a Excel en memoria."""
-            output = BytesIO()
-            with pd.ExcelWriter(output, engine="xlsxwriter") as writer:
-                # Clusters
-                resultados["clusters"]["clusters_mc"].to_excel(
-                    writer,
-                    sheet_name="ClustersMC",
-                    index=False,
-                )
-                resultados["clusters"]["clusters_summary"].to_excel(
-                    writer,
-                    sheet_name="Clusters_Summary",
-                    index=False,
-                )
+        col_formato, col_descarga = st.columns([1, 3])
+        with col_formato:
+            formato = st.selectbox(
+                "Formato",
+                options=list(FORMATOS_EXPORT),
+                format_func=lambda f: {
+                    "xlsx": "Excel (.xlsx)",
+                    "parquet": "Parquet (.zip)",
+                    "arrow": "Arrow IPC (.zip)",
+                    "csv": "CSV (.zip)",
+                }[f],
+                help="Parquet/Arrow/CSV: un archivo por tabla + manifest.json, en un zip",
+            )
 
-                # Tolerancias
-                resultados["clusters"]["tol_criticos"].to_excel(
-                    writer,
-                    sheet_name="Tol_Criticos",
-                    index=False,
-                )
-                resultados["clusters"]["tol_laxos"].to_excel(
-                    writer,
-                    sheet_name="Tol_Laxos",
-                    index=False,
-                )
-                resultados["clusters"]["tol_crit_mono"].to_excel(
-                    writer,
-                    sheet_name="Tol_Crit_Mono",
-                    index=False,
-                )
-                resultados["clusters"]["tol_lax_mono"].to_excel(
-                    writer,
-                    sheet_name="Tol_Lax_Mono",
-                    index=False,
-                )
-                resultados["clusters"]["tol_crit_src"].to_excel(
-                    writer,
-                    sheet_name="Tol_Crit_Src",
-                    index=False,
-                )
-                resultados["clusters"]["tol_lax_src"].to_excel(
-                    writer,
-                    sheet_name="Tol_Lax_Src",
-                    index=False,
-                )
-                resultados["clusters"]["tol_sugeridas"].to_excel(
-                    writer,
-                    sheet_name="Tol_Sugeridas",
-                    index=False,
-                )
-                resultados["clusters"]["tol_sug_mono"].to_excel(
-                    writer,
-                    sheet_name="Tol_Sug_Mono",
-                    index=False,
-                )
+        filename = (
+            f"{resultados['especie'].replace(' ', '_')}_"
+            f"{resultados['linea_producto'].replace(' ', '_')}_Clusters"
+            f"{FORMATOS_EXPORT[formato]['extension']}"
+        )
 
-                # Asignación (opcional)
-                resultados["asignacion"]["detalle"].to_excel(
-                    writer,
-                    sheet_name="AsignacionDetalle",
-                    index=False,
-                )
-                resultados["asignacion"]["resumen_mc"].to_excel(
-                    writer,
-                    sheet_name="ResumenMC",
-                    index=False,
-                )
-                resultados["asignacion"]["resumen_lote"].to_excel(
-                    writer,
-                    sheet_name="ResumenLote",
-                    index=False,
-                )
+        with col_descarga:
+            st.markdown("&nbsp;")
+            st.download_button(
+                label=f"📥 Descargar Resultados Completos ({formato})",
+                data=descarga_diferida(
+                    (resultados["run_id"], formato),
+                    lambda: resultados_to_bytes(resultados, formato),
+                ),
+                file_name=filename,
+                mime=FORMATOS_EXPORT[formato]["mime"],
+                on_click="ignore",
+                use_container_width=True,
+            )
 
-            output.seek(0)
-            return output.getvalue()
+        st.markdown("---")
 
-        excel_bytes = to_excel_bytes(resultados)
-        filename = f"{resultados['especie'].replace(' ', '_')}_{resultados['linea_producto'].replace(' ', '_')}_Clusters.xlsx"
+        with st.expander("🩺 Diagnóstico de rendimiento", expanded=False):
+            panel_diagnostico(resultados)
 
-        st.download_button(
-            label="📥 Descargar Excel Completo",
-            data=excel_bytes,
-            file_name=filename,
-            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-            use_container_width=True,
-        )
 
-# TAB 4: Edición
-with tab4:
-    st.header("✏️ Edición de Tolerancias y Asignaciones")
+def panel_diagnostico(resultados):
+    """Etapas de la última ejecución, origen en caché, tamaños de entrada y memoria."""
+    pipeline = get_pipeline_cache()
+    ultimo = st.session_state.ultimo_job
+    medido = ultimo is not None and ultimo.get("run_id") == resultados["run_id"]
+    registros = ultimo["instrumentacion"] if medido else None
 
-    if st.session_state.resultados is None:
-        st.info(
-            "ℹ️ No hay resultados disponibles. Por favor, realice el análisis en la pestaña 'Configuración'.",
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.metric("Última ejecución", f"{ultimo['duracion']:.2f} s" if medido else "—")
+    with col2:
+        motor = motor_evaluacion(registros)
+        st.metric("Motor de evaluación", motor or "—")
+    with col3:
+        st.metric("Run", resultados["run_id"])
+    if medido:
+        st.caption(
+            "Caché: " + " · ".join(f"{capa} {origen}" for capa, origen in ultimo["cache"].items()),
         )
+        if motor is None:
+            st.caption("La asignación no se calculó en esta ejecución (provino de la caché).")
+        st.dataframe(desglose_etapas(registros), use_container_width=True, hide_index=True)
     else:
-        resultados = st.session_state.resultados
-        clusters = resultados["clusters"]
+        st.caption("Sin medición: el análisis no se ejecutó en esta sesión (se abrió guardado).")
+
+    # Tamaños de entrada (con los archivos actuales: puede faltar alguno)
+    try:
+        datos = pipeline.datos(resultados["especie"], resultados["linea_producto"])
+    except FileNotFoundError as e:
+        st.caption(f"Tamaños de entrada no disponibles: {e}")
+    else:
+        tamanos = tamanos_entrada(resultados, datos)
+        for col, (nombre, clave) in zip(
+            st.columns(4),
+            [
+                ("Lotes", "lotes"),
+                ("MCs", "mcs"),
+                ("Pares lote × MC", "pares"),
+                ("Reglas Cruce", "reglas_cruce"),
+            ],
+        ):
+            col.metric(nombre, f"{tamanos[clave]:,}")
+
+    # Memoria: se mide una vez por análisis (recorre todos los DataFrames)
+    memo = st.session_state.get("diagnostico_memoria")
+    if memo is None or memo[0] != resultados["run_id"]:
+        memo = st.session_state.diagnostico_memoria = (
+            resultados["run_id"],
+            memoria_mb(resultados),
+        )
+    texto = f"Memoria de los resultados de la sesión: {memo[1]:,.1f} MB"
+    memoria = pipeline.stats().get("memoria")
+    if memoria is not None:
+        texto += (
+            f" · caché compartida: {memoria['bytes'] / 2**20:,.0f} de "
+            f"{memoria['max_bytes'] / 2**20:,.0f} MB ({memoria['expulsiones']} expulsiones)"
+        )
+    st.caption(texto)
+
+
+def _vista_detalle(resultados, filtros, orden):
+    """Posiciones filtradas y ordenadas de AsignacionDetalle, memoizadas en la sesión.
+
+    Cambiar de página no vuelve a filtrar ni a ordenar: solo toma otro tramo de
+    las posiciones. Las opciones de los filtros se calculan una vez por análisis.
+    """
+    detalle = resultados["asignacion"]["detalle"]
+    vista = st.session_state.get("detalle_vista")
+    if vista is None or vista["run_id"] != resultados["run_id"]:
+        vista = st.session_state.detalle_vista = {
+            "run_id": resultados["run_id"],
+            "lotes": sorted(detalle["LOTE"].dropna().unique().tolist()),
+            "mcs": sorted(detalle["MERCADO-CLIENTE"].dropna().unique().tolist()),
+            "reglas": reglas_fallidas(detalle),
+            "clave": None,
+        }
+    clave = (repr(filtros), orden)
+    if vista["clave"] != clave:
+        posiciones = filtrar_detalle(detalle, **filtros)
+        vista["posiciones"] = ordenar_posiciones(detalle, posiciones, *orden)
+        vista["clave"] = clave
+    return vista
+
+
+@st.fragment
+@medir_latencia("detalle")
+def seccion_detalle(resultados):
+    """Pestaña 'Detalle': AsignacionDetalle filtrado, ordenado y paginado en el servidor.
+
+    Al navegador se envía solo la página visible, no la tabla completa.
+    """
+    st.header("🔎 Detalle por Lote × Mercado-Cliente")
 
-        # Inicializar session state para ediciones si no existen
-        if "ediciones_tol_sug_mono" not in st.session_state:
-            st.session_state.ediciones_tol_sug_mono = clusters["tol_sug_mono"].copy()
-
-        if "ediciones_clusters_mc" not in st.session_state:
-            st.session_state.ediciones_clusters_mc = clusters["clusters_mc"].copy()
-
-        # Inicializar flags de reset
-        if "reset_tol_flag" not in st.session_state:
-            st.session_state.reset_tol_flag = False
-        if "reset_mc_flag" not in st.session_state:
-            st.session_state.reset_mc_flag = False
-        if "reset_all_flag" not in st.session_state:
-            st.session_state.reset_all_flag = False
-
-        # Inicializar contadores de reset (fuerzan nuevo editor con key diferente)
-        if "reset_counter_tol" not in st.session_state:
-            st.session_state.reset_counter_tol = 0
-        if "reset_counter_mc" not in st.session_state:
-            st.session_state.reset_counter_mc = 0
-        if "reset_counter_all" not in st.session_state:
-            st.session_state.reset_counter_all = 0
-
-        # Procesar resets ANTES de mostrar los editores
-        # Usar contadores para cambiar el key del editor y forzar recreación
-        if st.session_state.get("reset_tol_flag", False):
-            st.session_state.ediciones_tol_sug_mono = clusters["tol_sug_mono"].copy()
-            # Incrementar contador para cambiar el key del editor
-            st.session_state.reset_counter_tol += 1
-            # Limpiar TODOS los keys relacionados con el editor
-            keys_to_delete = [
-                k for k in list(st.session_state.keys()) if "editor_tol_sug_mono" in str(k)
-            ]
-            for key in keys_to_delete:
-                del st.session_state[key]
-            st.session_state.reset_tol_flag = False
-            st.rerun()
-
-        if st.session_state.get("reset_mc_flag", False):
-            st.session_state.ediciones_clusters_mc = clusters["clusters_mc"].copy()
-            # Incrementar contador para cambiar el key del editor
-            st.session_state.reset_counter_mc += 1
-            # Limpiar TODOS los keys relacionados con el editor
-            keys_to_delete = [
-                k for k in list(st.session_state.keys()) if "editor_clusters_mc" in str(k)
-            ]
-            for key in keys_to_delete:
-                del st.session_state[key]
-            st.session_state.reset_mc_flag = False
-            st.rerun()
-
-        if st.session_state.get("reset_all_flag", False):
-            st.session_state.ediciones_tol_sug_mono = clusters["tol_sug_mono"].copy()
-            st.session_state.ediciones_clusters_mc = clusters["clusters_mc"].copy()
-            # Incrementar contadores
-            st.session_state.reset_counter_tol += 1
-            st.session_state.reset_counter_mc += 1
-            st.session_state.reset_counter_all += 1
-            # Limpiar TODOS los keys relacionados
-            keys_to_delete_tol = [
-                k for k in list(st.session_state.keys()) if "editor_tol_sug_mono" in str(k)
-            ]
-            keys_to_delete_mc = [
-                k for k in list(st.session_state.keys()) if "editor_clusters_mc" in str(k)
-            ]
-            for key in keys_to_delete_tol + keys_to_delete_mc:
-                del st.session_state[key]
-            st.session_state.reset_all_flag = False
-            st.rerun()
-
-        # Información contextual
+    if resultados is None:
         st.info(
-            "💡 **Instrucciones:** Edita las tablas directamente haciendo clic en las celdas. Las columnas de identificación (VARIABLE, MERCADO-CLIENTE) no son editables. Usa el botón 'Resetear' para volver a los valores originales.",
+            "ℹ️ No hay resultados disponibles. Por favor, realice el análisis en la pestaña 'Configuración'.",
         )
+        return
 
-        st.markdown("---")
+    detalle = resultados["asignacion"]["detalle"]
+    opciones = _vista_detalle(resultados, {}, (None, True))
 
-        # Tabs internos para separar las dos tablas
-        tab_tol, tab_clusters = st.tabs(
-            ["📊 Tolerancias Sugeridas Monotónicas", "👥 Asignación de Clusters"],
+    with st.expander("📉 Estadísticas por regla", expanded=False):
+        panel_estadisticas_reglas(resultados)
+
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        lotes = st.multiselect("LOTE:", options=opciones["lotes"], key="detalle_lotes")
+    with col2:
+        mcs = st.multiselect("Mercado-Cliente:", options=opciones["mcs"], key="detalle_mcs")
+    with col3:
+        pasa = st.selectbox(
+            "PASA_BASE:",
+            options=[None, True, False],
+            format_func=lambda v: {None: "Todos", True: "✅ Pasa", False: "❌ Falla"}[v],
+            key="detalle_pasa",
+        )
+    with col4:
+        pares = dict(zip(opciones["reglas"]["REGLA"], opciones["reglas"]["PARES"]))
+        regla = st.selectbox(
+            "Regla que falla:",
+            options=[None, *pares],
+            format_func=lambda r: "Todas" if r is None else f"{r} ({pares[r]:,} pares)",
+            key="detalle_regla",
         )
 
-        # TAB INTERNO 1: Tolerancias Sugeridas Monotónicas
-        with tab_tol:
-            st.subheader("Tolerancias Sugeridas Monotónicas")
-            st.markdown(
-                "Edita los valores de tolerancias por cluster. La columna **VARIABLE** no es editable.",
-            )
+    col_orden, col_dir, col_filas = st.columns([2, 1, 1])
+    with col_orden:
+        columna = st.selectbox(
+            "Ordenar por:",
+            options=[None, *columnas_orden(detalle)],
+            format_func=lambda c: "(orden original)" if c is None else c,
+            key="detalle_orden",
+        )
+    with col_dir:
+        ascendente = st.radio(
+            "Dirección:",
+            options=[True, False],
+            format_func=lambda a: "Ascendente" if a else "Descendente",
+            horizontal=True,
+            key="detalle_ascendente",
+        )
+    with col_filas:
+        filas_por_pagina = st.selectbox(
+            "Filas por página:",
+            options=[50, 100, 250, 500],
+            index=1,
+            key="detalle_filas",
+        )
 
-            # Configurar columnas editables (todas excepto VARIABLE)
-            column_config = {}
-            col_names = st.session_state.ediciones_tol_sug_mono.columns.tolist()
-            for col in col_names:
-                if col == "VARIABLE":
-                    column_config[col] = st.column_config.TextColumn(
-                        col,
-                        disabled=True,
-                        help="Nombre de la variable (no editable)",
-                    )
-                else:
-                    column_config[col] = st.column_config.NumberColumn(
-                        col,
-                        format="%.2f",
-                        help=f"Valor de tolerancia para {col}",
-                    )
+    filtros = {"lotes": lotes, "mcs": mcs, "pasa": pasa, "regla": regla}
+    posiciones = _vista_detalle(resultados, filtros, (columna, ascendente))["posiciones"]
+
+    total = len(posiciones)
+    paginas = max(1, -(-total // filas_por_pagina))
+    pagina = st.number_input(
+        f"Página (de {paginas:,}):",
+        min_value=1,
+        max_value=paginas,
+        value=1,
+        step=1,
+        key=f"detalle_pagina_{hash((repr(filtros), columna, ascendente, filas_por_pagina))}",
+    )
+    vista, _ = pagina_detalle(detalle, posiciones, pagina, filas_por_pagina)
 
-            # Editor de datos con key dinámico (cambia en cada reset para forzar recreación)
-            editor_key_tol = f"editor_tol_sug_mono_{st.session_state.reset_counter_tol}"
-            edited_tol = st.data_editor(
-                st.session_state.ediciones_tol_sug_mono,
-                column_config=column_config,
-                use_container_width=True,
-                num_rows="fixed",
-                key=editor_key_tol,
-            )
+    inicio = (pagina - 1) * filas_por_pagina
+    st.caption(
+        f"Filas {inicio + 1 if total else 0:,}–{inicio + len(vista):,} de {total:,} "
+        f"(AsignacionDetalle completo: {len(detalle):,} filas)",
+    )
+    st.dataframe(vista, use_container_width=True, hide_index=True)
+
+
+def panel_estadisticas_reglas(resultados):
+    """Pares evaluados, fallidos, kg perdidos y fallas únicas por regla, total y por MC."""
+    estadisticas = resultados["asignacion"].get("estadisticas_reglas")
+    if estadisticas is None:
+        st.caption("Análisis guardado sin estadísticas por regla: vuelva a ejecutarlo para verlas.")
+        return
+    st.caption(
+        "FALLIDOS: pares que la regla rechaza · KG_PERDIDOS: kilos que esos pares habrían "
+        "asignado · UNICA / KG_UNICA: pares (y kilos) en que fue la única regla que falló, "
+        "lo que se recupera relajando solo esa regla.",
+    )
+    st.dataframe(resumen_reglas(estadisticas), use_container_width=True, hide_index=True)
 
-            # Actualizar session state con ediciones
-            st.session_state.ediciones_tol_sug_mono = edited_tol
+    mc = st.selectbox(
+        "Mercado-Cliente:",
+        options=sorted(estadisticas["MERCADO-CLIENTE"].dropna().unique().tolist()),
+        key="estadisticas_mc",
+    )
+    por_mc = estadisticas[estadisticas["MERCADO-CLIENTE"] == mc]
+    st.dataframe(resumen_reglas(por_mc), use_container_width=True, hide_index=True)
 
-            # Botón de reset para esta tabla
-            col_reset1, col_space1 = st.columns([1, 3])
-            with col_reset1:
-                if st.button("🔄 Resetear Tolerancias", key="reset_tol"):
-                    st.session_state.reset_tol_flag = True
-                    st.rerun()
 
-        # TAB INTERNO 2: Asignación de Clusters
-        with tab_clusters:
-            st.subheader("Asignación de Mercados-Clientes a Clusters")
-            st.markdown(
-                "Edita los valores de **KILOS_ASIGNABLE** y **CLUSTER**. La columna **MERCADO-CLIENTE** no es editable.",
+def clusters_editados_sesion(journal, resultados):
+    """Tolerancias recalculadas con la asignación editada de la sesión.
+
+    Re-cálculo incremental: solo los clusters con cambios de membresía o kilos.
+    Sin ediciones se usa el estado compartido; con ediciones, la sesión guarda
+    un estado propio que comparte los clusters no modificados.
+    """
+    if not journal.n_cambios("clusters_mc"):
+        # Sin ediciones las tolerancias son las del análisis (no hay nada que recalcular)
+        journal.estado_clusters = None
+        return resultados["clusters"], resultados["estado_clusters"]
+    clusters_editados, estado = update_clusters(
+        journal.estado_clusters or resultados["estado_clusters"],
+        journal.vista("clusters_mc", resultados["clusters"]["clusters_mc"]),
+    )
+    journal.estado_clusters = estado if journal.n_cambios("clusters_mc") else None
+    return clusters_editados, estado
+
+
+def _editor_key(journal, tabla):
+    # Cambia solo al deshacer/rehacer/resetear esa tabla, para recrear su editor
+    return f"editor_{tabla}_{journal.generacion[tabla]}"
+
+
+@st.fragment
+@medir_latencia("editor_tolerancias")
+def editor_tolerancias(journal, base):
+    """Editor de Tol_Sug_Mono (una edición re-ejecuta solo este fragmento)."""
+    st.subheader("Tolerancias Sugeridas Monotónicas")
+    st.markdown(
+        "Edita los valores de tolerancias por cluster. La columna **VARIABLE** no es editable.",
+    )
+
+    # Configurar columnas editables (todas excepto VARIABLE)
+    column_config = {}
+    col_names = base.columns.tolist()
+    for col in col_names:
+        if col == "VARIABLE":
+            column_config[col] = st.column_config.TextColumn(
+                col,
+                disabled=True,
+                help="Nombre de la variable (no editable)",
+            )
+        else:
+            column_config[col] = st.column_config.NumberColumn(
+                col,
+                format="%.2f",
+                help=f"Valor de tolerancia para {col}",
             )
 
-            # Configurar columnas editables
-            column_config_mc = {}
-            col_names_mc = st.session_state.ediciones_clusters_mc.columns.tolist()
-            max_cluster = len(clusters["clusters_summary"])
-
-            for col in col_names_mc:
-                if col == "MERCADO-CLIENTE":
-                    column_config_mc[col] = st.column_config.TextColumn(
-                        col,
-                        disabled=True,
-                        help="Nombre del mercado-cliente (no editable)",
-                    )
-                elif col == "KILOS_ASIGNABLE":
-                    column_config_mc[col] = st.column_config.NumberColumn(
-                        col,
-                        format="%.2f",
-                        help="Kilos asignables (editable)",
-                    )
-                elif col == "CLUSTER":
-                    column_config_mc[col] = st.column_config.NumberColumn(
-                        col,
-                        min_value=1,
-                        max_value=max_cluster,
-                        step=1,
-                        help=f"Cluster asignado (1 a {max_cluster})",
-                    )
-                else:
-                    column_config_mc[col] = st.column_config.NumberColumn(
-                        col,
-                        format="%.2f",
-                        help=f"Columna {col}",
-                    )
+    key = _editor_key(journal, "tol_sug_mono")
+    st.data_editor(
+        journal.ancla("tol_sug_mono", base),
+        column_config=column_config,
+        use_container_width=True,
+        num_rows="fixed",
+        key=key,
+    )
 
-            # Editor de datos con key dinámico (cambia en cada reset para forzar recreación)
-            editor_key_mc = f"editor_clusters_mc_{st.session_state.reset_counter_mc}"
-            edited_mc = st.data_editor(
-                st.session_state.ediciones_clusters_mc,
-                column_config=column_config_mc,
-                use_container_width=True,
-                num_rows="fixed",
-                key=editor_key_mc,
+    # Se registran solo las celdas que cambiaron
+    journal.sync("tol_sug_mono", base, st.session_state[key]["edited_rows"])
+    st.caption(f"✏️ {journal.n_cambios('tol_sug_mono')} cambio(s) en esta tabla")
+
+    # Botón de reset para esta tabla
+    col_reset1, col_space1 = st.columns([1, 3])
+    with col_reset1:
+        st.button(
+            "🔄 Resetear Tolerancias",
+            key="reset_tol",
+            on_click=journal.reset,
+            args=("tol_sug_mono",),
+        )
+
+
+@st.fragment
+@medir_latencia("editor_asignaciones")
+def editor_asignaciones(journal, resultados):
+    """Editor de ClustersMC con el re-cálculo incremental de tolerancias."""
+    base = resultados["clusters"]["clusters_mc"]
+    st.subheader("Asignación de Mercados-Clientes a Clusters")
+    st.markdown(
+        "Edita los valores de **KILOS_ASIGNABLE** y **CLUSTER**. La columna **MERCADO-CLIENTE** no es editable.",
+    )
+
+    # Configurar columnas editables
+    column_config_mc = {}
+    col_names_mc = base.columns.tolist()
+    max_cluster = len(resultados["clusters"]["clusters_summary"])
+
+    for col in col_names_mc:
+        if col == "MERCADO-CLIENTE":
+            column_config_mc[col] = st.column_config.TextColumn(
+                col,
+                disabled=True,
+                help="Nombre del mercado-cliente (no editable)",
+            )
+        elif col == "KILOS_ASIGNABLE":
+            column_config_mc[col] = st.column_config.NumberColumn(
+                col,
+                format="%.2f",
+                help="Kilos asignables (editable)",
+            )
+        elif col == "CLUSTER":
+            column_config_mc[col] = st.column_config.NumberColumn(
+                col,
+                min_value=1,
+                max_value=max_cluster,
+                step=1,
+                help=f"Cluster asignado (1 a {max_cluster})",
+            )
+        else:
+            column_config_mc[col] = st.column_config.NumberColumn(
+                col,
+                format="%.2f",
+                help=f"Columna {col}",
             )
 
-            # Actualizar session state con ediciones
-            st.session_state.ediciones_clusters_mc = edited_mc
+    key = _editor_key(journal, "clusters_mc")
+    st.data_editor(
+        journal.ancla("clusters_mc", base),
+        column_config=column_config_mc,
+        use_container_width=True,
+        num_rows="fixed",
+        key=key,
+    )
 
-            # Botón de reset para esta tabla
-            col_reset2, col_space2 = st.columns([1, 3])
-            with col_reset2:
-                if st.button("🔄 Resetear Asignaciones", key="reset_mc"):
-                    st.session_state.reset_mc_flag = True
-                    st.rerun()
+    journal.sync("clusters_mc", base, st.session_state[key]["edited_rows"])
+    st.caption(f"✏️ {journal.n_cambios('clusters_mc')} cambio(s) en esta tabla")
 
-        st.markdown("---")
+    clusters_editados, estado = clusters_editados_sesion(journal, resultados)
+    recalculados = estado["recalculados"]
+    if recalculados:
+        st.caption(
+            f"🔁 Tolerancias recalculadas para cluster(s): {', '.join(map(str, recalculados))}",
+        )
 
-        # Sección de descarga
-        st.subheader("💾 Descargar Tablas Editadas")
-
-        # Función para generar Excel con tablas editadas
-        def to_excel_bytes_edited():
-            """Convierte tablas editadas a Excel en memoria."""
-            output = BytesIO()
-            with pd.ExcelWriter(output, engine="xlsxwriter") as writer:
-                # Tabla 1: Tolerancias Sugeridas Monotónicas Editadas
-                st.session_state.ediciones_tol_sug_mono.to_excel(
-                    writer,
-                    sheet_name="Tol_Sug_Mono_Editada",
-                    index=False,
-                )
+    with st.expander("🎯 Tolerancias con la asignación editada", expanded=True):
+        st.markdown("**Tolerancias Sugeridas**")
+        st.dataframe(clusters_editados["tol_sugeridas"], use_container_width=True)
+        st.markdown("**Tolerancias Sugeridas Monotónicas**")
+        st.dataframe(clusters_editados["tol_sug_mono"], use_container_width=True)
+        col_crit, col_lax = st.columns(2)
+        with col_crit:
+            st.markdown("**🔴 Tolerancias Críticas**")
+            st.dataframe(clusters_editados["tol_criticos"], use_container_width=True)
+        with col_lax:
+            st.markdown("**🟢 Tolerancias Laxas**")
+            st.dataframe(clusters_editados["tol_laxos"], use_container_width=True)
+
+    # Botón de reset para esta tabla
+    col_reset2, col_space2 = st.columns([1, 3])
+    with col_reset2:
+        st.button(
+            "🔄 Resetear Asignaciones",
+            key="reset_mc",
+            on_click=journal.reset,
+            args=("clusters_mc",),
+        )
 
-                # Tabla 2: Asignación de Clusters Editada
-                st.session_state.ediciones_clusters_mc.to_excel(
-                    writer,
-                    sheet_name="ClustersMC_Editada",
-                    index=False,
-                )
 
-            output.seek(0)
-            return output.getvalue()
+def seccion_edicion(resultados):
+    """Pestaña 'Edición': journal de la sesión, editores y descarga."""
+    st.header("✏️ Edición de Tolerancias y Asignaciones")
 
-        # Botón de descarga
-        excel_bytes_edited = to_excel_bytes_edited()
-        filename_edited = f"{resultados['especie'].replace(' ', '_')}_{resultados['linea_producto'].replace(' ', '_')}_Editadas.xlsx"
+    if resultados is None:
+        st.info(
+            "ℹ️ No hay resultados disponibles. Por favor, realice el análisis en la pestaña 'Configuración'.",
+        )
+        return
+
+    clusters = resultados["clusters"]
 
-        st.download_button(
-            label="📥 Descargar Excel con Tablas Editadas",
-            data=excel_bytes_edited,
-            file_name=filename_edited,
-            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    # Ediciones de la sesión: journal de cambios por celda sobre las tablas
+    # compartidas (que nunca se copian ni modifican)
+    journal = st.session_state.journal
+    if journal is None or journal.run_id != resultados["run_id"]:
+        journal = st.session_state.journal = EditJournal(
+            resultados["run_id"],
+            ["tol_sug_mono", "clusters_mc"],
+        )
+
+    # Información contextual
+    st.info(
+        "💡 **Instrucciones:** Edita las tablas directamente haciendo clic en las celdas. Las columnas de identificación (VARIABLE, MERCADO-CLIENTE) no son editables. Usa 'Deshacer'/'Rehacer' para moverte entre cambios y 'Resetear' para volver a los valores originales.",
+    )
+
+    # Fuera de los fragmentos: deshacer/rehacer re-ejecutan la app y recrean el
+    # editor de la tabla afectada
+    col_undo, col_redo, col_space = st.columns([1, 1, 3])
+    with col_undo:
+        st.button(
+            "↩️ Deshacer",
+            key="undo_edicion",
+            on_click=journal.undo,
+            use_container_width=True,
+            help="Deshace el último cambio (de cualquiera de las dos tablas)",
+        )
+    with col_redo:
+        st.button(
+            "↪️ Rehacer",
+            key="redo_edicion",
+            on_click=journal.redo,
             use_container_width=True,
-            help="Descarga un archivo Excel con las dos tablas editadas: Tol_Sug_Mono_Editada y ClustersMC_Editada",
+            help="Vuelve a aplicar el último cambio deshecho",
         )
 
-        # Botón de reset global (opcional)
-        st.markdown("---")
-        col_reset_global, col_space_global = st.columns([1, 4])
-        with col_reset_global:
-            if st.button(
-                "🔄 Resetear Todo a Valores Originales",
-                type="secondary",
-                key="reset_all",
+    st.markdown("---")
+
+    # Tabs internos para separar las dos tablas
+    tab_tol, tab_clusters = st.tabs(
+        ["📊 Tolerancias Sugeridas Monotónicas", "👥 Asignación de Clusters"],
+    )
+    with tab_tol:
+        editor_tolerancias(journal, clusters["tol_sug_mono"])
+    with tab_clusters:
+        editor_asignaciones(journal, resultados)
+
+    st.markdown("---")
+
+    # Sección de descarga
+    st.subheader("💾 Descargar Tablas Editadas")
+
+    # El Excel se genera recién al hacer click, con las ediciones vigentes en ese
+    # momento (los editores se re-ejecutan sin re-ejecutar esta sección)
+    filename_edited = f"{resultados['especie'].replace(' ', '_')}_{resultados['linea_producto'].replace(' ', '_')}_Editadas.xlsx"
+
+    st.download_button(
+        label="📥 Descargar Excel con Tablas Editadas",
+        data=lambda: ediciones_to_excel_bytes(
+            journal.vista("tol_sug_mono", clusters["tol_sug_mono"]),
+            journal.vista("clusters_mc", clusters["clusters_mc"]),
+            clusters_editados_sesion(journal, resultados)[0],
+        ),
+        file_name=filename_edited,
+        mime=XLSX_MIME,
+        on_click="ignore",
+        use_container_width=True,
+        help="Descarga un archivo Excel con las dos tablas editadas: Tol_Sug_Mono_Editada y ClustersMC_Editada",
+    )
+
+    # Botón de reset global (opcional)
+    st.markdown("---")
+    col_reset_global, col_space_global = st.columns([1, 4])
+    with col_reset_global:
+        st.button(
+            "🔄 Resetear Todo a Valores Originales",
+            type="secondary",
+            key="reset_all",
+            on_click=journal.reset,
+        )
+
+
+@st.fragment
+@medir_latencia("comparar")
+def seccion_comparar():
+    """Pestaña 'Comparar': diff entre dos análisis guardados."""
+    st.header("🔀 Comparar Análisis")
+
+    store = get_pipeline_cache().store
+    guardados = store.list_runs(tipo="clusters") if store is not None else None
+    if guardados is None or len(guardados) < 2:
+        st.info(
+            "ℹ️ Se necesitan al menos dos análisis guardados para comparar. "
+            "Procese otra configuración (K, percentiles, método) o un nuevo archivo de tolerancias.",
+        )
+    else:
+        ids = guardados["id"].tolist()
+        por_id = guardados.set_index("id")
+
+        def _etiqueta(rid):
+            m = por_id.loc[rid]
+            return f"{m['especie']} · {m['linea_producto']} · K={m['k']} · {m['method']} ({m['creado']})"
+
+        actual = (st.session_state.analisis or {}).get("run_id")
+        col_a, col_b = st.columns(2)
+        with col_a:
+            id_a = st.selectbox(
+                "Análisis base (A):",
+                options=ids,
+                index=1 if ids[0] == actual else 0,
+                format_func=_etiqueta,
+            )
+        with col_b:
+            id_b = st.selectbox(
+                "Análisis comparado (B):",
+                options=ids,
+                index=ids.index(actual) if actual in ids else 1,
+                format_func=_etiqueta,
+            )
+
+        if id_a == id_b:
+            st.warning("⚠️ Seleccione dos análisis distintos")
+        else:
+            diff = comparar_runs(id_a, id_b)
+            resumen = diff["resumen"].iloc[0]
+
+            col1, col2, col3, col4 = st.columns(4)
+            with col1:
+                st.metric("MCs que cambiaron de cluster", int(resumen["MC_CAMBIO_CLUSTER"]))
+            with col2:
+                st.metric(
+                    "Lote×MC pasa → falla / falla → pasa",
+                    f"{int(resumen['LOTE_MC_PASA_A_FALLA'])} / {int(resumen['LOTE_MC_FALLA_A_PASA'])}",
+                )
+            with col3:
+                st.metric(
+                    "Kilos asignables (B)",
+                    f"{resumen['KILOS_B']:,.0f}",
+                    delta=f"{resumen['DELTA_KILOS']:,.0f}",
+                )
+            with col4:
+                st.metric("Celdas de tolerancia cambiadas", int(resumen["TOL_CELDAS_CAMBIADAS"]))
+
+            st.subheader("👥 Mercados-Clientes que cambiaron")
+            st.dataframe(diff["clusters_mc"], use_container_width=True, hide_index=True)
+
+            st.subheader("📦 Kilos asignables por Mercado-Cliente")
+            st.dataframe(diff["resumen_mc"], use_container_width=True, hide_index=True)
+
+            with st.expander(
+                f"🔍 Lote × Mercado-Cliente con cambios ({len(diff['detalle'])})",
+                expanded=False,
+            ):
+                st.dataframe(diff["detalle"], use_container_width=True, hide_index=True)
+
+            with st.expander(
+                f"📏 Tolerancias cambiadas ({len(diff['tolerancias'])})",
+                expanded=False,
             ):
-                st.session_state.reset_all_flag = True
-                st.rerun()
+                st.dataframe(diff["tolerancias"], use_container_width=True, hide_index=True)
+
+            st.download_button(
+                label="📥 Descargar Comparación (Excel)",
+                data=descarga_diferida(
+                    ("diff", id_a, id_b),
+                    lambda: write_tables_bytes(list(diff.items())),
+                ),
+                file_name=f"Diff_{id_a}_{id_b}.xlsx",
+                mime=XLSX_MIME,
+                on_click="ignore",
+                use_container_width=True,
+            )
+
+
+# Resultados del análisis de la sesión (referencia a la caché compartida)
+resultados_actuales = resultados_sesion()
+aviso_analisis_perdido()
+
+# Pestañas principales
+tab1, tab2, tab3, tab_detalle, tab4, tab5 = st.tabs(
+    [
+        "📥 Carga de Datos",
+        "⚙️ Configuración",
+        "📊 Resultados",
+        "🔎 Detalle",
+        "✏️ Edición",
+        "🔀 Comparar",
+    ],
+)
+
+with tab1:
+    seccion_seleccion()
+
+with tab2:
+    seccion_configuracion()
+
+with tab3:
+    st.header("Resultados del Análisis")
+    # Resumen parcial mientras se evalúan los lotes
+    panel_parcial()
+    seccion_resultados(resultados_actuales)
+
+with tab_detalle:
+    seccion_detalle(resultados_actuales)
+
+with tab4:
+    seccion_edicion(resultados_actuales)
+
+with tab5:
+    seccion_comparar()
+
+st.session_state.latencias["app"] = (time.perf_counter() - _inicio_app) * 1000
+if arranque["primer_interactivo"] is None:
+    arranque["primer_interactivo"] = time.time() - arranque["inicio"]
+
+# Latencia de la última ejecución completa y de cada fragmento, y tiempos de arranque
+with st.sidebar:
+    with st.expander("⏱️ Latencia", expanded=False):
+        for seccion, ms in st.session_state.latencias.items():
+            estado = "✅" if ms <= LATENCIA_OBJETIVO_MS else "⚠️"
+            st.caption(f"{estado} {seccion}: {ms:.0f} ms")
+        st.caption(f"🚀 Primera app interactiva: {arranque['primer_interactivo']:.2f} s")
+        if arranque["primer_resultado"] is not None:
+            st.caption(f"🎯 Primer resultado: {arranque['primer_resultado']:.2f} s")
+        warmup = arranque["warmup"]
+        if warmup is None:
+            st.caption("🔥 Warm-up en curso...")
+        else:
+            origenes = [e["origen"] for e in warmup["especies"].values()]
+            st.caption(
+                f"🔥 Warm-up: {warmup['segundos']:.2f} s "
+                f"({origenes.count('snapshot')} desde snapshot, {origenes.count('excel')} desde Excel)",
+            )
+        watcher = arranque["watcher"]
+        evento = watcher.ultimo_evento() if watcher is not None else None
+        if evento is not None:
+            archivos = ", ".join(os.path.basename(a) for a in evento["archivos"])
+            reconstruccion = evento.get("reconstruccion") or {}
+            st.caption(
+                f"🔄 {time.strftime('%H:%M:%S', time.localtime(evento['hora']))} {archivos} "
+                f"cambió: {len(evento['especies'])} especie(s) invalidada(s), "
+                f"{reconstruccion.get('runs', 0)} análisis reconstruido(s)",
+            )
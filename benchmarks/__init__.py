@@ -0,0 +1 @@
+"""Benchmarks del pipeline con datos sintéticos a escala (ver benchmarks.run)"""
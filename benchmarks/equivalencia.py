@@ -0,0 +1,357 @@
+"""Equivalencia y rendimiento de los motores de asignación (utils.data_processor)
+
+Uso (desde la raíz del repositorio):
+  python -m benchmarks.equivalencia                        # reales + sintéticos
+  python -m benchmarks.equivalencia --semillas 5 --lotes 500 --out equivalencia.json
+  python -m benchmarks.equivalencia --modelo-original      # además ModeloCarozos2.py
+
+Ejecuta el motor de referencia (--referencia, default 'filas') y el candidato
+(--motor, default 'vectorizado') sobre los mismos datos y exige el mismo
+resultado: PASA_BASE idéntico, ASIGNABLE_KG y %CALIBRES_EN_RANGO dentro de
+--rtol, y el resto de AsignacionDetalle, ResumenMC y ResumenLote iguales, igual
+que las estadísticas por regla. Un motor fuera de MOTORES_EXACTOS ('adaptativo')
+solo debe coincidir en qué pares tienen RAZONES, no en su texto ni en las
+estadísticas (cuenta solo las reglas que evalúa).
+
+Escenarios:
+  real/<especie>/<línea>   archivos de Data/ (omitir con --sin-reales)
+  <perturbación>/s<semilla>  datos de benchmarks.generador con límites NaN/0,
+                           calibres invertidos o con un solo límite, bins de color
+                           y calibres en % o en fracción, mediciones faltantes
+  modelo_original          ModeloCarozos2.py (Nectarin Amarillo) contra ambos
+                           motores con las mismas hojas crudas
+
+Termina con código 1 si algún escenario no es equivalente.
+"""
+
+import argparse
+import json
+import os
+import runpy
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.generador import generar_datos, variables_cruce
+from benchmarks.run import entorno
+from utils.data_loader import (
+    ESPECIES_CONFIG,
+    F_CRUCE,
+    F_DISMINUCION,
+    filter_linea,
+    get_especies_disponibles,
+    lineas_from_lotes,
+    load_data,
+)
+from utils.data_processor import MOTORES_ASIGNACION, MOTORES_EXACTOS, process_asignacion
+
+# Columnas comparadas con tolerancia numérica (el resto debe ser igual)
+COLUMNAS_NUMERICAS = ["ASIGNABLE_KG", "%CALIBRES_EN_RANGO"]
+
+# Límites de tolerancia que aceptan NaN/0 como 'sin restricción'
+LIMITES = [
+    "BRIX",
+    "FIRMEZA INFERIOR",
+    "FIRMEZAS SUPERIORES",
+    "PORC_COLOR CUBRIMIENTO MIN",
+    "SUMATORIA CONDICION",
+    "SUMATORIA CALIDAD",
+    "CALIBRE INFERIOR",
+    "CALIBRE SUPERIOR",
+]
+
+
+def asignar(datos, motor):
+    """process_asignacion con copias de las hojas (la función normaliza en el lugar)."""
+    return process_asignacion(
+        datos["lotes"].copy(),
+        datos["tolerancias"].copy(),
+        datos["disminucion"].copy(),
+        datos["cruce"].copy(),
+        motor=motor,
+    )
+
+
+def diferencias(ref, cand, rtol=1e-9, exacto=True):
+    """Diferencias entre dos resultados de process_asignacion (lista vacía = equivalentes).
+
+    Con exacto=False RAZONES solo se compara como vacía / no vacía y las
+    estadísticas por regla no se comparan.
+    """
+    errores = []
+    d_ref, d_cand = ref["detalle"], cand["detalle"]
+    if d_ref.shape != d_cand.shape or list(d_ref.columns) != list(d_cand.columns):
+        return [f"detalle: forma {d_ref.shape} vs {d_cand.shape}"]
+    if not exacto:
+        rechazos = (d_ref["RAZONES"] == "").to_numpy() != (d_cand["RAZONES"] == "").to_numpy()
+        if rechazos.any():
+            errores.append(f"RAZONES: {rechazos.sum()} pares con/sin razones distintos")
+        ref = {**ref, "detalle": d_ref.drop(columns="RAZONES")}
+        cand = {**cand, "detalle": d_cand.drop(columns="RAZONES")}
+
+    pasa = d_ref["PASA_BASE"].to_numpy(bool) != d_cand["PASA_BASE"].to_numpy(bool)
+    if pasa.any():
+        errores.append(f"PASA_BASE: {pasa.sum()} pares distintos")
+    for col in COLUMNAS_NUMERICAS:
+        a = d_ref[col].to_numpy(float)
+        b = d_cand[col].to_numpy(float)
+        malos = ~np.isclose(a, b, rtol=rtol, atol=0.0, equal_nan=True)
+        if malos.any():
+            errores.append(f"{col}: {malos.sum()} pares distintos (máx {np.nanmax(abs(a - b)):g})")
+
+    nombres = ["detalle", "resumen_mc", "resumen_lote"]
+    if exacto and "estadisticas_reglas" in ref and "estadisticas_reglas" in cand:
+        nombres.append("estadisticas_reglas")
+    for nombre in nombres:
+        try:
+            pd.testing.assert_frame_equal(
+                ref[nombre].reset_index(drop=True),
+                cand[nombre].reset_index(drop=True),
+                check_dtype=False,
+                rtol=rtol,
+                obj=nombre,
+            )
+        except AssertionError as e:
+            errores.append(str(e).splitlines()[0])
+    return errores
+
+
+def _perturbar(datos, cambios, seed):
+    """Copia de los datos sintéticos con los casos borde indicados en `cambios`."""
+    rng = np.random.default_rng(seed + 100)
+    lotes = datos["lotes"].copy()
+    tol = datos["tolerancias"].copy()
+
+    if "limites_nan_cero" in cambios:
+        for col in LIMITES:
+            sorteo = rng.random(len(tol))
+            tol[col] = tol[col].astype(float)
+            tol.loc[sorteo < 0.2, col] = np.nan
+            tol.loc[(sorteo >= 0.2) & (sorteo < 0.4), col] = 0.0
+        for col in list(variables_cruce(datos["cruce"])["defectos"])[:5]:
+            tol[col] = tol[col].astype(float)
+            tol.loc[rng.random(len(tol)) < 0.3, col] = np.nan
+
+    if "calibres_invertidos" in cambios:
+        swap = rng.random(len(tol)) < 0.5
+        inf, sup = tol["CALIBRE INFERIOR"].copy(), tol["CALIBRE SUPERIOR"].copy()
+        tol.loc[swap, "CALIBRE INFERIOR"] = sup[swap]
+        tol.loc[swap, "CALIBRE SUPERIOR"] = inf[swap]
+        # Un solo límite definido
+        tol["CALIBRE INFERIOR"] = tol["CALIBRE INFERIOR"].astype(float)
+        tol.loc[rng.random(len(tol)) < 0.15, "CALIBRE INFERIOR"] = np.nan
+
+    if "bins_fraccion" in cambios:
+        color = [c for c in lotes.columns if str(c).startswith("400.0__")]
+        calibres = [c for c in lotes.columns if str(c).startswith("100.0__")]
+        modo = rng.integers(0, 4, len(lotes))
+        for cols in (color, calibres):
+            bloque = lotes[cols].astype(float)
+            suma = bloque.sum(axis=1).replace(0, np.nan)
+            fraccion = bloque.div(suma, axis=0)
+            bloque[modo == 1] = fraccion[modo == 1]  # fracción (suma 1)
+            bloque[modo == 2] = fraccion[modo == 2] * 100  # porcentaje (suma 100)
+            bloque[modo == 3] = 0.0  # sin datos
+            lotes[cols] = bloque
+
+    if "mediciones_faltantes" in cambios:
+        for col in ("PROMSOLSOL", "PROMFIRMEZA"):
+            lotes.loc[rng.random(len(lotes)) < 0.15, col] = np.nan
+        defectos = [c for c in lotes.columns if str(c)[:7] in ("500.0__", "600.0__")]
+        for col in defectos:
+            lotes[col] = lotes[col].astype(float)
+            lotes.loc[rng.random(len(lotes)) < 0.1, col] = np.nan
+        lotes.loc[rng.random(len(lotes)) < 0.05, "KILOS_REAL"] = 0.0
+        lotes.loc[rng.random(len(lotes)) < 0.05, "KILOS_REAL"] = np.nan
+
+    return {**datos, "lotes": lotes, "tolerancias": tol}
+
+
+PERTURBACIONES = {
+    "sintetico": (),
+    "limites_nan_cero": ("limites_nan_cero",),
+    "calibres_invertidos": ("calibres_invertidos",),
+    "bins_fraccion": ("bins_fraccion",),
+    "mediciones_faltantes": ("mediciones_faltantes",),
+    "mixto": (
+        "limites_nan_cero",
+        "calibres_invertidos",
+        "bins_fraccion",
+        "mediciones_faltantes",
+    ),
+}
+
+
+def escenarios_reales(base_dir):
+    """(nombre, datos) por cada especie y línea de Data/ (cada especie se lee una vez)."""
+    for especie in get_especies_disponibles():
+        try:
+            datos = load_data(especie, None, base_dir)
+        except FileNotFoundError:
+            continue
+        for linea in lineas_from_lotes(datos["lotes"]):
+            yield f"real/{especie}/{linea}", filter_linea(datos, linea)
+
+
+def escenarios_sinteticos(n_lotes, n_mcs, semillas, base_dir):
+    """(nombre, datos) por cada perturbación y semilla."""
+    for seed in range(semillas):
+        base = generar_datos(n_lotes, n_mcs, seed=seed, base_dir=base_dir)
+        for nombre, cambios in PERTURBACIONES.items():
+            yield f"{nombre}/s{seed}", _perturbar(base, cambios, seed)
+
+
+def medir_motor(datos, motor, repeticiones):
+    """(resultado, segundos mínimos de `repeticiones` ejecuciones)."""
+    tiempos = []
+    for _ in range(repeticiones):
+        t0 = time.perf_counter()
+        resultado = asignar(datos, motor)
+        tiempos.append(time.perf_counter() - t0)
+    return resultado, min(tiempos)
+
+
+def comparar_escenario(nombre, datos, args):
+    """Ejecuta referencia y candidato sobre un escenario y devuelve su fila de reporte."""
+    ref, t_ref = medir_motor(datos, args.referencia, args.repeticiones)
+    cand, t_cand = medir_motor(datos, args.motor, args.repeticiones)
+    exacto = args.referencia in MOTORES_EXACTOS and args.motor in MOTORES_EXACTOS
+    errores = diferencias(ref, cand, args.rtol, exacto)
+    return {
+        "escenario": nombre,
+        "pares": len(ref["detalle"]),
+        "pasa": int(ref["detalle"]["PASA_BASE"].sum()),
+        "referencia_s": t_ref,
+        "motor_s": t_cand,
+        "speedup": t_ref / t_cand if t_cand > 0 else None,
+        "equivalente": not errores,
+        "diferencias": errores,
+    }
+
+
+def escenario_modelo_original(args):
+    """ModeloCarozos2.py contra ambos motores, con las mismas hojas crudas de Nectarin Amarillo.
+
+    El script lee NectarinAm.xlsx y Tolerancia_NectarinAm.xlsx del directorio
+    actual: se ejecuta en una carpeta temporal con enlaces a los archivos de Data/.
+    """
+    base_dir = Path(args.base_dir).resolve()
+    config = ESPECIES_CONFIG["Nectarin Amarillo"]
+    entradas = {
+        "NectarinAm.xlsx": base_dir / config["lotes"],
+        "Tolerancia_NectarinAm.xlsx": base_dir / config["tolerancias"],
+        F_DISMINUCION: base_dir / F_DISMINUCION,
+        F_CRUCE: base_dir / F_CRUCE,
+    }
+    raiz = str(Path(__file__).resolve().parent.parent)
+    with tempfile.TemporaryDirectory() as tmp:
+        for destino, origen in entradas.items():
+            os.symlink(origen, Path(tmp) / destino)
+        cwd = Path.cwd()
+        sys.path.insert(0, raiz)
+        os.chdir(tmp)
+        try:
+            t0 = time.perf_counter()
+            modelo = runpy.run_path(str(Path(raiz) / "ModeloCarozos2.py"), run_name="modelo")
+            t_modelo = time.perf_counter() - t0
+        finally:
+            os.chdir(cwd)
+            sys.path.remove(raiz)
+
+    original = {
+        "detalle": modelo["detalle"],
+        "resumen_mc": modelo["res_mc"],
+        "resumen_lote": modelo["res_lote"],
+    }
+    datos = {
+        "lotes": modelo["nect"],
+        "tolerancias": modelo["tol"],
+        "disminucion": pd.read_excel(base_dir / F_DISMINUCION),
+        "cruce": pd.read_excel(base_dir / F_CRUCE),
+    }
+    filas = []
+    for motor in dict.fromkeys([args.referencia, args.motor]):
+        resultado, segundos = medir_motor(datos, motor, args.repeticiones)
+        errores = diferencias(original, resultado, args.rtol, motor in MOTORES_EXACTOS)
+        filas.append(
+            {
+                "escenario": f"modelo_original/{motor}",
+                "pares": len(original["detalle"]),
+                "pasa": int(original["detalle"]["PASA_BASE"].sum()),
+                "referencia_s": t_modelo,
+                "motor_s": segundos,
+                "speedup": t_modelo / segundos if segundos > 0 else None,
+                "equivalente": not errores,
+                "diferencias": errores,
+            },
+        )
+    return filas
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Equivalencia y speedup de motores de asignación")
+    ap.add_argument("--referencia", default="filas", choices=list(MOTORES_ASIGNACION))
+    ap.add_argument("--motor", default="vectorizado", choices=list(MOTORES_ASIGNACION))
+    ap.add_argument("--lotes", type=int, default=300)
+    ap.add_argument("--mcs", type=int, default=10)
+    ap.add_argument("--semillas", type=int, default=2)
+    ap.add_argument("--repeticiones", type=int, default=1)
+    ap.add_argument("--rtol", type=float, default=1e-9)
+    ap.add_argument("--sin-reales", action="store_true")
+    ap.add_argument("--sin-sinteticos", action="store_true")
+    ap.add_argument("--modelo-original", action="store_true")
+    ap.add_argument("--base-dir", default=".")
+    ap.add_argument("--out", default=None)
+    args = ap.parse_args(argv)
+    base_dir = Path(args.base_dir)
+
+    escenarios = []
+    if not args.sin_reales:
+        escenarios.append(escenarios_reales(base_dir))
+    if not args.sin_sinteticos:
+        escenarios.append(escenarios_sinteticos(args.lotes, args.mcs, args.semillas, base_dir))
+
+    print(f"[{args.referencia} vs {args.motor}] rtol={args.rtol:g}")
+    filas = []
+
+    def _imprimir(fila):
+        estado = "OK " if fila["equivalente"] else "DIF"
+        print(
+            f"  {estado} {fila['escenario']:<40} {fila['pares']:>8,} pares "
+            f"{fila['referencia_s']:>8.3f}s -> {fila['motor_s']:>7.3f}s "
+            f"x{fila['speedup']:.1f}",
+        )
+        for error in fila["diferencias"]:
+            print(f"      {error}")
+
+    for generador in escenarios:
+        for nombre, datos in generador:
+            filas.append(comparar_escenario(nombre, datos, args))
+            _imprimir(filas[-1])
+    if args.modelo_original:
+        for fila in escenario_modelo_original(args):
+            filas.append(fila)
+            _imprimir(fila)
+
+    fallidos = [f["escenario"] for f in filas if not f["equivalente"]]
+    speedups = [f["speedup"] for f in filas if f["speedup"]]
+    if speedups:
+        print(f"Speedup mediano: x{np.median(speedups):.1f} ({len(filas)} escenarios)")
+    if args.out:
+        salida = {"entorno": entorno(), "parametros": vars(args), "resultados": filas}
+        out = Path(args.out)
+        out.write_text(json.dumps(salida, ensure_ascii=False, indent=2), encoding="utf-8")
+        print(f"[OK] -> {out.resolve()}")
+    if fallidos:
+        print(f"[ERROR] {len(fallidos)} escenarios no equivalentes: {fallidos}")
+        return 1
+    print("[OK] Todos los escenarios son equivalentes")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
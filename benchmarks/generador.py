@@ -0,0 +1,200 @@
+"""Generador de datos sintéticos con el esquema real de lotes y tolerancias
+
+Reproduce las columnas de Data/Lotes_*.xlsx y Data/Tolerancia_*.xlsx ya
+normalizadas (como las entrega load_data): ESPECIE, LINEA PRODUCTO, KILOS_REAL,
+PROMSOLSOL, PROMFIRMEZA, calibres 100.0__XX, bins de color 400.0__, defectos
+500.0__/600.0__ y una columna de tolerancia por cada variable de la hoja Cruce.
+Disminución y Cruce son las hojas reales del repositorio.
+"""
+
+import shutil
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from utils.data_loader import ESPECIES_CONFIG, F_CRUCE, F_DISMINUCION
+from utils.export import write_excel_bytes
+from utils.helpers import norm_cols
+
+# Calibres (frutos por caja) presentes en los archivos reales
+CALIBRES = [18, 20, 23, 24, 25, 27, 28, 30, 32, 33, 36, 39, 40, 42, 44, 45, 46, 48, 50]
+CALIBRES += [52, 56, 60, 66, 70, 72, 78, 84, 88, 98, 108]
+
+# Límite de filas de una hoja Excel (load_data solo se puede medir bajo este tamaño)
+MAX_FILAS_EXCEL = 1_048_575
+
+
+def cargar_hojas_compartidas(base_dir=None):
+    """Hojas reales de Disminución y Cruce de Variables (normalizadas)."""
+    base_dir = Path() if base_dir is None else Path(base_dir)
+    disminucion = norm_cols(pd.read_excel(base_dir / F_DISMINUCION))
+    cruce = norm_cols(pd.read_excel(base_dir / F_CRUCE))
+    return disminucion, cruce
+
+
+def variables_cruce(cruce):
+    """Columnas de lotes y de tolerancias que exige la hoja Cruce.
+
+    Returns:
+        dict con 'color' (bins 400.0__) y 'defectos' (pares tolerancia -> columna
+        500.0__/600.0__ de las categorías CALIDAD y CONDICION)
+
+    """
+    comparacion = cruce["VARIABLE DE COMPARACION"].astype(str).str.strip()
+    categoria = cruce["CATEGORIA"].astype(str).str.strip().str.upper()
+    color = (
+        comparacion[(categoria == "COLOR") & comparacion.str.startswith("400.0__")]
+        .str.split(" porcentaje")
+        .str[0]
+        .str.strip()
+        .tolist()
+    )
+    defectos = {
+        str(tol).strip(): var
+        for tol, var, cat in zip(cruce["VARIABLES TOLERANCIAS"], comparacion, categoria)
+        if cat in ("CALIDAD", "CONDICION") and pd.notna(tol)
+    }
+    return {"color": color, "defectos": defectos}
+
+
+def generar_lotes(n_lotes, cruce, especie="DURAZNOS", lineas=("BLANCOS",), seed=0):
+    """Lotes sintéticos (una fila por lote) con el esquema de Data/Lotes_*.xlsx."""
+    rng = np.random.default_rng(seed)
+    variables = variables_cruce(cruce)
+    n = int(n_lotes)
+
+    kilos = rng.lognormal(np.log(8000), 0.8, n)
+    # ~1% de lotes con kilos negativos (ajustes), como en los datos reales
+    negativos = rng.random(n) < 0.01
+    kilos[negativos] = -rng.uniform(100, 3000, negativos.sum())
+
+    def _promedio(media, desvio):
+        valores = np.clip(rng.normal(media, desvio, n), 0, None)
+        # ~5% sin medición (0), como en los datos reales
+        valores[rng.random(n) < 0.05] = 0.0
+        return valores
+
+    columnas = {
+        "LOTE": np.arange(1, n + 1),
+        "ESPECIE": especie,
+        "LINEA PRODUCTO": np.asarray(lineas, dtype=object)[np.arange(n) % len(lineas)],
+        "DESC_PRODUCTOR": pd.Series(np.arange(n) % 200).map("PRODUCTOR {:03d}".format),
+        "KILOS_REAL": kilos.round(2),
+        "PROMFIRMEZA": _promedio(12.5, 2.0),
+        "PROMSOLSOL": _promedio(11.5, 1.8),
+    }
+
+    # Calibres: 100 frutos por lote, concentrados alrededor de un calibre central
+    posiciones = np.arange(len(CALIBRES))
+    centro = rng.uniform(8, 24, n)[:, None]
+    pesos = np.exp(-(((posiciones[None, :] - centro) / 2.5) ** 2))
+    conteos = rng.multinomial(100, pesos / pesos.sum(axis=1, keepdims=True))
+    for j, calibre in enumerate(CALIBRES):
+        columnas[f"100.0__{calibre}"] = conteos[:, j]
+
+    # Color: porcentaje del lote en cada bin (suma 100)
+    color = rng.dirichlet(np.ones(len(variables["color"])), n) * 100
+    for j, nombre in enumerate(variables["color"]):
+        columnas[nombre] = color[:, j].round(1)
+
+    # Defectos de calidad/condición: conteos pequeños por lote
+    for nombre in dict.fromkeys(variables["defectos"].values()):
+        columnas[nombre] = rng.poisson(rng.uniform(0.2, 3.0), n)
+
+    return pd.DataFrame(columnas)
+
+
+def generar_tolerancias(n_mcs, cruce, especie="DURAZNOS", lineas=("BLANCOS",), seed=0):
+    """Tolerancias sintéticas (una fila por mercado-cliente y línea) con el esquema real."""
+    rng = np.random.default_rng(seed + 1)
+    variables = variables_cruce(cruce)
+    n = int(n_mcs) * len(lineas)
+
+    calibre_sup = rng.choice(CALIBRES[4:16], n)
+    columnas = {
+        "MERCADO-CLIENTE": [f"MC-{j:05d}" for j in range(int(n_mcs)) for _ in lineas],
+        "ESPECIE": especie,
+        "LINEA PRODUCTO": list(lineas) * int(n_mcs),
+        "BRIX": rng.choice([7.0, 7.6, 8.0, 9.0, 10.0, 11.0], n),
+        "FIRMEZAS SUPERIORES": rng.integers(12, 17, n),
+        "FIRMEZA INFERIOR": rng.integers(7, 11, n),
+        "SUMATORIA CONDICION": rng.integers(5, 11, n),
+        "SUMATORIA CALIDAD": rng.integers(8, 15, n),
+        "PORC_COLOR CUBRIMIENTO MIN": rng.choice([0, 30, 40, 50], n),
+        "CALIBRE SUPERIOR": calibre_sup,
+        "CALIBRE INFERIOR": [
+            CALIBRES[min(CALIBRES.index(c) + int(d), len(CALIBRES) - 1)]
+            for c, d in zip(calibre_sup, rng.integers(3, 10, n))
+        ],
+    }
+    for tolerancia in variables["defectos"]:
+        columnas[tolerancia] = rng.integers(0, 10, n)
+    return pd.DataFrame(columnas)
+
+
+def generar_resumen_mc(tolerancias, seed=0):
+    """ResumenMC sintético (MERCADO-CLIENTE, LOTES_OK, KILOS_ASIGNABLE) para process_clusters."""
+    rng = np.random.default_rng(seed + 2)
+    mcs = tolerancias["MERCADO-CLIENTE"].drop_duplicates().to_numpy()
+    kilos = rng.lognormal(np.log(200_000), 1.2, len(mcs)).round(2)
+    # ~10% de MCs sin lotes asignables
+    kilos[rng.random(len(mcs)) < 0.1] = 0.0
+    return pd.DataFrame(
+        {
+            "MERCADO-CLIENTE": mcs,
+            "LOTES_OK": rng.integers(0, 500, len(mcs)) * (kilos > 0),
+            "KILOS_ASIGNABLE": kilos,
+        },
+    )
+
+
+def generar_datos(
+    n_lotes,
+    n_mcs,
+    especie="DURAZNOS",
+    lineas=("BLANCOS",),
+    seed=0,
+    base_dir=None,
+):
+    """Datos sintéticos completos, con la misma forma que devuelve load_data.
+
+    Args:
+        n_lotes: número de lotes (en total, repartidos entre las líneas)
+        n_mcs: número de mercados-clientes por línea
+        especie: valor de la columna ESPECIE
+        lineas: líneas de producto
+        seed: semilla (mismos argumentos = mismos datos)
+        base_dir: carpeta con Disminucion.xlsx y Cruce de Variables.xlsx
+
+    Returns:
+        dict con 'lotes', 'tolerancias', 'disminucion' y 'cruce'
+
+    """
+    disminucion, cruce = cargar_hojas_compartidas(base_dir)
+    return {
+        "lotes": generar_lotes(n_lotes, cruce, especie, lineas, seed),
+        "tolerancias": generar_tolerancias(n_mcs, cruce, especie, lineas, seed),
+        "disminucion": disminucion,
+        "cruce": cruce,
+    }
+
+
+def escribir_excel(datos, destino, especie_config="Durazno Blanco", base_dir=None):
+    """Escribe los datos como los archivos de entrada de una especie de ESPECIES_CONFIG.
+
+    Así load_data / process_species_linea(especie_config, ..., base_dir=destino)
+    leen los datos sintéticos. Las hojas compartidas se copian desde base_dir.
+    """
+    if len(datos["lotes"]) > MAX_FILAS_EXCEL:
+        raise ValueError(f"Una hoja Excel admite hasta {MAX_FILAS_EXCEL:,} lotes")
+    destino = Path(destino)
+    base_dir = Path() if base_dir is None else Path(base_dir)
+    config = ESPECIES_CONFIG[especie_config]
+    for clave, hoja in (("lotes", "Lotes"), ("tolerancias", "Tolerancias")):
+        ruta = destino / config[clave]
+        ruta.parent.mkdir(parents=True, exist_ok=True)
+        ruta.write_bytes(write_excel_bytes([(hoja, datos[clave])]))
+    for compartido in (F_DISMINUCION, F_CRUCE):
+        shutil.copyfile(base_dir / compartido, destino / compartido)
+    return destino
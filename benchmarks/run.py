@@ -0,0 +1,232 @@
+"""Benchmarks del pipeline sobre datos sintéticos (tiempo y memoria pico, en JSON)
+
+Uso (desde la raíz del repositorio):
+  python -m benchmarks.run                                  # 1.000 lotes x 10 MCs
+  python -m benchmarks.run --lotes 1000 10000 --mcs 10 100 --out bench.json
+  python -m benchmarks.run --comparar bench_base.json bench.json
+
+Etapas medidas por cada combinación lotes x MCs:
+  load_data              lectura de los Excel sintéticos (hasta --max-lotes-excel lotes)
+  process_asignacion     evaluación de reglas (hasta --max-pares pares lote x MC)
+  process_clusters       clustering y tolerancias por cluster
+  export_xlsx / export_parquet   exportación de los resultados completos
+  process_species_linea  pipeline completo desde los Excel
+
+Cada etapa se ejecuta --repeticiones veces (se reporta mediana y mínimo) y una
+vez más con tracemalloc para la memoria pico (omitir con --sin-memoria). Las
+etapas fuera de los límites quedan en el JSON con estado 'omitido'.
+"""
+
+import argparse
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.generador import escribir_excel, generar_datos, generar_resumen_mc
+from utils.cluster_processor import process_clusters
+from utils.data_loader import load_data
+from utils.data_processor import process_asignacion
+from utils.export import tablas_resultados, write_bundle_bytes, write_excel_bytes
+from utils.processor import process_species_linea
+
+ESPECIE_CONFIG = "Durazno Blanco"
+LINEA = "BLANCOS"
+
+
+def medir(fn, repeticiones=3, memoria=True):
+    """Tiempos de `repeticiones` ejecuciones de fn() y memoria pico de una ejecución extra."""
+    segundos = []
+    for _ in range(repeticiones):
+        t0 = time.perf_counter()
+        fn()
+        segundos.append(time.perf_counter() - t0)
+    pico_mb = None
+    if memoria:
+        tracemalloc.start()
+        try:
+            fn()
+            pico_mb = tracemalloc.get_traced_memory()[1] / 2**20
+        finally:
+            tracemalloc.stop()
+    return {
+        "estado": "ok",
+        "segundos": segundos,
+        "mediana_s": statistics.median(segundos),
+        "min_s": min(segundos),
+        "pico_mb": pico_mb,
+    }
+
+
+def _asignacion(datos):
+    return process_asignacion(
+        datos["lotes"],
+        datos["tolerancias"].copy(),
+        datos["disminucion"].copy(),
+        datos["cruce"].copy(),
+        linea_producto=LINEA,
+    )
+
+
+def benchmark_caso(n_lotes, n_mcs, args):
+    """Mide todas las etapas para una combinación lotes x MCs. Devuelve una fila por etapa."""
+    datos = generar_datos(n_lotes, n_mcs, lineas=(LINEA,), seed=args.seed)
+    pares = n_lotes * n_mcs
+    caso = {"lotes": n_lotes, "mcs": n_mcs, "pares": pares}
+    filas = []
+
+    def correr(etapa, fn, omitir=None):
+        print(f"  {etapa:<22}", end=" ", flush=True)
+        if omitir:
+            fila = {"estado": "omitido", "motivo": omitir}
+            print(f"omitido ({omitir})")
+        else:
+            fila = medir(fn, args.repeticiones, not args.sin_memoria)
+            pico = "" if fila["pico_mb"] is None else f" · pico {fila['pico_mb']:.1f} MB"
+            print(f"{fila['mediana_s']:.3f}s{pico}")
+        filas.append({"etapa": etapa, **caso, **fila})
+
+    sin_excel = f"más de {args.max_lotes_excel:,} lotes" if n_lotes > args.max_lotes_excel else None
+    sin_asignacion = f"más de {args.max_pares:,} pares" if pares > args.max_pares else None
+
+    with tempfile.TemporaryDirectory() as tmp:
+        if sin_excel is None:
+            escribir_excel(datos, tmp, ESPECIE_CONFIG, args.base_dir)
+        correr(
+            "load_data",
+            lambda: load_data(ESPECIE_CONFIG, LINEA, Path(tmp)),
+            sin_excel,
+        )
+
+        asignacion = None if sin_asignacion else _asignacion(datos)
+        correr("process_asignacion", lambda: _asignacion(datos), sin_asignacion)
+
+        # El clustering se mide sobre un ResumenMC sintético: escala con los MCs,
+        # sin depender de que la asignación sea medible
+        resumen_mc = generar_resumen_mc(datos["tolerancias"], seed=args.seed)
+        correr(
+            "process_clusters",
+            lambda: process_clusters(resumen_mc, datos["tolerancias"], datos["cruce"], k=args.k),
+        )
+
+        resultados = None
+        if asignacion is not None:
+            clusters = process_clusters(
+                asignacion["resumen_mc"],
+                datos["tolerancias"],
+                datos["cruce"],
+                k=args.k,
+            )
+            resultados = {"asignacion": asignacion, "clusters": clusters}
+        for formato, escribir in (
+            ("xlsx", lambda: write_excel_bytes(tablas_resultados(resultados))),
+            ("parquet", lambda: write_bundle_bytes(tablas_resultados(resultados), "parquet")),
+        ):
+            correr(f"export_{formato}", escribir, sin_asignacion)
+
+        correr(
+            "process_species_linea",
+            lambda: process_species_linea(ESPECIE_CONFIG, LINEA, k=args.k, base_dir=Path(tmp)),
+            sin_excel or sin_asignacion,
+        )
+    return filas
+
+
+def _commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def entorno():
+    """Versión del código y del entorno, para comparar resultados entre corridas."""
+    return {
+        "fecha": datetime.now().isoformat(timespec="seconds"),
+        "commit": _commit(),
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "numpy": np.__version__,
+        "plataforma": platform.platform(),
+        "procesador": platform.processor() or platform.machine(),
+    }
+
+
+def comparar(base, nuevo, umbral=1.2):
+    """Compara dos JSON de benchmarks (mediana y memoria pico por etapa y tamaño).
+
+    Returns:
+        DataFrame con una fila por etapa x lotes x MCs medida en ambos, RATIO =
+        mediana nueva / base y REGRESION si RATIO supera el umbral
+
+    """
+    key = ["etapa", "lotes", "mcs"]
+    cols = [*key, "mediana_s", "pico_mb"]
+
+    def _tabla(resultado):
+        df = pd.DataFrame(resultado["resultados"])
+        return df[df["estado"] == "ok"].reindex(columns=cols)
+
+    m = _tabla(base).merge(_tabla(nuevo), on=key, suffixes=("_base", "_nuevo"))
+    m["RATIO"] = (m["mediana_s_nuevo"] / m["mediana_s_base"]).round(3)
+    m["REGRESION"] = m["RATIO"] > umbral
+    return m
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Benchmarks del pipeline con datos sintéticos")
+    ap.add_argument("--lotes", type=int, nargs="+", default=[1000])
+    ap.add_argument("--mcs", type=int, nargs="+", default=[10])
+    ap.add_argument("--repeticiones", type=int, default=3)
+    ap.add_argument("--k", type=int, default=5)
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--max-pares", type=int, default=1_000_000)
+    ap.add_argument("--max-lotes-excel", type=int, default=100_000)
+    ap.add_argument("--sin-memoria", action="store_true")
+    ap.add_argument("--base-dir", default=".")
+    ap.add_argument("--out", default=None)
+    ap.add_argument("--comparar", nargs=2, metavar=("BASE", "NUEVO"))
+    ap.add_argument("--umbral", type=float, default=1.2)
+    args = ap.parse_args(argv)
+
+    if args.comparar:
+        base, nuevo = (json.loads(Path(p).read_text(encoding="utf-8")) for p in args.comparar)
+        tabla = comparar(base, nuevo, args.umbral)
+        print(f"[base]  {base['entorno'].get('commit')} {base['entorno']['fecha']}")
+        print(f"[nuevo] {nuevo['entorno'].get('commit')} {nuevo['entorno']['fecha']}")
+        print(tabla.to_string(index=False) if not tabla.empty else "Sin etapas en común")
+        return 0
+
+    resultados = []
+    for n_lotes in args.lotes:
+        for n_mcs in args.mcs:
+            print(f"[{n_lotes:,} lotes x {n_mcs:,} MCs]")
+            resultados += benchmark_caso(n_lotes, n_mcs, args)
+
+    salida = {
+        "entorno": entorno(),
+        "parametros": {k: v for k, v in vars(args).items() if k not in ("out", "comparar")},
+        "resultados": resultados,
+    }
+    out = Path(args.out or f"bench_{datetime.now():%Y%m%d_%H%M%S}.json")
+    out.write_text(json.dumps(salida, ensure_ascii=False, indent=2), encoding="utf-8")
+    print(f"[OK] -> {out.resolve()}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
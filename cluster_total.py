@@ -18,6 +18,7 @@ Parámetros principales (CLI):
   --clusters    K (default: 5)
   --qmin        cuantiles MIN (ej: "0.9,0.7,0.5,0.3,0.1" o "90,70,50,30,10")
   --qmax        cuantiles MAX (ej: "0.1,0.3,0.5,0.7,0.9" o "10,30,50,70,90")
+  --method      método de clustering: quantiles (default), ckmeans o jenks
 
 Lógica por defecto si no pasas --qmin/--qmax:
   MIN:  0.90, 0.70, 0.50, 0.30, 0.10
@@ -25,12 +26,21 @@ Lógica por defecto si no pasas --qmin/--qmax:
 """
 
 import argparse
-import unicodedata
 from pathlib import Path
 
 import numpy as np
 import pandas as pd
 
+from utils.cluster_processor import (
+    CLUSTER_METHODS,
+    assign_clusters,
+    var_kind,
+    within_cluster_stats,
+)
+from utils.export import FORMATOS_EXPORT, write_tables_file
+from utils.helpers import SchemaResolver, canon, parse_quantiles_arg
+from utils.numeros import a_numero
+
 
 # ---------------- HELPERS ----------------
 def norm_cols(df):
@@ -38,51 +48,6 @@ def norm_cols(df):
     return df
 
 
-def canon(s: str) -> str:
-    s = unicodedata.normalize("NFKD", str(s))
-    s = "".join(ch for ch in s if not unicodedata.combining(ch))
-    s = s.upper().strip()
-    return s.replace(" ", "").replace("_", "").replace("-", "").replace("/", "")
-
-
-def to_num_series(ser: pd.Series) -> pd.Series:
-    return (
-        ser.astype(str)
-        .str.replace("%", "", regex=False)
-        .str.replace(",", ".", regex=False)
-        .str.replace("\xa0", "", regex=False)
-        .str.replace(r"[^0-9\.\-]", "", regex=True)
-        .pipe(pd.to_numeric, errors="coerce")
-    )
-
-
-def pick_col(df, candidates):
-    cmap = {canon(c): c for c in df.columns}
-    for cand in candidates:
-        if canon(cand) in cmap:
-            return cmap[canon(cand)]
-    for c in df.columns:
-        if any(canon(cand) in canon(c) for cand in candidates):
-            return c
-    raise KeyError(f"No encontré {candidates}. Columnas: {list(df.columns)}")
-
-
-def assign_clusters_quantiles(series: pd.Series, k: int):
-    s = pd.to_numeric(series, errors="coerce").fillna(0.0)
-    if s.nunique() <= 1:
-        return pd.Series(np.ones(len(s), dtype=int), index=s.index)
-    labels = pd.qcut(
-        s.rank(method="average", ascending=True),
-        q=min(k, s.nunique()),
-        labels=range(1, min(k, s.nunique()) + 1),
-        duplicates="drop",
-    ).astype(int)
-    if labels.nunique() < k:
-        bins = np.linspace(s.min(), s.max(), num=k + 1)
-        labels = pd.cut(s, bins=bins, labels=range(1, k + 1), include_lowest=True).astype(int)
-    return labels
-
-
 def enforce_monotone(vals, kind):
     # kind='min' -> no-creciente; kind='max' -> no-decreciente
     v = [np.nan if pd.isna(x) else float(x) for x in vals]
@@ -123,24 +88,6 @@ def weighted_quantile(values, quantile, sample_weight=None):
     return float(v[idx])
 
 
-def parse_quantiles_arg(s: str):
-    """Acepta '0.9,0.7,0.5' o '90,70,50'. Convierte a [0..1]. Ignora espacios."""
-    if s is None:
-        return None
-    parts = [p.strip() for p in s.split(",") if p.strip() != ""]
-    out = []
-    for p in parts:
-        try:
-            x = float(p.replace("%", ""))
-            if x > 1.0:
-                x = x / 100.0
-            x = min(max(x, 0.0), 1.0)
-            out.append(x)
-        except BaseException:
-            continue
-    return out if out else None
-
-
 def expand_or_interpolate_q(q_list, k, descending=True):
     """Devuelve una lista de longitud k.
     - Si len==k: la devuelve tal cual.
@@ -190,6 +137,18 @@ def main():
         default=None,
         help="Cuantiles MAX, ej: '0.1,0.3,0.5,0.7,0.9' o '10,30,50,70,90'",
     )
+    ap.add_argument(
+        "--method",
+        default="quantiles",
+        choices=list(CLUSTER_METHODS),
+        help="Método de clustering: quantiles (rangos), ckmeans/jenks (k-means 1-D óptimo)",
+    )
+    ap.add_argument(
+        "--formato",
+        default="xlsx",
+        choices=list(FORMATOS_EXPORT),
+        help="Formato de salida: xlsx (default) o zip con tablas parquet/arrow/csv + manifest.json",
+    )
     args = ap.parse_args()
 
     K = max(1, int(args.clusters))
@@ -204,7 +163,7 @@ def main():
     qmin = expand_or_interpolate_q(qmin_in if qmin_in else qmin_def, K, descending=True)
     qmax = expand_or_interpolate_q(qmax_in if qmax_in else qmax_def, K, descending=False)
 
-    print(f"[INFO] K={K}")
+    print(f"[INFO] K={K} | método={args.method}")
     print(f"[INFO] Cuantiles MIN por cluster (C1..C{K}): {qmin}")
     print(f"[INFO] Cuantiles MAX por cluster (C1..C{K}): {qmax}")
 
@@ -212,13 +171,14 @@ def main():
     F_RES = Path(args.in_res)
     res = pd.read_excel(F_RES, sheet_name="ResumenMC")
     res = norm_cols(res)
-    col_mc = pick_col(res, ["MERCADO-CLIENTE", "MERCADO_CLIENTE"])
-    col_kg = pick_col(res, ["KILOS_ASIGNABLE", "KILOS_ASIGNABLES"])
+    esquema = SchemaResolver.de(res)
+    col_mc = esquema.col(["MERCADO-CLIENTE", "MERCADO_CLIENTE"])
+    col_kg = esquema.col(["KILOS_ASIGNABLE", "KILOS_ASIGNABLES"])
     res[col_kg] = pd.to_numeric(res[col_kg], errors="coerce").fillna(0.0)
 
     res = res[[col_mc, col_kg]].sort_values(col_kg, ascending=True).reset_index(drop=True)
     res["RANK_EXIGENCIA"] = np.arange(1, len(res) + 1)
-    res["CLUSTER"] = assign_clusters_quantiles(res[col_kg], k=K)
+    res["CLUSTER"] = assign_clusters(res[col_kg], k=K, method=args.method)
 
     summary = (
         res.groupby("CLUSTER", as_index=False)
@@ -227,9 +187,15 @@ def main():
             KG_TOTAL=(col_kg, "sum"),
             KG_MEDIANA=(col_kg, "median"),
             KG_PROMEDIO=(col_kg, "mean"),
+            KG_VARIANZA=(col_kg, lambda s: float(s.var(ddof=0))),
         )
         .sort_values("CLUSTER")
     )
+    calidad = within_cluster_stats(res[col_kg], res["CLUSTER"], method=args.method)
+    print(
+        f"[INFO] Varianza intra-cluster: {calidad['VARIANZA_INTRA'].iloc[0]:.2f} "
+        f"(explicada: {calidad['VARIANZA_EXPLICADA'].iloc[0]:.1%})",
+    )
 
     # ---- Load Tolerancias + Cruce ----
     tol = norm_cols(pd.read_excel(Path(args.in_tol)))
@@ -256,18 +222,8 @@ def main():
     }
     min_like = {canon("BRIX"), canon("PORC_COLOR CUBRIMIENTO MIN"), canon("FIRMEZA INFERIOR")}
 
-    def var_kind(var):
-        key = canon(var)
-        if key in min_like:
-            return "min"
-        if key in max_like:
-            return "max"
-        if "SUMATORIA" in key or "FIRMEZASSUPERIORES" in key or "FIRMEZASUPERIOR" in key:
-            return "max"
-        return "max"  # por seguridad, defectos -> tope MAX
-
     # Join tolerancias + clusters + pesos (W=KILOS_ASIGNABLE)
-    col_mc_tol = pick_col(tol, ["MERCADO-CLIENTE", "MERCADO_CLIENTE"])
+    col_mc_tol = SchemaResolver.de(tol).col(["MERCADO-CLIENTE", "MERCADO_CLIENTE"])
     tolj = tol.merge(
         res[[col_mc, col_kg, "CLUSTER"]],
         left_on=col_mc_tol,
@@ -294,16 +250,21 @@ def main():
             seen.add(canon(v))
             tmp.append(v)
     var_rows = tmp
+    # Tipo MIN/MAX (ver utils.cluster_processor.var_kind) y conversión a número, una vez
+    # por variable
+    tipos = {v: var_kind(v, max_like, min_like) for v in var_rows}
+    for v in var_rows:
+        tolj[v] = a_numero(tolj[v])
 
     # ---- ESTRICTOS/LAXOS + FUENTES ----
     crit_rows, lax_rows, crit_src, lax_src = [], [], [], []
 
     for var in var_rows:
-        kind = var_kind(var)
+        kind = tipos[var]
         rowc = {"VARIABLE": var}
         rowl = {"VARIABLE": var}
         for c in range(1, K + 1):
-            ser = to_num_series(tolj.loc[tolj["CLUSTER"] == c, var])
+            ser = tolj.loc[tolj["CLUSTER"] == c, var]
             names = tolj.loc[tolj["CLUSTER"] == c, col_mc_tol]
             if ser.dropna().empty:
                 vc = vl = np.nan
@@ -338,7 +299,7 @@ def main():
     def make_mono(df_in):
         df = df_in.copy()
         for i, r in df.iterrows():
-            kd = var_kind(r["VARIABLE"])
+            kd = tipos[r["VARIABLE"]]
             vals = [r[f"C{c}"] for c in range(1, K + 1)]
             fixed = enforce_monotone(vals, kd)
             for c in range(1, K + 1):
@@ -353,10 +314,10 @@ def main():
     def make_sugeridas_quantile(tolj_df):
         rows = []
         for var in var_rows:
-            kd = var_kind(var)
+            kd = tipos[var]
             rec = {"VARIABLE": var}
             for c in range(1, K + 1):
-                ser = to_num_series(tolj_df.loc[tolj_df["CLUSTER"] == c, var])
+                ser = tolj_df.loc[tolj_df["CLUSTER"] == c, var]
                 w = pd.to_numeric(
                     tolj_df.loc[tolj_df["CLUSTER"] == c, "W"],
                     errors="coerce",
@@ -383,6 +344,27 @@ def main():
         engine = "openpyxl"
 
     OUT = Path(args.out)
+    if args.formato != "xlsx":
+        hojas = [
+            (
+                "ClustersMC",
+                res.rename(columns={col_mc: "MERCADO-CLIENTE", col_kg: "KILOS_ASIGNABLE"}),
+            ),
+            ("Clusters_Summary", summary),
+            ("Clusters_Calidad", calidad),
+            ("Tol_Criticos", crit_df),
+            ("Tol_Laxos", lax_df),
+            ("Tol_Crit_Mono", crit_mono),
+            ("Tol_Lax_Mono", lax_mono),
+            ("Tol_Crit_Src", crit_src_df),
+            ("Tol_Lax_Src", lax_src_df),
+            ("Tol_Sugeridas", tol_sug),
+            ("Tol_Sug_Mono", tol_sug_mono),
+        ]
+        OUT = write_tables_file(hojas, OUT, args.formato, {"clusters": K, "metodo": args.method})
+        print(f"[OK] -> {OUT.resolve()}")
+        return
+
     with pd.ExcelWriter(OUT, engine=engine, mode="w") as xw:
         # Clusters
         res.rename(columns={col_mc: "MERCADO-CLIENTE", col_kg: "KILOS_ASIGNABLE"}).to_excel(
@@ -391,6 +373,7 @@ def main():
             sheet_name="ClustersMC",
         )
         summary.to_excel(xw, index=False, sheet_name="Clusters_Summary")
+        calidad.to_excel(xw, index=False, sheet_name="Clusters_Calidad")
         # Estrictos/Laxos
         crit_df.to_excel(xw, index=False, sheet_name="Tol_Criticos")
         lax_df.to_excel(xw, index=False, sheet_name="Tol_Laxos")
@@ -0,0 +1,250 @@
+"""procesar.py (pipeline completo en un solo proceso, cualquier especie y línea)
+------------------------------------------------------------------------------
+Reemplaza el flujo ModeloCarozos2.py -> Excel -> cluster_total.py: la asignación
+y el clustering se encadenan en memoria (utils.cache.PipelineCache, sobre
+process_species_linea), sin escribir ni releer ResumenMC desde Excel.
+
+Genera, por cada línea de producto, un archivo con las mismas tablas que la
+descarga de la app (ClustersMC, Tol_*, AsignacionDetalle, ResumenMC, ResumenLote).
+
+Parámetros principales (CLI):
+  --especie     especie a procesar (ver --listar)
+  --linea       línea(s) de producto; se puede repetir (default: todas las de la especie)
+  --clusters    K (default: 5)
+  --qmin        cuantiles MIN (ej: "0.9,0.7,0.5,0.3,0.1" o "90,70,50,30,10")
+  --qmax        cuantiles MAX (ej: "0.1,0.3,0.5,0.7,0.9" o "10,30,50,70,90")
+  --method      método de clustering: quantiles (default), ckmeans o jenks
+  --formato     xlsx (default), parquet, arrow o csv
+  --out-dir     carpeta de salida (default: .)
+  --dump-asignacion  escribe además la asignación intermedia (AsignacionDetalle,
+                ResumenMC, ResumenLote) con el layout de ModeloCarozos2.py
+  --store       carpeta del almacén persistente de resultados (default: .carozos_store);
+                un análisis repetido con los mismos archivos y parámetros se lee de ahí
+  --sin-store   no leer ni guardar en el almacén
+  --historial   lista los análisis guardados y termina
+  --comparar A B  compara dos análisis guardados (ids de --historial): MCs que
+                cambiaron de cluster, lotes que cambiaron de pasa/falla, delta de
+                kilos por MC y celdas de tolerancia; escribe Diff_<A>_<B> en --out-dir
+  --snapshot    snapshot de la capa de carga (default: .carozos_snapshot.pkl); si
+                existe y los Excel no cambiaron, se usa en vez de parsearlos
+  --crear-snapshot  parsea los Excel de todas las especies, escribe --snapshot y termina
+  --motor       motor de evaluación de reglas: filas (default, referencia),
+                vectorizado (mismo resultado, ver benchmarks/equivalencia.py) o
+                adaptativo (reglas más selectivas primero; RAZONES solo con la
+                primera falla) o duckdb (mismo resultado; join y reglas en SQL
+                fuera de memoria, requiere 'pip install duckdb', ver utils/motor_sql.py)
+  --metricas    archivo JSON lines donde registrar tiempo, CPU, memoria y filas de
+                cada etapa (ver utils.instrumentation)
+  --tolerancias origen de las tolerancias: especie (default, Tolerancia_*.xlsx) o
+                consolidado (Data/Tolerancias_Total_Dividido.xlsx, hoja TOTAL NORM,
+                leída una sola vez para todas las especies)
+  --verificar-tolerancias  compara el consolidado con los archivos por especie,
+                imprime el resumen, escribe VerificacionTolerancias en --out-dir y termina
+  --listar      muestra especies y líneas disponibles y termina
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+from utils.cache import PipelineCache
+from utils.cluster_processor import CLUSTER_METHODS
+from utils.data_loader import FUENTES_TOLERANCIAS, get_especies_disponibles
+from utils.data_processor import MOTORES_ASIGNACION
+from utils.diff import KILOS_RESUMEN, diff_results
+from utils.export import FORMATOS_EXPORT, tablas_resultados, write_tables_file
+from utils.helpers import parse_quantiles_arg
+from utils.instrumentation import Instrumentacion, sink_jsonl
+from utils.progress import ETAPAS
+from utils.store import ResultStore
+from utils.tolerancias_total import verificar_consolidado
+
+
+def _slug(s):
+    return str(s).replace(" ", "_").replace("/", "-")
+
+
+def progress_printer():
+    """Callback de progreso que imprime una línea al terminar cada etapa."""
+    t0 = {"t": time.perf_counter()}
+
+    def _progress(etapa, avance, info):
+        if avance >= 1.0 and etapa in ETAPAS:
+            dt = time.perf_counter() - t0["t"]
+            t0["t"] = time.perf_counter()
+            print(f"  [{etapa}] {dt:.2f}s")
+
+    return _progress
+
+
+def comparar(pipeline, id_a, id_b, out_dir, formato):
+    """Diff entre dos análisis del store: imprime el resumen y escribe las tablas."""
+    runs = {rid: pipeline.load_run(rid) for rid in (id_a, id_b)}
+    faltantes = [rid for rid, r in runs.items() if r is None]
+    if faltantes:
+        print(f"[ERROR] Análisis no encontrados en el store: {faltantes} (ver --historial)")
+        return 1
+
+    diff = diff_results(runs[id_a], runs[id_b])
+    for rid, r in runs.items():
+        meta = r["meta"]
+        print(
+            f"[{rid}] {meta['especie']} | {meta['linea_producto']} | K={meta['k']} | {meta['method']}"
+        )
+    for columna, valor in diff["resumen"].iloc[0].items():
+        if columna in KILOS_RESUMEN:
+            print(f"  {columna:<22} {valor:>14,.2f}")
+        else:
+            print(f"  {columna:<22} {int(valor):>14,d}")
+
+    out_dir.mkdir(parents=True, exist_ok=True)
+    ruta = write_tables_file(
+        list(diff.items()),
+        out_dir / f"Diff_{id_a}_{id_b}.xlsx",
+        formato,
+        {"run_a": id_a, "run_b": id_b},
+    )
+    print(f"[OK] -> {ruta.resolve()}")
+    return 0
+
+
+def verificar_tolerancias(base_dir, out_dir, formato):
+    """Consistencia del consolidado contra los archivos por especie: resumen y celdas distintas."""
+    verificacion = verificar_consolidado(base_dir)
+    resumen = verificacion["resumen"]
+    print(resumen.to_string(index=False))
+    out_dir.mkdir(parents=True, exist_ok=True)
+    ruta = write_tables_file(
+        [("Resumen", resumen), ("Celdas", verificacion["celdas"])],
+        out_dir / "VerificacionTolerancias.xlsx",
+        formato,
+        {"base_dir": str(Path(base_dir).resolve())},
+    )
+    print(f"[OK] -> {ruta.resolve()}")
+    return 0 if (resumen["ESTADO"] == "ok").all() else 1
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Asignación + clustering por especie y línea")
+    ap.add_argument("--especie", choices=get_especies_disponibles())
+    ap.add_argument("--linea", action="append", default=None)
+    ap.add_argument("--base-dir", default=".")
+    ap.add_argument("--out-dir", default=".")
+    ap.add_argument("--clusters", type=int, default=5)
+    ap.add_argument("--qmin", default=None)
+    ap.add_argument("--qmax", default=None)
+    ap.add_argument("--method", default="quantiles", choices=list(CLUSTER_METHODS))
+    ap.add_argument("--formato", default="xlsx", choices=list(FORMATOS_EXPORT))
+    ap.add_argument("--dump-asignacion", action="store_true")
+    ap.add_argument("--store", default=".carozos_store")
+    ap.add_argument("--sin-store", action="store_true")
+    ap.add_argument("--historial", action="store_true")
+    ap.add_argument("--comparar", nargs=2, metavar=("RUN_A", "RUN_B"))
+    ap.add_argument("--snapshot", default=".carozos_snapshot.pkl")
+    ap.add_argument("--crear-snapshot", action="store_true")
+    ap.add_argument("--motor", default="filas", choices=list(MOTORES_ASIGNACION))
+    ap.add_argument("--metricas", default=None)
+    ap.add_argument("--tolerancias", default="especie", choices=list(FUENTES_TOLERANCIAS))
+    ap.add_argument("--verificar-tolerancias", action="store_true")
+    ap.add_argument("--listar", action="store_true")
+    args = ap.parse_args(argv)
+
+    if args.verificar_tolerancias:
+        return verificar_tolerancias(args.base_dir, Path(args.out_dir), args.formato)
+
+    store = None if args.sin_store else ResultStore(args.store)
+    pipeline = PipelineCache(Path(args.base_dir), store=store, tolerancias=args.tolerancias)
+
+    if args.crear_snapshot:
+        resumen = pipeline.warm()
+        for especie, info in resumen["especies"].items():
+            print(f"  {especie}: {info['origen']} ({info['segundos']:.2f}s)")
+        ruta = pipeline.write_snapshot(args.snapshot)
+        print(f"[OK] snapshot ({resumen['segundos']:.2f}s) -> {ruta.resolve()}")
+        return 0
+    pipeline.read_snapshot(args.snapshot)
+
+    if args.historial:
+        runs = store.list_runs(tipo="clusters") if store is not None else None
+        if runs is None or runs.empty:
+            print("Sin análisis guardados")
+        else:
+            cols = ["id", "especie", "linea_producto", "k", "method", "qmin", "qmax", "creado"]
+            print(runs[cols].to_string(index=False))
+        return 0
+
+    if args.listar:
+        for especie in get_especies_disponibles():
+            try:
+                lineas = ", ".join(pipeline.lineas(especie))
+            except FileNotFoundError as e:
+                lineas = f"(sin datos: {e})"
+            print(f"{especie}: {lineas}")
+        return 0
+
+    if args.comparar:
+        return comparar(pipeline, *args.comparar, Path(args.out_dir), args.formato)
+
+    if args.especie is None:
+        ap.error("--especie es obligatorio (use --listar para ver las disponibles)")
+
+    lineas = args.linea or pipeline.lineas(args.especie)
+    qmin = parse_quantiles_arg(args.qmin)
+    qmax = parse_quantiles_arg(args.qmax)
+    out_dir = Path(args.out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    print(
+        f"[INFO] {args.especie} | líneas={lineas} | K={args.clusters} | método={args.method}"
+        f" | motor={args.motor}",
+    )
+    sink_metricas = sink_jsonl(args.metricas) if args.metricas else None
+    for linea in lineas:
+        print(f"[{linea}]")
+        instrumentacion = (
+            Instrumentacion(sink_metricas, especie=args.especie, linea_producto=linea)
+            if sink_metricas is not None
+            else None
+        )
+        resultados = pipeline.run(
+            args.especie,
+            linea,
+            k=args.clusters,
+            qmin=qmin,
+            qmax=qmax,
+            method=args.method,
+            progress=progress_printer(),
+            instrumentacion=instrumentacion,
+            motor=args.motor,
+        )
+        print(f"  origen: {resultados['cache']}")
+        metadata = {
+            "especie": args.especie,
+            "linea_producto": linea,
+            "run_id": resultados["run_id"],
+        }
+        base = out_dir / f"{_slug(args.especie)}_{_slug(linea)}"
+
+        if args.dump_asignacion:
+            asignacion = resultados["asignacion"]
+            hojas = [
+                ("AsignacionDetalle", asignacion["detalle"]),
+                ("ResumenMC", asignacion["resumen_mc"]),
+                ("ResumenLote", asignacion["resumen_lote"]),
+            ]
+            ruta = write_tables_file(hojas, f"{base}_Asignacion.xlsx", args.formato, metadata)
+            print(f"  [dump] -> {ruta.resolve()}")
+
+        ruta = write_tables_file(
+            tablas_resultados(resultados),
+            f"{base}_Clusters.xlsx",
+            args.formato,
+            metadata,
+        )
+        print(f"[OK] -> {ruta.resolve()}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,198 @@
+"""Análisis bootstrap de estabilidad de clusters y tolerancias sugeridas"""
+
+import os
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from .cluster_processor import (
+    assign_clusters,
+    expand_quantiles,
+    index_cluster,
+    prepare_tolerancias,
+    tolerancias_cluster,
+)
+
+
+def _matriz_lote_mc(detalle):
+    """Pivotea ASIGNABLE_KG a una matriz (lotes x mercados-clientes)."""
+    piv = detalle.pivot_table(
+        index="LOTE",
+        columns="MERCADO-CLIENTE",
+        values="ASIGNABLE_KG",
+        aggfunc="sum",
+        fill_value=0.0,
+    )
+    return piv.to_numpy(dtype=float), piv.columns.tolist()
+
+
+def _bootstrap_batch(ctx, seed, n_rep):
+    """Ejecuta n_rep réplicas bootstrap (se corre dentro de un proceso del pool).
+
+    Cada réplica remuestrea lotes con reemplazo: como el resultado de un par
+    LOTE x MERCADO-CLIENTE no depende del resto de lotes, KILOS_ASIGNABLE por
+    MC se recalcula como conteos_de_lotes @ matriz_asignable, sin re-evaluar reglas.
+    """
+    rng = np.random.default_rng(seed)
+    A = ctx["A"]
+    K = ctx["K"]
+    prep = ctx["prepared"]
+    n_lotes = A.shape[0]
+    tol_pos = ctx["tol_pos"]
+    tiene_mc = tol_pos >= 0
+
+    labels_out = np.zeros((n_rep, A.shape[1]), dtype=np.int16)
+    sug_out = np.full((n_rep, len(prep["var_rows"]), K), np.nan)
+
+    for r in range(n_rep):
+        counts = rng.multinomial(n_lotes, np.full(n_lotes, 1.0 / n_lotes))
+        kilos = counts @ A
+        labels = assign_clusters(pd.Series(kilos), k=K, method=ctx["method"]).to_numpy()
+        labels_out[r] = labels
+
+        cl = np.where(tiene_mc, labels[tol_pos], 0)
+        W = np.where(tiene_mc, kilos[tol_pos], np.nan)
+        for c in range(1, K + 1):
+            idx = index_cluster(prep["V"], np.flatnonzero(cl == c))
+            tc = tolerancias_cluster(idx, W, prep, ctx["qmin"][c - 1], ctx["qmax"][c - 1])
+            sug_out[r, :, c - 1] = tc["sug"]
+
+    return labels_out, sug_out
+
+
+def bootstrap_clusters(
+    asignacion,
+    tolerancias_df,
+    cruce_df,
+    k=5,
+    qmin=None,
+    qmax=None,
+    method="quantiles",
+    n_boot=200,
+    alpha=0.05,
+    seed=None,
+    n_jobs=None,
+    base_clusters=None,
+):
+    """Estima la estabilidad de los clusters remuestreando lotes (bootstrap).
+
+    Args:
+        asignacion: dict de process_asignacion (usa 'detalle')
+        tolerancias_df: DataFrame con tolerancias originales
+        cruce_df: DataFrame con cruce de variables
+        k: Número de clusters (default: 5)
+        qmin: Lista de cuantiles MIN (default: [0.9, 0.7, 0.5, 0.3, 0.1])
+        qmax: Lista de cuantiles MAX (default: [0.1, 0.3, 0.5, 0.7, 0.9])
+        method: Método de clustering (ver CLUSTER_METHODS)
+        n_boot: Número de réplicas bootstrap (default: 200)
+        alpha: Nivel para intervalos de confianza percentil (default: 0.05 -> IC 95%)
+        seed: Semilla para reproducibilidad (default: None)
+        n_jobs: Procesos del pool (default: os.cpu_count(); 1 = sin pool)
+        base_clusters: dict de process_clusters sobre los datos completos (opcional,
+            para reportar el cluster y la tolerancia base)
+
+    Returns:
+        dict con:
+            - 'membresia': probabilidad de pertenencia por MERCADO-CLIENTE y cluster
+              (P_C1..P_CK), cluster más frecuente y ESTABILIDAD (prob. del cluster base)
+            - 'tol_sug_ic': por VARIABLE y CLUSTER, media, IC_INF, IC_SUP y réplicas válidas
+            - 'n_boot': número de réplicas realizadas
+
+    """
+    K = max(1, int(k))
+    qmin, qmax = expand_quantiles(K, qmin, qmax)
+    prepared = prepare_tolerancias(tolerancias_df, cruce_df)
+    A, mcs = _matriz_lote_mc(asignacion["detalle"])
+
+    # Posición de cada fila de tolerancia en la matriz de MCs
+    pos = {mc: i for i, mc in enumerate(mcs)}
+    ctx = {
+        "A": A,
+        "K": K,
+        "qmin": qmin,
+        "qmax": qmax,
+        "method": method,
+        "prepared": prepared,
+        "tol_pos": np.array(
+            [pos.get(mc, -1) for mc in prepared["tol"][prepared["col_mc"]]],
+            dtype=int,
+        ),
+    }
+
+    n_boot = max(1, int(n_boot))
+    n_jobs = max(1, min(n_jobs or os.cpu_count() or 1, n_boot))
+    sizes = [len(b) for b in np.array_split(np.arange(n_boot), n_jobs)]
+    seeds = np.random.SeedSequence(seed).spawn(n_jobs)
+
+    if n_jobs == 1:
+        partes = [_bootstrap_batch(ctx, seeds[0], sizes[0])]
+    else:
+        with ProcessPoolExecutor(max_workers=n_jobs) as pool:
+            futures = [
+                pool.submit(_bootstrap_batch, ctx, s, n) for s, n in zip(seeds, sizes) if n > 0
+            ]
+            partes = [f.result() for f in futures]
+
+    labels = np.concatenate([p[0] for p in partes])
+    sug = np.concatenate([p[1] for p in partes])
+
+    # Membresía por MC
+    membresia = pd.DataFrame({"MERCADO-CLIENTE": mcs})
+    for c in range(1, K + 1):
+        membresia[f"P_C{c}"] = (labels == c).mean(axis=0)
+    prob_cols = [f"P_C{c}" for c in range(1, K + 1)]
+    membresia["CLUSTER_MODA"] = membresia[prob_cols].to_numpy().argmax(axis=1) + 1
+
+    if base_clusters is not None:
+        base_mc = base_clusters["clusters_mc"][["MERCADO-CLIENTE", "CLUSTER"]]
+        membresia = membresia.merge(
+            base_mc.rename(columns={"CLUSTER": "CLUSTER_BASE"}),
+            on="MERCADO-CLIENTE",
+            how="left",
+        )
+        probs = membresia[prob_cols].to_numpy()
+        idx = membresia["CLUSTER_BASE"].fillna(0).astype(int).to_numpy() - 1
+        membresia["ESTABILIDAD"] = np.where(
+            idx >= 0,
+            probs[np.arange(len(probs)), np.clip(idx, 0, K - 1)],
+            np.nan,
+        )
+    else:
+        membresia["ESTABILIDAD"] = membresia[prob_cols].max(axis=1)
+
+    # Intervalos de confianza sobre Tol_Sugeridas
+    validos = (~np.isnan(sug)).sum(axis=0)
+    with warnings.catch_warnings():
+        # Celdas sin datos en ninguna réplica quedan como NaN
+        warnings.simplefilter("ignore", category=RuntimeWarning)
+        media = np.nanmean(sug, axis=0)
+        ic_inf = np.nanquantile(sug, alpha / 2, axis=0)
+        ic_sup = np.nanquantile(sug, 1 - alpha / 2, axis=0)
+
+    rows = []
+    for i, var in enumerate(prepared["var_rows"]):
+        for c in range(1, K + 1):
+            rows.append(
+                {
+                    "VARIABLE": var,
+                    "CLUSTER": c,
+                    "MEDIA": round(float(media[i, c - 1]), 2),
+                    "IC_INF": round(float(ic_inf[i, c - 1]), 2),
+                    "IC_SUP": round(float(ic_sup[i, c - 1]), 2),
+                    "REPLICAS_VALIDAS": int(validos[i, c - 1]),
+                },
+            )
+    tol_sug_ic = pd.DataFrame(rows)
+
+    if base_clusters is not None:
+        base_sug = base_clusters["tol_sugeridas"].melt(
+            id_vars="VARIABLE",
+            var_name="CLUSTER",
+            value_name="VALOR_BASE",
+        )
+        base_sug["CLUSTER"] = base_sug["CLUSTER"].str.lstrip("C").astype(int)
+        tol_sug_ic = tol_sug_ic.merge(base_sug, on=["VARIABLE", "CLUSTER"], how="left")
+
+    return {"membresia": membresia, "tol_sug_ic": tol_sug_ic, "n_boot": len(labels)}
@@ -0,0 +1,738 @@
+"""Caché por capas del pipeline: carga, asignación y clustering"""
+
+import hashlib
+import os
+import pickle
+import sys
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from .cluster_editor import build_cluster_state
+from .cluster_processor import expand_quantiles, prepare_tolerancias
+from .data_loader import (
+    filter_linea,
+    get_especies_disponibles,
+    input_files,
+    lineas_from_lotes,
+    read_inputs,
+)
+from .data_processor import MOTORES_EXACTOS, process_asignacion
+from .instrumentation import etapa
+from .processor import run_clusters
+from .progress import check_cancel, report
+
+
+def nbytes(obj, _vistos=None) -> int:
+    """Tamaño aproximado en memoria de DataFrames y arrays anidados en dicts, listas y tuplas.
+
+    Cada objeto se cuenta una sola vez aunque aparezca referenciado varias veces.
+    """
+    vistos = set() if _vistos is None else _vistos
+    if id(obj) in vistos:
+        return 0
+    vistos.add(id(obj))
+    if isinstance(obj, pd.DataFrame):
+        return int(obj.memory_usage(index=True, deep=True).sum())
+    if isinstance(obj, pd.Series):
+        return int(obj.memory_usage(index=True, deep=True))
+    if isinstance(obj, np.ndarray):
+        return int(obj.nbytes)
+    if isinstance(obj, dict):
+        return sum(nbytes(v, vistos) for v in obj.values())
+    if isinstance(obj, (list, tuple)):
+        return sum(nbytes(v, vistos) for v in obj)
+    return sys.getsizeof(obj)
+
+
+class MemoryBudget:
+    """Presupuesto de memoria compartido por varias LRUCache.
+
+    Lleva el tamaño (nbytes) y el orden de uso de las entradas de todas las
+    cachés registradas; al superar max_bytes descarta la entrada usada hace más
+    tiempo, sea de la capa que sea. La entrada recién guardada nunca se descarta.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = int(max_bytes)
+        self._orden = OrderedDict()  # (id(cache), key) -> (cache, bytes)
+        self._lock = threading.Lock()
+        self.expulsiones = 0
+
+    def usado(self):
+        with self._lock:
+            return sum(size for _, size in self._orden.values())
+
+    def touch(self, cache, key):
+        with self._lock:
+            if (id(cache), key) in self._orden:
+                self._orden.move_to_end((id(cache), key))
+
+    def track(self, cache, key, size):
+        """Registra (o actualiza) una entrada y expulsa las más antiguas si hace falta."""
+        clave = (id(cache), key)
+        expulsar = []
+        with self._lock:
+            self._orden[clave] = (cache, int(size))
+            self._orden.move_to_end(clave)
+            total = sum(s for _, s in self._orden.values())
+            for otra, (c, s) in list(self._orden.items()):
+                if total <= self.max_bytes or otra == clave:
+                    break
+                del self._orden[otra]
+                expulsar.append((c, otra[1]))
+                total -= s
+            self.expulsiones += len(expulsar)
+        for c, k in expulsar:
+            c._drop(k)
+
+    def forget(self, cache, keys):
+        with self._lock:
+            for key in keys:
+                self._orden.pop((id(cache), key), None)
+
+    def stats(self):
+        return {"bytes": self.usado(), "max_bytes": self.max_bytes, "expulsiones": self.expulsiones}
+
+
+class LRUCache:
+    """Caché LRU acotada por número de entradas, segura entre hilos.
+
+    Con `budget` (MemoryBudget) las entradas cuentan además contra un
+    presupuesto de memoria compartido. Registra aciertos/fallos para diagnóstico.
+    """
+
+    def __init__(self, maxsize=16, budget=None):
+        self.maxsize = max(1, int(maxsize))
+        self.budget = budget
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                value = self._data[key]
+            else:
+                self.misses += 1
+                return default
+        if self.budget is not None:
+            self.budget.touch(self, key)
+        return value
+
+    def put(self, key, value):
+        expulsadas = []
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                expulsadas.append(self._data.popitem(last=False)[0])
+        if self.budget is not None:
+            self.budget.forget(self, expulsadas)
+            self.budget.track(self, key, nbytes(value))
+
+    def _drop(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def get_or_compute(self, key, fn):
+        """Devuelve (valor, hit). Si no está, calcula fn() y lo guarda."""
+        sentinel = object()
+        value = self.get(key, sentinel)
+        if value is not sentinel:
+            return value, True
+        value = fn()
+        self.put(key, value)
+        return value, False
+
+    def discard(self, predicate):
+        """Elimina las entradas cuya clave cumple predicate(key). Devuelve cuántas."""
+        with self._lock:
+            keys = [k for k in self._data if predicate(k)]
+            for k in keys:
+                del self._data[k]
+        if self.budget is not None:
+            self.budget.forget(self, keys)
+        return len(keys)
+
+    def clear(self):
+        with self._lock:
+            keys = list(self._data)
+            self._data.clear()
+        if self.budget is not None:
+            self.budget.forget(self, keys)
+
+    def keys(self):
+        with self._lock:
+            return list(self._data)
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._data
+
+    def stats(self):
+        return {
+            "entradas": len(self),
+            "max": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+_hash_memo = {}
+_hash_lock = threading.Lock()
+
+
+def file_hash(path) -> str:
+    """Hash de contenido de un archivo, memoizado por (ruta, tamaño, mtime).
+
+    Solo se relee el archivo cuando cambia su tamaño o fecha de modificación.
+    """
+    path = Path(path)
+    st = path.stat()
+    memo_key = (str(path.resolve()), st.st_size, st.st_mtime_ns)
+    with _hash_lock:
+        if memo_key in _hash_memo:
+            return _hash_memo[memo_key]
+    h = hashlib.blake2b(path.read_bytes(), digest_size=16).hexdigest()
+    with _hash_lock:
+        _hash_memo[memo_key] = h
+    return h
+
+
+def run_id(key) -> str:
+    """Identificador corto y estable de una ejecución a partir de su clave de caché."""
+    return hashlib.blake2b(repr(key).encode(), digest_size=8).hexdigest()
+
+
+def _qkey(q):
+    return None if not q else tuple(float(x) for x in q)
+
+
+def _params_run(key_cl):
+    """Parámetros de PipelineCache.run() que generan la clave de clusters key_cl."""
+    i = key_cl.index("clusters")
+    k, q_min, q_max, method = key_cl[i + 1 : i + 5]
+    return {
+        "especie": key_cl[1],
+        "linea_producto": key_cl[2],
+        "k": k,
+        "qmin": list(q_min) if q_min else None,
+        "qmax": list(q_max) if q_max else None,
+        "method": method,
+        # Los motores exactos comparten la clave: se reconstruye con el más rápido
+        "motor": key_cl[4] if i == 5 else "vectorizado",
+    }
+
+
+# Versión del formato del snapshot de carga (cambiarla invalida los snapshots previos)
+SNAPSHOT_VERSION = 2
+
+
+class PipelineCache:
+    """Memoiza por separado las tres etapas de process_species_linea.
+
+    - carga: Excel parseados por especie (+ tolerancias preparadas por línea),
+      clave = especie + hashes de los archivos de entrada
+    - asignación: clave = especie, línea y hashes de entrada
+    - clustering: clave de asignación + K, cuantiles y método
+
+    Cambiar solo K o los percentiles reutiliza carga y asignación, y re-ejecuta
+    únicamente el clustering. Los resultados en caché se comparten: no deben
+    modificarse en el lugar.
+
+    Con `store` (utils.store.ResultStore), asignación y clustering se guardan
+    también en disco y sobreviven a reinicios: si no están en memoria se leen
+    del store antes de recalcular.
+
+    Con `max_bytes`, las tres capas comparten un presupuesto de memoria
+    (MemoryBudget): al superarlo se descartan las entradas usadas hace más
+    tiempo. Una instancia puede compartirse entre hilos/sesiones: un mismo
+    análisis se calcula una vez y todos reciben la misma referencia.
+
+    `warm()` precarga la capa de carga de todas las especies (Excel parseados,
+    líneas y tolerancias preparadas por línea), idealmente desde un snapshot
+    escrito con `write_snapshot()`; pensado para correr en segundo plano al
+    iniciar el servidor.
+
+    Con `tolerancias="consolidado"` las tolerancias de todas las especies salen
+    del archivo consolidado (utils.tolerancias_total), leído una sola vez; su
+    hash reemplaza al del archivo de la especie en las claves.
+    """
+
+    def __init__(
+        self,
+        base_dir: Path = None,
+        max_carga=8,
+        max_asignacion=16,
+        max_clusters=64,
+        store=None,
+        max_bytes=None,
+        tolerancias="especie",
+    ):
+        self.base_dir = Path() if base_dir is None else Path(base_dir)
+        self.tolerancias = tolerancias
+        self.store = store
+        self.budget = MemoryBudget(max_bytes) if max_bytes else None
+        self.carga = LRUCache(max_carga, self.budget)
+        self.asignacion = LRUCache(max_asignacion, self.budget)
+        self.clusters = LRUCache(max_clusters, self.budget)
+        # Solo mientras alguien lo usa: el lock de una clave se libera al terminar su cálculo
+        self._locks = weakref.WeakValueDictionary()
+        self._locks_lock = threading.Lock()
+        # Entradas de carga leídas de un snapshot, pendientes de usar: (especie, hashes) -> carga
+        self._snapshot = {}
+
+    def _archivos(self, especie):
+        return input_files(especie, self.base_dir, self.tolerancias)
+
+    def _hashes(self, especie):
+        archivos = self._archivos(especie)
+        for archivo in archivos.values():
+            if not archivo.exists():
+                raise FileNotFoundError(f"Archivo no encontrado: {archivo}")
+        return tuple((nombre, file_hash(ruta)) for nombre, ruta in archivos.items())
+
+    def load(self, especie):
+        """Datos sin filtrar de una especie (lotes, tolerancias, disminución, cruce)."""
+        hashes = self._hashes(especie)
+
+        def _load():
+            previo = self._snapshot.pop((especie, hashes), None)
+            if previo is not None:
+                return previo
+            datos = read_inputs(self._archivos(especie), self.tolerancias)
+            return {"datos": datos, "lineas": lineas_from_lotes(datos["lotes"]), "por_linea": {}}
+
+        key = ("carga", especie, hashes)
+        with self._key_lock(key):
+            carga, _ = self.carga.get_or_compute(key, _load)
+        return carga, hashes
+
+    def _key_lock(self, key):
+        """Lock por clave: sesiones que piden el mismo análisis esperan al primer cálculo."""
+        with self._locks_lock:
+            lock = self._locks.get(key)
+            if lock is None:
+                lock = self._locks[key] = threading.Lock()
+            return lock
+
+    def lineas(self, especie):
+        """Líneas de producto de una especie (sin releer el Excel si ya está en caché)."""
+        return self.load(especie)[0]["lineas"]
+
+    def _linea(self, especie, linea_producto):
+        """Datos filtrados y tolerancias preparadas de una línea. Devuelve (entrada, hit)."""
+        carga, hashes = self.load(especie)
+        key = ("carga", especie, hashes)
+        with self._key_lock(key + (linea_producto,)):
+            entrada = carga["por_linea"].get(linea_producto)
+            if entrada is not None:
+                return entrada, True
+            # Filtro por línea y tolerancias preparadas, una vez por línea
+            datos_linea = filter_linea(carga["datos"], linea_producto)
+            entrada = carga["por_linea"][linea_producto] = {
+                "datos": datos_linea,
+                "prepared": prepare_tolerancias(datos_linea["tolerancias"], datos_linea["cruce"]),
+            }
+        # Re-registra la entrada para que el presupuesto de memoria vea su nuevo tamaño
+        self.carga.put(key, carga)
+        return entrada, False
+
+    def datos(self, especie, linea_producto):
+        """Datos de carga (lotes, tolerancias, disminucion, cruce) de una línea, desde la caché."""
+        return self._linea(especie, linea_producto)[0]["datos"]
+
+    def write_snapshot(self, path, especies=None):
+        """Escribe en un solo archivo la capa de carga de las especies indicadas (default: todas).
+
+        Cada especie se guarda con los hashes de sus archivos de entrada: al leer
+        el snapshot se descartan las especies cuyos archivos cambiaron.
+        """
+        especies = get_especies_disponibles() if especies is None else especies
+        contenido = {}
+        for especie in especies:
+            carga, hashes = self.load(especie)
+            for linea in carga["lineas"]:
+                self._linea(especie, linea)
+            contenido[(especie, hashes)] = carga
+        path = Path(path)
+        tmp = path.with_name(f".{path.name}.tmp")
+        with open(tmp, "wb") as f:
+            pickle.dump(
+                {"version": SNAPSHOT_VERSION, "carga": contenido},
+                f,
+                protocol=pickle.HIGHEST_PROTOCOL,
+            )
+        os.replace(tmp, path)
+        return path
+
+    def read_snapshot(self, path):
+        """Deja disponibles las entradas del snapshot (solo se usan si los hashes coinciden).
+
+        Returns:
+            número de especies leídas (0 si no existe o es de otra versión)
+
+        """
+        try:
+            with open(path, "rb") as f:
+                contenido = pickle.load(f)
+        except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+            return 0
+        if not isinstance(contenido, dict) or contenido.get("version") != SNAPSHOT_VERSION:
+            return 0
+        self._snapshot.update(contenido["carga"])
+        return len(contenido["carga"])
+
+    def warm(self, especies=None, snapshot=None):
+        """Precarga la capa de carga (Excel, líneas y tolerancias por línea) de las especies.
+
+        Args:
+            especies: especies a precargar (default: todas)
+            snapshot: ruta opcional de un snapshot de write_snapshot
+
+        Returns:
+            dict con el tiempo total y, por especie, el origen ('hit', 'snapshot',
+            'excel' o 'error') y los segundos que tomó
+
+        """
+        t0 = time.perf_counter()
+        if snapshot is not None:
+            self.read_snapshot(snapshot)
+        por_especie = {}
+        for especie in get_especies_disponibles() if especies is None else especies:
+            t = time.perf_counter()
+            try:
+                hashes = self._hashes(especie)
+                hit = ("carga", especie, hashes) in self.carga
+                desde_snapshot = (especie, hashes) in self._snapshot
+                carga, _ = self.load(especie)
+                for linea in carga["lineas"]:
+                    self._linea(especie, linea)
+                origen = "hit" if hit else "snapshot" if desde_snapshot else "excel"
+            except (FileNotFoundError, ValueError, KeyError) as e:
+                origen = f"error: {e}"
+            por_especie[especie] = {"origen": origen, "segundos": time.perf_counter() - t}
+        # Entradas del snapshot que no coincidieron con los archivos actuales
+        self._snapshot.clear()
+        return {"segundos": time.perf_counter() - t0, "especies": por_especie}
+
+    def run(
+        self,
+        especie,
+        linea_producto,
+        k=5,
+        qmin=None,
+        qmax=None,
+        method="quantiles",
+        progress=None,
+        cancel=None,
+        instrumentacion=None,
+        motor="filas",
+    ):
+        """Equivalente a process_species_linea, con caché por etapas.
+
+        progress/cancel se propagan a las etapas que se ejecutan (ver utils.progress);
+        una ejecución cancelada no deja nada en caché. instrumentacion registra cada
+        capa con su origen (ver utils.instrumentation); las sub-etapas solo aparecen
+        cuando la capa se calcula. motor elige el motor de evaluación de la asignación;
+        los de MOTORES_EXACTOS dan el mismo resultado y comparten la clave, los demás
+        (adaptativo: RAZONES solo con la primera falla) tienen la suya.
+
+        Returns:
+            dict de process_species_linea + 'cache' con el origen de cada etapa
+            ('hit' memoria, 'store' almacén persistente, 'miss' calculado) y
+            'run_id' (mismo id para mismos datos de entrada y parámetros); con
+            instrumentacion, además 'instrumentacion' con los registros por etapa
+
+        """
+        report(progress, "carga", 0.0)
+        with etapa(instrumentacion, "carga") as medicion:
+            _, hashes = self.load(especie)
+            entrada, hit = self._linea(especie, linea_producto)
+            origen = {"carga": "hit" if hit else "miss"}
+            datos = entrada["datos"]
+            prepared = entrada["prepared"]
+            medicion.update(
+                origen=origen["carga"],
+                lotes=len(datos["lotes"]),
+                mcs=len(datos["tolerancias"]),
+            )
+        report(progress, "carga", 1.0)
+        check_cancel(cancel)
+
+        key_asig = ("asignacion", especie, linea_producto, hashes)
+        if motor not in MOTORES_EXACTOS:
+            key_asig += (motor,)
+        meta = {"especie": especie, "linea_producto": linea_producto, "hashes": dict(hashes)}
+        with etapa(instrumentacion, "asignacion") as medicion:
+            asignacion, origen["asignacion"] = self._capa(
+                self.asignacion,
+                key_asig,
+                lambda: process_asignacion(
+                    datos["lotes"],
+                    datos["tolerancias"].copy(),
+                    datos["disminucion"].copy(),
+                    datos["cruce"].copy(),
+                    especie=especie,
+                    linea_producto=linea_producto,
+                    progress=progress,
+                    cancel=cancel,
+                    instrumentacion=instrumentacion,
+                    motor=motor,
+                ),
+                a_store=lambda valor: {"asignacion": valor},
+                de_store=lambda secciones: secciones["asignacion"],
+                meta={"tipo": "asignacion", **meta},
+            )
+            medicion["origen"] = origen["asignacion"]
+        if origen["asignacion"] != "miss":
+            report(progress, "disminucion", 1.0)
+            report(progress, "evaluacion", 1.0, resumen_mc=asignacion["resumen_mc"])
+        check_cancel(cancel)
+
+        # Cuantiles ya expandidos a K: omitirlos o pasar los defaults es el mismo análisis
+        q_min, q_max = expand_quantiles(max(1, int(k)), qmin, qmax)
+        key_cl = key_asig + ("clusters", int(k), _qkey(q_min), _qkey(q_max), method)
+        with etapa(instrumentacion, "clusters", k=int(k)) as medicion:
+            resultado_clusters, origen["clusters"] = self._capa(
+                self.clusters,
+                key_cl,
+                lambda: run_clusters(
+                    asignacion,
+                    datos,
+                    prepared,
+                    k,
+                    qmin,
+                    qmax,
+                    method,
+                    progress,
+                    instrumentacion,
+                ),
+                a_store=lambda valor: {"clusters": valor["clusters"]},
+                # El estado de edición se reconstruye desde las tablas guardadas
+                de_store=lambda secciones: {
+                    "clusters": secciones["clusters"],
+                    "estado_clusters": build_cluster_state(
+                        secciones["clusters"],
+                        prepared,
+                        k,
+                        qmin,
+                        qmax,
+                        method,
+                    ),
+                },
+                meta={
+                    "tipo": "clusters",
+                    **meta,
+                    "asignacion_id": run_id(key_asig),
+                    "k": int(k),
+                    "qmin": _qkey(q_min),
+                    "qmax": _qkey(q_max),
+                    "method": method,
+                },
+            )
+            medicion["origen"] = origen["clusters"]
+        if origen["clusters"] != "miss":
+            report(progress, "clustering", 1.0)
+
+        resultados = {
+            "asignacion": asignacion,
+            **resultado_clusters,
+            "especie": especie,
+            "linea_producto": linea_producto,
+            "run_id": run_id(key_cl),
+            "cache": origen,
+        }
+        if instrumentacion is not None:
+            resultados["instrumentacion"] = instrumentacion.registros
+        return resultados
+
+    def _capa(self, capa, key, fn, a_store, de_store, meta):
+        """Busca en la caché en memoria, luego en el store persistente y si no, calcula.
+
+        Returns:
+            (valor, origen) con origen 'hit' (memoria), 'store' o 'miss' (calculado)
+
+        """
+        sentinel = object()
+        valor = capa.get(key, sentinel)
+        if valor is not sentinel:
+            return valor, "hit"
+        with self._key_lock(key):
+            # Otro hilo pudo calcularlo mientras se esperaba el lock
+            valor = capa.get(key, sentinel)
+            if valor is not sentinel:
+                return valor, "hit"
+            entry_id = run_id(key)
+            if self.store is not None:
+                secciones = self.store.get(entry_id)
+                if secciones is not None:
+                    valor = de_store(secciones)
+                    capa.put(key, valor)
+                    return valor, "store"
+            valor = fn()
+            capa.put(key, valor)
+            if self.store is not None:
+                self.store.put(entry_id, a_store(valor), meta)
+            return valor, "miss"
+
+    def invalidar(self, cambios, store=False):
+        """Descarta las entradas que dependen de versiones anteriores de archivos de entrada.
+
+        Solo se tocan las especies de cambios, y de ellas las entradas calculadas
+        con alguno de los hashes anteriores (ver utils.watcher.InputWatcher).
+
+        Args:
+            cambios: {especie: {nombre: hash anterior}}, nombre como en input_files
+            store: si es True, descarta también los análisis guardados en el store
+                con esos archivos (por defecto quedan para --historial y comparar)
+
+        Returns:
+            dict con las entradas descartadas por capa ('carga', 'asignacion',
+            'clusters', 'store') y 'runs': parámetros de run() de los análisis
+            descartados de memoria, para reconstruirlos
+
+        """
+        viejos = {especie: set(hashes.items()) for especie, hashes in cambios.items() if hashes}
+
+        def _depende(key):
+            # hashes en la posición 2 de las claves de carga y 3 en las de asignación/clusters
+            hashes = key[2] if key[0] == "carga" else key[3]
+            return key[1] in viejos and not viejos[key[1]].isdisjoint(hashes)
+
+        runs = [_params_run(key) for key in self.clusters.keys() if _depende(key)]
+        descartadas = {
+            nombre: capa.discard(_depende)
+            for nombre, capa in (
+                ("carga", self.carga),
+                ("asignacion", self.asignacion),
+                ("clusters", self.clusters),
+            )
+        }
+        for especie, hashes in list(self._snapshot):
+            if especie in viejos and not viejos[especie].isdisjoint(hashes):
+                del self._snapshot[(especie, hashes)]
+
+        descartadas["store"] = 0
+        if store and self.store is not None:
+            for meta in self.store.entries():
+                especie = meta.get("especie")
+                if especie in viejos and not viejos[especie].isdisjoint(
+                    meta.get("hashes", {}).items(),
+                ):
+                    self.store.discard(meta["id"])
+                    descartadas["store"] += 1
+        return {**descartadas, "runs": runs}
+
+    def load_run(self, entry_id):
+        """Tablas de un análisis guardado en el store (asignación + clusters), o None.
+
+        No requiere que los archivos de entrada actuales coincidan con los del análisis.
+        """
+        if self.store is None:
+            return None
+        clusters = self.store.get(entry_id)
+        meta = next((m for m in self.store.entries() if m["id"] == entry_id), None)
+        if clusters is None or meta is None or meta.get("tipo") != "clusters":
+            return None
+        asignacion = self.store.get(meta["asignacion_id"])
+        if asignacion is None:
+            return None
+        return {
+            "asignacion": asignacion["asignacion"],
+            "clusters": clusters["clusters"],
+            "especie": meta["especie"],
+            "linea_producto": meta["linea_producto"],
+            "run_id": entry_id,
+            "meta": meta,
+        }
+
+    def resultado(self, entry_id):
+        """Resultados de un análisis ya calculado, por run_id, sin volver a calcularlo.
+
+        Busca en la caché en memoria y si no, en el store (load_run); el estado de
+        edición de un análisis del store se reconstruye con las tolerancias de la
+        línea, que deben seguir siendo las mismas con que se calculó.
+
+        Returns:
+            dict como el de run() (con 'cache' del origen), o None si el análisis no
+            está ni en memoria ni en el store
+
+        Raises:
+            FileNotFoundError: si falta un archivo de entrada (análisis del store)
+            ValueError: si los archivos de entrada cambiaron desde el análisis del store
+
+        """
+        sentinel = object()
+        for key_cl in self.clusters.keys():
+            if run_id(key_cl) != entry_id:
+                continue
+            clusters = self.clusters.get(key_cl, sentinel)
+            asignacion = self.asignacion.get(key_cl[: key_cl.index("clusters")], sentinel)
+            if clusters is not sentinel and asignacion is not sentinel:
+                return {
+                    "asignacion": asignacion,
+                    **clusters,
+                    "especie": key_cl[1],
+                    "linea_producto": key_cl[2],
+                    "run_id": entry_id,
+                    "cache": {"carga": "hit", "asignacion": "hit", "clusters": "hit"},
+                }
+            break
+
+        guardado = self.load_run(entry_id)
+        if guardado is None:
+            return None
+        meta = guardado["meta"]
+        especie, linea_producto = meta["especie"], meta["linea_producto"]
+        if dict(self._hashes(especie)) != meta.get("hashes"):
+            raise ValueError(
+                f"Los archivos de entrada de {especie} cambiaron desde el análisis {entry_id}",
+            )
+        entrada, hit = self._linea(especie, linea_producto)
+        estado = build_cluster_state(
+            guardado["clusters"],
+            entrada["prepared"],
+            meta["k"],
+            meta["qmin"],
+            meta["qmax"],
+            meta["method"],
+        )
+        return {
+            "asignacion": guardado["asignacion"],
+            "clusters": guardado["clusters"],
+            "estado_clusters": estado,
+            "especie": especie,
+            "linea_producto": linea_producto,
+            "run_id": entry_id,
+            "cache": {
+                "carga": "hit" if hit else "miss",
+                "asignacion": "store",
+                "clusters": "store",
+            },
+        }
+
+    def stats(self):
+        return {
+            "carga": self.carga.stats(),
+            "asignacion": self.asignacion.stats(),
+            "clusters": self.clusters.stats(),
+            **({"memoria": self.budget.stats()} if self.budget is not None else {}),
+            **({"store": self.store.stats()} if self.store is not None else {}),
+        }
+
+    def clear(self):
+        for capa in (self.carga, self.asignacion, self.clusters):
+            capa.clear()
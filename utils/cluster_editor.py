@@ -0,0 +1,272 @@
+"""Edición de resultados: journal de cambios y re-cálculo incremental de tolerancias"""
+
+import math
+
+import numpy as np
+import pandas as pd
+
+from .cluster_processor import (
+    build_tol_tables,
+    cluster_arrays,
+    expand_quantiles,
+    index_cluster,
+    summarize_clusters,
+    tolerancias_cluster,
+)
+
+
+def _normalizar_clusters_mc(clusters_mc):
+    """Tipos consistentes para CLUSTER (int, 0 = sin cluster) y KILOS_ASIGNABLE."""
+    df = clusters_mc.copy()
+    df["KILOS_ASIGNABLE"] = pd.to_numeric(df["KILOS_ASIGNABLE"], errors="coerce").fillna(0.0)
+    df["CLUSTER"] = pd.to_numeric(df["CLUSTER"], errors="coerce").fillna(0).astype(int)
+    return df
+
+
+def build_cluster_state(clusters, prepared, k=5, qmin=None, qmax=None, method="quantiles"):
+    """Construye el estado para re-calcular tolerancias de forma incremental.
+
+    Args:
+        clusters: dict de process_clusters
+        prepared: resultado de prepare_tolerancias (matrices de tolerancia ya parseadas)
+        k / qmin / qmax: parámetros entregados a process_clusters
+        method: método de clustering usado
+
+    Returns:
+        dict con las tolerancias preparadas, los índices ordenados por cluster,
+        la firma (filas y pesos) de cada cluster y sus resultados
+
+    """
+    clusters_mc = _normalizar_clusters_mc(clusters["clusters_mc"])
+    K = max(1, int(k))
+    q_min, q_max = expand_quantiles(K, qmin, qmax)
+    cl, W = cluster_arrays(clusters_mc, prepared)
+
+    indices, firmas, por_cluster = {}, {}, {}
+    for c in range(1, K + 1):
+        filas = np.flatnonzero(cl == c)
+        indices[c] = index_cluster(prepared["V"], filas)
+        firmas[c] = (filas, W[filas])
+        por_cluster[c] = tolerancias_cluster(indices[c], W, prepared, q_min[c - 1], q_max[c - 1])
+
+    return {
+        "prepared": prepared,
+        "qmin_in": qmin,
+        "qmax_in": qmax,
+        "method": method,
+        "K": K,
+        "indices": indices,
+        "firmas": firmas,
+        "por_cluster": por_cluster,
+        "recalculados": [],
+    }
+
+
+def update_clusters(state, clusters_mc_editado):
+    """Re-calcula las tolerancias solo de los clusters cuya membresía o pesos cambiaron.
+
+    El estado recibido no se modifica: se devuelve uno nuevo que comparte los
+    índices y resultados de los clusters que no cambiaron.
+
+    Args:
+        state: estado de build_cluster_state (o de una llamada anterior)
+        clusters_mc_editado: DataFrame con MERCADO-CLIENTE, KILOS_ASIGNABLE y CLUSTER editados
+
+    Returns:
+        (clusters, nuevo_state): clusters tiene las mismas tablas que process_clusters;
+        nuevo_state['recalculados'] lista los clusters re-calculados
+
+    """
+    prepared = state["prepared"]
+    clusters_mc = _normalizar_clusters_mc(clusters_mc_editado)
+    K = max(state["K"], int(clusters_mc["CLUSTER"].max()))
+    q_min, q_max = expand_quantiles(K, state["qmin_in"], state["qmax_in"])
+    mismo_k = K == state["K"]
+    cl, W = cluster_arrays(clusters_mc, prepared)
+
+    indices = dict(state["indices"])
+    firmas = dict(state["firmas"])
+    por_cluster = dict(state["por_cluster"])
+    recalculados = []
+    for c in range(1, K + 1):
+        filas = np.flatnonzero(cl == c)
+        w = W[filas]
+        previo = state["firmas"].get(c)
+        misma_membresia = previo is not None and np.array_equal(previo[0], filas)
+        if misma_membresia and mismo_k and np.array_equal(previo[1], w, equal_nan=True):
+            continue
+        if not misma_membresia:
+            indices[c] = index_cluster(prepared["V"], filas)
+        firmas[c] = (filas, w)
+        por_cluster[c] = tolerancias_cluster(indices[c], W, prepared, q_min[c - 1], q_max[c - 1])
+        recalculados.append(c)
+
+    summary, calidad = summarize_clusters(
+        clusters_mc[clusters_mc["CLUSTER"] > 0],
+        method=f"{state['method']} (editado)",
+    )
+    clusters = {
+        "clusters_mc": clusters_mc,
+        "clusters_summary": summary,
+        "clusters_calidad": calidad,
+        **build_tol_tables(por_cluster, prepared, K),
+    }
+    nuevo_state = {
+        **state,
+        "K": K,
+        "indices": indices,
+        "firmas": firmas,
+        "por_cluster": por_cluster,
+        "recalculados": recalculados,
+    }
+    return clusters, nuevo_state
+
+
+def apply_edits(df, edited_rows):
+    """Aplica ediciones por celda sobre una copia del DataFrame.
+
+    Args:
+        df: DataFrame original (compartido, no se modifica)
+        edited_rows: {fila_posicional: {columna: valor}}, el formato de
+            'edited_rows' de st.data_editor
+
+    Returns:
+        DataFrame con las ediciones; sin ediciones devuelve el mismo df (sin copiar)
+
+    """
+    if not edited_rows:
+        return df
+    out = df.copy()
+    for fila, cambios in edited_rows.items():
+        for col, valor in cambios.items():
+            out.iloc[int(fila), out.columns.get_loc(col)] = valor
+    return out
+
+
+def _mismo_valor(a, b):
+    if a is None or b is None:
+        return a is b
+    try:
+        if isinstance(a, float) and isinstance(b, float) and math.isnan(a) and math.isnan(b):
+            return True
+        return bool(a == b)
+    except (TypeError, ValueError):
+        return False
+
+
+class EditJournal:
+    """Journal de ediciones por celda sobre tablas base inmutables.
+
+    Registra cada cambio como (tabla, fila, columna, valor_anterior, valor_nuevo)
+    sin copiar las tablas. La vista editada se materializa solo al pedirla
+    (memoizada por versión). Deshacer/rehacer mueven un cursor sobre el journal;
+    un cambio nuevo descarta lo que había para rehacer y resetear trunca el journal.
+
+    Las tablas base no se guardan en el journal: se pasan en cada llamada, así
+    la sesión no retiene una copia propia de los resultados compartidos.
+
+    Para usarlo con st.data_editor: el editor recibe `ancla(tabla, base)` con key
+    `f"...{journal.generacion[tabla]}"`, y después de cada edición se llama a
+    `sync(tabla, base, edited_rows)`. La generación de una tabla cambia solo al
+    deshacer, rehacer o resetear un cambio de esa tabla, que es cuando su editor
+    debe recrearse (los editores de las demás tablas conservan su estado).
+    """
+
+    def __init__(self, run_id, tablas):
+        self.run_id = run_id
+        self.tablas = list(tablas)
+        self.cambios = []
+        self.cursor = 0
+        self.version = 0
+        self.generacion = dict.fromkeys(self.tablas, 0)
+        self._anclas = {t: {} for t in self.tablas}
+        self._vistas = {}
+        # Estado incremental de clusters propio de la sesión (solo con ediciones)
+        self.estado_clusters = None
+
+    def delta(self, tabla, hasta=None):
+        """Ediciones vigentes de una tabla: {fila: {columna: valor}}."""
+        out = {}
+        for t, fila, col, _, nuevo in self.cambios[: self.cursor if hasta is None else hasta]:
+            if t == tabla:
+                out.setdefault(fila, {})[col] = nuevo
+        return out
+
+    def vista(self, tabla, base):
+        """Tabla base con las ediciones vigentes (sin ediciones, la misma base)."""
+        clave = (self.version, id(base))
+        memo = self._vistas.get(tabla)
+        if memo is None or memo[0] != clave:
+            memo = (clave, apply_edits(base, self.delta(tabla)))
+            self._vistas[tabla] = memo
+        return memo[1]
+
+    def ancla(self, tabla, base):
+        """Vista al inicio de la generación actual: los datos que recibe el editor."""
+        return apply_edits(base, self._anclas[tabla])
+
+    def sync(self, tabla, base, edited_rows):
+        """Registra las celdas que el editor cambió respecto del journal.
+
+        Args:
+            edited_rows: 'edited_rows' del editor, relativo a ancla(tabla, base)
+
+        Returns:
+            número de cambios nuevos registrados
+
+        """
+        vigente = self.delta(tabla)
+        nuevos = []
+        for fila, cambios in (edited_rows or {}).items():
+            fila = int(fila)
+            for col, valor in cambios.items():
+                if fila in vigente and col in vigente[fila]:
+                    anterior = vigente[fila][col]
+                else:
+                    anterior = base.iloc[fila, base.columns.get_loc(col)]
+                if not _mismo_valor(anterior, valor):
+                    nuevos.append((tabla, fila, col, anterior, valor))
+        if nuevos:
+            del self.cambios[self.cursor :]
+            self.cambios.extend(nuevos)
+            self.cursor = len(self.cambios)
+            self.version += 1
+        return len(nuevos)
+
+    def _nueva_generacion(self, tablas):
+        self.version += 1
+        for t in tablas:
+            self.generacion[t] += 1
+            self._anclas[t] = self.delta(t)
+        if "clusters_mc" in tablas:
+            self.estado_clusters = None
+
+    @property
+    def puede_deshacer(self):
+        return self.cursor > 0
+
+    @property
+    def puede_rehacer(self):
+        return self.cursor < len(self.cambios)
+
+    def undo(self):
+        if self.puede_deshacer:
+            self.cursor -= 1
+            self._nueva_generacion([self.cambios[self.cursor][0]])
+
+    def redo(self):
+        if self.puede_rehacer:
+            self.cursor += 1
+            self._nueva_generacion([self.cambios[self.cursor - 1][0]])
+
+    def reset(self, tabla=None):
+        """Descarta las ediciones (de una tabla o de todas) truncando el journal."""
+        if tabla is None:
+            self.cambios = []
+        else:
+            self.cambios = [c for c in self.cambios[: self.cursor] if c[0] != tabla]
+        self.cursor = len(self.cambios)
+        self._nueva_generacion(self.tablas if tabla is None else [tabla])
+
+    def n_cambios(self, tabla=None):
+        return sum(1 for c in self.cambios[: self.cursor] if tabla is None or c[0] == tabla)
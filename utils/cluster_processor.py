@@ -3,7 +3,9 @@
 import numpy as np
 import pandas as pd
 
-from .helpers import canon, norm_cols, pick_col, to_num_series
+from .helpers import SchemaResolver, canon, norm_cols
+from .instrumentation import etapa
+from .numeros import a_numero
 
 
 def assign_clusters_quantiles(series: pd.Series, k: int):
@@ -53,6 +55,137 @@ def assign_clusters_quantiles(series: pd.Series, k: int):
         return labels
 
 
+def _ckmeans_fill_row(D_prev, D_row, B_row, q, S1, S2, n):
+    """Llena una fila de la matriz de programación dinámica de Ckmeans.
+
+    Usa divide y conquista sobre la monotonía de los argmin (B[q][i] no decrece
+    con i), lo que deja cada fila en O(n·log n).
+    """
+    S1_arr, S2_arr, D_prev_arr = np.asarray(S1), np.asarray(S2), np.asarray(D_prev)
+    stack = [(q, n - 1, q, n - 1)]
+    while stack:
+        imin, imax, jmin, jmax = stack.pop()
+        if imin > imax:
+            continue
+        i = (imin + imax) // 2
+        lo = max(q, jmin)
+        hi = min(i, jmax)
+        if hi - lo < 64:
+            # Rangos cortos: el bucle simple evita el costo fijo de numpy
+            s1_i, s2_i = S1[i + 1], S2[i + 1]
+            best_j, best_cost = lo, np.inf
+            for j in range(lo, hi + 1):
+                s1 = s1_i - S1[j]
+                ssq = s2_i - S2[j] - s1 * s1 / (i - j + 1)
+                cost = D_prev[j - 1] + (ssq if ssq > 0.0 else 0.0)
+                if cost < best_cost:
+                    best_j, best_cost = j, cost
+        else:
+            j = np.arange(lo, hi + 1)
+            s1 = S1_arr[i + 1] - S1_arr[j]
+            ssq = S2_arr[i + 1] - S2_arr[j] - s1 * s1 / (i - j + 1)
+            cost = D_prev_arr[j - 1] + np.maximum(ssq, 0.0)
+            best = int(np.argmin(cost))
+            best_j, best_cost = lo + best, float(cost[best])
+        D_row[i] = best_cost
+        B_row[i] = best_j
+        stack.append((imin, i - 1, jmin, best_j))
+        stack.append((i + 1, imax, best_j, jmax))
+
+
+def ckmeans_1d(values, k: int):
+    """k-means 1-D óptimo (Ckmeans.1d.dp / cortes naturales de Jenks).
+
+    Minimiza la suma de cuadrados intra-cluster con programación dinámica en
+    O(n·k·log n). Devuelve etiquetas 1..k en el orden de `values`, con el
+    cluster 1 para los valores más bajos.
+    """
+    x = np.asarray(values, dtype=float)
+    n = len(x)
+    if n == 0:
+        return np.array([], dtype=int)
+    k = max(1, min(int(k), len(np.unique(x))))
+
+    order = np.argsort(x, kind="mergesort")
+    xs = x[order]
+    # Centrar mejora la estabilidad numérica de las sumas acumuladas
+    xs_c = xs - np.median(xs)
+    S1 = np.concatenate(([0.0], np.cumsum(xs_c)))
+    S2 = np.concatenate(([0.0], np.cumsum(xs_c * xs_c)))
+
+    cnt = np.arange(1, n + 1)
+    D = [np.maximum(S2[1:] - S1[1:] ** 2 / cnt, 0.0).tolist()]
+    B = [[0] * n]
+    S1, S2 = S1.tolist(), S2.tolist()
+    for q in range(1, k):
+        D_row, B_row = [np.inf] * n, [0] * n
+        _ckmeans_fill_row(D[q - 1], D_row, B_row, q, S1, S2, n)
+        D.append(D_row)
+        B.append(B_row)
+
+    # Backtracking de los cortes
+    labels_sorted = np.empty(n, dtype=int)
+    right = n - 1
+    for q in range(k - 1, -1, -1):
+        left = B[q][right] if q > 0 else 0
+        labels_sorted[left : right + 1] = q + 1
+        right = left - 1
+
+    labels = np.empty(n, dtype=int)
+    labels[order] = labels_sorted
+    return labels
+
+
+def assign_clusters_ckmeans(series: pd.Series, k: int):
+    """Asigna clusters con k-means 1-D óptimo (cortes naturales)."""
+    s = pd.to_numeric(series, errors="coerce").fillna(0.0)
+    if s.nunique() <= 1:
+        return pd.Series(np.ones(len(s), dtype=int), index=s.index)
+    return pd.Series(ckmeans_1d(s.to_numpy(), k), index=s.index)
+
+
+# Métodos de clustering disponibles ("jenks" es equivalente a "ckmeans")
+CLUSTER_METHODS = {
+    "quantiles": assign_clusters_quantiles,
+    "ckmeans": assign_clusters_ckmeans,
+    "jenks": assign_clusters_ckmeans,
+}
+
+
+def assign_clusters(series: pd.Series, k: int, method: str = "quantiles"):
+    """Asigna clusters con el método indicado (ver CLUSTER_METHODS)."""
+    if method not in CLUSTER_METHODS:
+        raise ValueError(
+            f"Método de clustering '{method}' no válido. Disponibles: {list(CLUSTER_METHODS)}",
+        )
+    return CLUSTER_METHODS[method](series, k)
+
+
+def within_cluster_stats(series: pd.Series, labels: pd.Series, method: str = "") -> pd.DataFrame:
+    """Calcula la varianza intra-cluster para comparar métodos de clustering.
+
+    Returns:
+        DataFrame de una fila con METODO, K, SSE_INTRA, SSE_TOTAL,
+        VARIANZA_INTRA y VARIANZA_EXPLICADA (1 - SSE_INTRA / SSE_TOTAL).
+
+    """
+    s = pd.to_numeric(series, errors="coerce").fillna(0.0)
+    sse_total = float(((s - s.mean()) ** 2).sum())
+    sse_intra = float(((s - s.groupby(labels).transform("mean")) ** 2).sum())
+    return pd.DataFrame(
+        [
+            {
+                "METODO": method,
+                "K": int(pd.Series(labels).nunique()),
+                "SSE_INTRA": sse_intra,
+                "SSE_TOTAL": sse_total,
+                "VARIANZA_INTRA": sse_intra / len(s) if len(s) else np.nan,
+                "VARIANZA_EXPLICADA": 1.0 - sse_intra / sse_total if sse_total > 0 else 1.0,
+            },
+        ],
+    )
+
+
 def enforce_monotone(vals, kind):
     """Fuerza monotonicidad en valores.
     kind='min' -> no-creciente; kind='max' -> no-decreciente
@@ -132,56 +265,23 @@ def var_kind(var, max_like, min_like):
     return "max"  # por seguridad, defectos -> tope MAX
 
 
-def process_clusters(resumen_mc, tolerancias_df, cruce_df, k=5, qmin=None, qmax=None):
-    """Procesa clustering y calcula tolerancias por cluster.
+def prepare_tolerancias(tolerancias_df, cruce_df):
+    """Prepara tolerancias y clasificación MIN/MAX de variables para el clustering.
 
-    Args:
-        resumen_mc: DataFrame con resumen por mercado-cliente (debe tener MERCADO-CLIENTE y KILOS_ASIGNABLE)
-        tolerancias_df: DataFrame con tolerancias originales
-        cruce_df: DataFrame con cruce de variables
-        k: Número de clusters (default: 5)
-        qmin: Lista de cuantiles MIN (default: [0.9, 0.7, 0.5, 0.3, 0.1])
-        qmax: Lista de cuantiles MAX (default: [0.1, 0.3, 0.5, 0.7, 0.9])
+    Convierte una sola vez a numérico las columnas de variables, de modo que
+    los cálculos por cluster (y los re-cálculos) no vuelvan a parsear texto.
 
     Returns:
-        dict con todos los DataFrames de resultados
+        dict con:
+            - 'tol': DataFrame de tolerancias normalizado (variables numéricas)
+            - 'col_mc': nombre de la columna MERCADO-CLIENTE en 'tol'
+            - 'var_rows': variables a procesar, en orden
+            - 'max_like' / 'min_like': conjuntos canónicos de variables MAX/MIN
 
     """
-    # Normalizar
-    res = norm_cols(resumen_mc.copy())
     tol = norm_cols(tolerancias_df.copy())
     cru = norm_cols(cruce_df.copy())
 
-    # Validar K
-    K = max(1, int(k))
-
-    # Defaults para cuantiles
-    qmin_def = [0.90, 0.70, 0.50, 0.30, 0.10]
-    qmax_def = [0.10, 0.30, 0.50, 0.70, 0.90]
-
-    qmin = expand_or_interpolate_q(qmin if qmin else qmin_def, K, descending=True)
-    qmax = expand_or_interpolate_q(qmax if qmax else qmax_def, K, descending=False)
-
-    # Seleccionar columnas de resumen
-    col_mc = pick_col(res, ["MERCADO-CLIENTE", "MERCADO_CLIENTE"])
-    col_kg = pick_col(res, ["KILOS_ASIGNABLE", "KILOS_ASIGNABLES"])
-    res[col_kg] = pd.to_numeric(res[col_kg], errors="coerce").fillna(0.0)
-
-    res = res[[col_mc, col_kg]].sort_values(col_kg, ascending=True).reset_index(drop=True)
-    res["RANK_EXIGENCIA"] = np.arange(1, len(res) + 1)
-    res["CLUSTER"] = assign_clusters_quantiles(res[col_kg], k=K)
-
-    summary = (
-        res.groupby("CLUSTER", as_index=False)
-        .agg(
-            CLIENTES=(col_mc, "count"),
-            KG_TOTAL=(col_kg, "sum"),
-            KG_MEDIANA=(col_kg, "median"),
-            KG_PROMEDIO=(col_kg, "mean"),
-        )
-        .sort_values("CLUSTER")
-    )
-
     # Normalizar SUMATORIA CONDICIÓN
     if "SUMATORIA CONDICIÓN" in tol.columns and "SUMATORIA CONDICION" not in tol.columns:
         tol.rename(columns={"SUMATORIA CONDICIÓN": "SUMATORIA CONDICION"}, inplace=True)
@@ -203,15 +303,7 @@ def process_clusters(resumen_mc, tolerancias_df, cruce_df, k=5, qmin=None, qmax=
     }
     min_like = {canon("BRIX"), canon("PORC_COLOR CUBRIMIENTO MIN"), canon("FIRMEZA INFERIOR")}
 
-    # Join tolerancias + clusters + pesos
-    col_mc_tol = pick_col(tol, ["MERCADO-CLIENTE", "MERCADO_CLIENTE"])
-    tolj = tol.merge(
-        res[[col_mc, col_kg, "CLUSTER"]],
-        left_on=col_mc_tol,
-        right_on=col_mc,
-        how="left",
-    )
-    tolj.rename(columns={col_kg: "W"}, inplace=True)  # peso
+    col_mc_tol = SchemaResolver.de(tol).col(["MERCADO-CLIENTE", "MERCADO_CLIENTE"])
 
     # Variables a procesar
     base_vars = [
@@ -222,8 +314,8 @@ def process_clusters(resumen_mc, tolerancias_df, cruce_df, k=5, qmin=None, qmax=
         "SUMATORIA CONDICION",
         "SUMATORIA CALIDAD",
     ]
-    cr_vars = [v for v in mapped["VARIABLES TOLERANCIAS"].unique().tolist() if v in tolj.columns]
-    var_rows = [v for v in base_vars if v in tolj.columns] + cr_vars
+    cr_vars = [v for v in mapped["VARIABLES TOLERANCIAS"].unique().tolist() if v in tol.columns]
+    var_rows = [v for v in base_vars if v in tol.columns] + cr_vars
     # de-dup con orden
     seen, tmp = set(), []
     for v in var_rows:
@@ -232,93 +324,277 @@ def process_clusters(resumen_mc, tolerancias_df, cruce_df, k=5, qmin=None, qmax=
             tmp.append(v)
     var_rows = tmp
 
-    # ESTRICTOS/LAXOS + FUENTES
-    crit_rows, lax_rows, crit_src, lax_src = [], [], [], []
+    for v in var_rows:
+        tol[v] = a_numero(tol[v])
+
+    return {
+        "tol": tol,
+        "col_mc": col_mc_tol,
+        "var_rows": var_rows,
+        "max_like": max_like,
+        "min_like": min_like,
+        # Matrices reutilizables (filas de tolerancia x variables)
+        "V": tol[var_rows].to_numpy(dtype=float).reshape(len(tol), len(var_rows)),
+        "es_min": np.array(
+            [var_kind(v, max_like, min_like) == "min" for v in var_rows], dtype=bool
+        ),
+        "nombres": tol[col_mc_tol].astype(str).to_numpy(),
+    }
+
+
+def expand_quantiles(k, qmin=None, qmax=None):
+    """Devuelve (qmin, qmax) de longitud k, usando los defaults si no se entregan."""
+    qmin_def = [0.90, 0.70, 0.50, 0.30, 0.10]
+    qmax_def = [0.10, 0.30, 0.50, 0.70, 0.90]
+    return (
+        expand_or_interpolate_q(qmin if qmin else qmin_def, k, descending=True),
+        expand_or_interpolate_q(qmax if qmax else qmax_def, k, descending=False),
+    )
+
 
-    for var in var_rows:
-        kind = var_kind(var, max_like, min_like)
-        rowc = {"VARIABLE": var}
-        rowl = {"VARIABLE": var}
+def make_mono(df_in, K, max_like, min_like):
+    """Aplica monotonicidad por fila (VARIABLE) a una tabla C1..CK."""
+    df = df_in.copy()
+    # Tipo MIN/MAX una vez por variable, no por fila
+    tipos = {v: var_kind(v, max_like, min_like) for v in df["VARIABLE"].unique()}
+    for i, r in df.iterrows():
+        kd = tipos[r["VARIABLE"]]
+        vals = [r[f"C{c}"] for c in range(1, K + 1)]
+        fixed = enforce_monotone(vals, kd)
         for c in range(1, K + 1):
-            ser = to_num_series(tolj.loc[tolj["CLUSTER"] == c, var])
-            names = tolj.loc[tolj["CLUSTER"] == c, col_mc_tol]
-            if ser.dropna().empty:
-                vc = vl = np.nan
-                src_c = src_l = ""
-            elif kind == "min":  # crítico = MAX ; laxo = MIN
-                idx_max = ser.idxmax()
-                idx_min = ser.idxmin()
-                vc = float(ser.loc[idx_max])
-                src_c = str(names.loc[idx_max])
-                vl = float(ser.loc[idx_min])
-                src_l = str(names.loc[idx_min])
-            else:  # crítico = MIN ; laxo = MAX
-                idx_min = ser.idxmin()
-                idx_max = ser.idxmax()
-                vc = float(ser.loc[idx_min])
-                src_c = str(names.loc[idx_min])
-                vl = float(ser.loc[idx_max])
-                src_l = str(names.loc[idx_max])
-            rowc[f"C{c}"] = vc
-            rowl[f"C{c}"] = vl
-            crit_src.append({"VARIABLE": var, "CLUSTER": c, "CLIENTE": src_c, "VALOR": vc})
-            lax_src.append({"VARIABLE": var, "CLUSTER": c, "CLIENTE": src_l, "VALOR": vl})
-        crit_rows.append(rowc)
-        lax_rows.append(rowl)
-
-    crit_df = pd.DataFrame(crit_rows).round(2)
-    lax_df = pd.DataFrame(lax_rows).round(2)
-    crit_src_df = pd.DataFrame(crit_src).sort_values(["VARIABLE", "CLUSTER"]).reset_index(drop=True)
-    lax_src_df = pd.DataFrame(lax_src).sort_values(["VARIABLE", "CLUSTER"]).reset_index(drop=True)
-
-    # MONOTÓNICAS
-    def make_mono(df_in):
-        df = df_in.copy()
-        for i, r in df.iterrows():
-            kd = var_kind(r["VARIABLE"], max_like, min_like)
-            vals = [r[f"C{c}"] for c in range(1, K + 1)]
-            fixed = enforce_monotone(vals, kd)
-            for c in range(1, K + 1):
-                df.at[i, f"C{c}"] = round(fixed[c - 1], 2)
+            df.at[i, f"C{c}"] = round(fixed[c - 1], 2)
+    return df
+
+
+def index_cluster(V, filas):
+    """Construye el índice ordenado de un cluster.
+
+    Para cada variable guarda las filas de tolerancia con valor (ordenadas de
+    forma estable por valor) y los valores ordenados. Se reutiliza mientras
+    la membresía del cluster no cambie.
+    """
+    filas = np.asarray(filas, dtype=int)
+    orden, valores = [], []
+    for j in range(V.shape[1]):
+        vals = V[filas, j]
+        ok = ~np.isnan(vals)
+        o = np.argsort(vals[ok], kind="stable")
+        orden.append(filas[ok][o])
+        valores.append(vals[ok][o])
+    return {"filas": filas, "orden": orden, "valores": valores}
+
+
+def tolerancias_cluster(idx, W, prepared, q_min, q_max):
+    """Calcula críticos, laxos (con su fuente) y sugeridas de un cluster.
+
+    Args:
+        idx: índice del cluster (ver index_cluster)
+        W: pesos (KILOS_ASIGNABLE) por fila de tolerancia
+        prepared: resultado de prepare_tolerancias
+        q_min / q_max: cuantil del cluster para variables MIN / MAX
+
+    Returns:
+        dict de listas por variable: crit, lax, src_crit, src_lax, sug
+
+    """
+    nombres = prepared["nombres"]
+    w_full = np.nan_to_num(np.asarray(W, dtype=float), nan=0.0)
+    if not (w_full[idx["filas"]] > 0).any():
+        # Sin pesos > 0 en el cluster: pesos uniformes
+        w_full = np.ones(len(w_full))
+
+    out = {"crit": [], "lax": [], "src_crit": [], "src_lax": [], "sug": []}
+    for j, es_min in enumerate(prepared["es_min"]):
+        orden, vals = idx["orden"][j], idx["valores"][j]
+        if len(vals) == 0:
+            for key in ("crit", "lax", "sug"):
+                out[key].append(np.nan)
+            out["src_crit"].append("")
+            out["src_lax"].append("")
+            continue
+
+        # idxmin/idxmax: primera aparición entre empates
+        v_min, src_min = float(vals[0]), nombres[orden[0]]
+        i_max = int(np.searchsorted(vals, vals[-1], side="left"))
+        v_max, src_max = float(vals[-1]), nombres[orden[i_max]]
+        if es_min:  # crítico = MAX ; laxo = MIN
+            out["crit"].append(v_max)
+            out["src_crit"].append(src_max)
+            out["lax"].append(v_min)
+            out["src_lax"].append(src_min)
+        else:  # crítico = MIN ; laxo = MAX
+            out["crit"].append(v_min)
+            out["src_crit"].append(src_min)
+            out["lax"].append(v_max)
+            out["src_lax"].append(src_max)
+
+        # Cuantil ponderado (mismo criterio que weighted_quantile)
+        w = w_full[orden]
+        m = w > 0
+        if not m.any():
+            out["sug"].append(np.nan)
+            continue
+        cum_w = np.cumsum(w[m])
+        q = q_min if es_min else q_max
+        k = int(np.searchsorted(cum_w, float(q) * float(cum_w[-1]), side="left"))
+        out["sug"].append(round(float(vals[m][min(max(k, 0), len(cum_w) - 1)]), 2))
+    return out
+
+
+def cluster_arrays(clusters_mc, prepared):
+    """Mapea CLUSTER y KILOS_ASIGNABLE de cada MC a las filas de tolerancia.
+
+    Returns:
+        (cl, W): cluster (0 = sin cluster) y peso por fila de tolerancia
+
+    """
+    mc = clusters_mc.drop_duplicates("MERCADO-CLIENTE").set_index("MERCADO-CLIENTE")
+    nombres_tol = prepared["tol"][prepared["col_mc"]]
+    cl = nombres_tol.map(mc["CLUSTER"])
+    W = nombres_tol.map(pd.to_numeric(mc["KILOS_ASIGNABLE"], errors="coerce"))
+    return (
+        pd.to_numeric(cl, errors="coerce").fillna(0).astype(int).to_numpy(),
+        W.to_numpy(dtype=float),
+    )
+
+
+def build_tol_tables(por_cluster, prepared, K):
+    """Arma las tablas Tol_* a partir de los resultados por cluster."""
+    var_rows = prepared["var_rows"]
+    max_like, min_like = prepared["max_like"], prepared["min_like"]
+    vacio = {
+        "crit": [np.nan] * len(var_rows),
+        "lax": [np.nan] * len(var_rows),
+        "src_crit": [""] * len(var_rows),
+        "src_lax": [""] * len(var_rows),
+        "sug": [np.nan] * len(var_rows),
+    }
+    cols = {c: por_cluster.get(c, vacio) for c in range(1, K + 1)}
+
+    def tabla(key):
+        df = pd.DataFrame({"VARIABLE": var_rows})
+        for c in range(1, K + 1):
+            df[f"C{c}"] = pd.Series(cols[c][key], dtype=float)
         return df
 
-    crit_mono = make_mono(crit_df)
-    lax_mono = make_mono(lax_df)
-
-    # SUGERIDAS (cuantiles ponderados) + MONO
-    def make_sugeridas_quantile(tolj_df):
-        rows = []
-        for var in var_rows:
-            kd = var_kind(var, max_like, min_like)
-            rec = {"VARIABLE": var}
-            for c in range(1, K + 1):
-                ser = to_num_series(tolj_df.loc[tolj_df["CLUSTER"] == c, var])
-                w = pd.to_numeric(
-                    tolj_df.loc[tolj_df["CLUSTER"] == c, "W"],
-                    errors="coerce",
-                ).fillna(0.0)
-                if ser.dropna().empty:
-                    rec[f"C{c}"] = np.nan
-                else:
-                    q = qmin[c - 1] if kd == "min" else qmax[c - 1]
-                    if (w > 0).sum() == 0:
-                        w = pd.Series(np.ones(len(ser)), index=ser.index)
-                    rec[f"C{c}"] = round(weighted_quantile(ser, q, w), 2)
-            rows.append(rec)
-        return pd.DataFrame(rows)
-
-    tol_sug = make_sugeridas_quantile(tolj)
-    tol_sug_mono = make_mono(tol_sug)
+    def fuentes(key_val, key_src):
+        rows = [
+            {
+                "VARIABLE": var,
+                "CLUSTER": c,
+                "CLIENTE": cols[c][key_src][j],
+                "VALOR": cols[c][key_val][j],
+            }
+            for j, var in enumerate(var_rows)
+            for c in range(1, K + 1)
+        ]
+        return (
+            pd.DataFrame(rows, columns=["VARIABLE", "CLUSTER", "CLIENTE", "VALOR"])
+            .sort_values(["VARIABLE", "CLUSTER"])
+            .reset_index(drop=True)
+        )
 
+    crit_df = tabla("crit").round(2)
+    lax_df = tabla("lax").round(2)
+    tol_sug = tabla("sug")
     return {
-        "clusters_mc": res.rename(columns={col_mc: "MERCADO-CLIENTE", col_kg: "KILOS_ASIGNABLE"}),
-        "clusters_summary": summary,
         "tol_criticos": crit_df,
         "tol_laxos": lax_df,
-        "tol_crit_mono": crit_mono,
-        "tol_lax_mono": lax_mono,
-        "tol_crit_src": crit_src_df,
-        "tol_lax_src": lax_src_df,
+        "tol_crit_mono": make_mono(crit_df, K, max_like, min_like),
+        "tol_lax_mono": make_mono(lax_df, K, max_like, min_like),
+        "tol_crit_src": fuentes("crit", "src_crit"),
+        "tol_lax_src": fuentes("lax", "src_lax"),
         "tol_sugeridas": tol_sug,
-        "tol_sug_mono": tol_sug_mono,
+        "tol_sug_mono": make_mono(tol_sug, K, max_like, min_like),
+    }
+
+
+def summarize_clusters(clusters_mc, method=""):
+    """Resumen por cluster y calidad (varianza intra-cluster) de una asignación."""
+    summary = (
+        clusters_mc.groupby("CLUSTER", as_index=False)
+        .agg(
+            CLIENTES=("MERCADO-CLIENTE", "count"),
+            KG_TOTAL=("KILOS_ASIGNABLE", "sum"),
+            KG_MEDIANA=("KILOS_ASIGNABLE", "median"),
+            KG_PROMEDIO=("KILOS_ASIGNABLE", "mean"),
+            KG_VARIANZA=("KILOS_ASIGNABLE", lambda s: float(s.var(ddof=0))),
+        )
+        .sort_values("CLUSTER")
+    )
+    calidad = within_cluster_stats(
+        clusters_mc["KILOS_ASIGNABLE"],
+        clusters_mc["CLUSTER"],
+        method=method,
+    )
+    return summary, calidad
+
+
+def process_clusters(
+    resumen_mc,
+    tolerancias_df,
+    cruce_df,
+    k=5,
+    qmin=None,
+    qmax=None,
+    method="quantiles",
+    prepared=None,
+    instrumentacion=None,
+):
+    """Procesa clustering y calcula tolerancias por cluster.
+
+    Args:
+        resumen_mc: DataFrame con resumen por mercado-cliente (debe tener MERCADO-CLIENTE y KILOS_ASIGNABLE)
+        tolerancias_df: DataFrame con tolerancias originales
+        cruce_df: DataFrame con cruce de variables
+        k: Número de clusters (default: 5)
+        qmin: Lista de cuantiles MIN (default: [0.9, 0.7, 0.5, 0.3, 0.1])
+        qmax: Lista de cuantiles MAX (default: [0.1, 0.3, 0.5, 0.7, 0.9])
+        method: Método de clustering: 'quantiles', 'ckmeans' o 'jenks' (default: 'quantiles')
+        prepared: Resultado de prepare_tolerancias (opcional, evita re-procesar tolerancias)
+        instrumentacion: Instrumentacion que mide cada etapa (opcional, ver
+            utils.instrumentation): preparacion, asignacion_clusters y tolerancias
+
+    Returns:
+        dict con todos los DataFrames de resultados
+
+    """
+    # Normalizar
+    res = norm_cols(resumen_mc.copy())
+    if prepared is None:
+        with etapa(instrumentacion, "preparacion", mcs=len(tolerancias_df)):
+            prepared = prepare_tolerancias(tolerancias_df, cruce_df)
+
+    # Validar K
+    K = max(1, int(k))
+    qmin, qmax = expand_quantiles(K, qmin, qmax)
+
+    with etapa(instrumentacion, "asignacion_clusters", mcs=len(res), k=K):
+        # Seleccionar columnas de resumen
+        esquema = SchemaResolver.de(res)
+        col_mc = esquema.col(["MERCADO-CLIENTE", "MERCADO_CLIENTE"])
+        col_kg = esquema.col(["KILOS_ASIGNABLE", "KILOS_ASIGNABLES"])
+        res[col_kg] = pd.to_numeric(res[col_kg], errors="coerce").fillna(0.0)
+
+        res = res[[col_mc, col_kg]].sort_values(col_kg, ascending=True).reset_index(drop=True)
+        res["RANK_EXIGENCIA"] = np.arange(1, len(res) + 1)
+        res["CLUSTER"] = assign_clusters(res[col_kg], k=K, method=method)
+        res = res.rename(columns={col_mc: "MERCADO-CLIENTE", col_kg: "KILOS_ASIGNABLE"})
+
+        summary, calidad = summarize_clusters(res, method=method)
+
+    with etapa(instrumentacion, "tolerancias", mcs=len(res), k=K):
+        # Índices por cluster + tolerancias por cluster
+        cl, W = cluster_arrays(res, prepared)
+        por_cluster = {}
+        for c in range(1, K + 1):
+            idx = index_cluster(prepared["V"], np.flatnonzero(cl == c))
+            por_cluster[c] = tolerancias_cluster(idx, W, prepared, qmin[c - 1], qmax[c - 1])
+        tablas = build_tol_tables(por_cluster, prepared, K)
+
+    return {
+        "clusters_mc": res,
+        "clusters_summary": summary,
+        "clusters_calidad": calidad,
+        **tablas,
     }
@@ -5,6 +5,7 @@ from pathlib import Path
 import pandas as pd
 
 from .helpers import norm_cols
+from .numeros import a_fraccion, normalizar_tolerancias
 
 # Configuración de especies disponibles
 ESPECIES_CONFIG = {
@@ -41,6 +42,16 @@ ESPECIES_CONFIG = {
 # Archivos compartidos
 F_DISMINUCION = "Disminucion.xlsx"
 F_CRUCE = "Cruce de Variables.xlsx"
+# Tolerancias de todas las especies en un solo archivo (ver utils.tolerancias_total)
+F_TOLERANCIAS_TOTAL = "Data/Tolerancias_Total_Dividido.xlsx"
+
+# Origen de las tolerancias: archivo por especie (ESPECIES_CONFIG) o consolidado
+FUENTES_TOLERANCIAS = ("especie", "consolidado")
+
+
+def columna_disminucion(disminucion):
+    """Columna con el porcentaje de disminución ('% DISMINUCION' o la segunda)."""
+    return "% DISMINUCION" if "% DISMINUCION" in disminucion.columns else disminucion.columns[1]
 
 
 def get_especies_disponibles():
@@ -75,69 +86,136 @@ def get_lineas_producto(especie: str, base_dir: Path = None) -> list:
     try:
         df_lotes = pd.read_excel(archivo_lotes)
         norm_cols(df_lotes)
-
-        if "LINEA PRODUCTO" not in df_lotes.columns:
-            # Intentar con nombre canónico
-            from .helpers import pick_col
-
-            col_linea = pick_col(df_lotes, ["LINEA PRODUCTO", "LINEA_PRODUCTO", "LINEAPRODUCTO"])
-            return sorted(df_lotes[col_linea].dropna().unique().tolist())
-
-        return sorted(df_lotes["LINEA PRODUCTO"].dropna().unique().tolist())
+        return lineas_from_lotes(df_lotes)
     except Exception as e:
         raise RuntimeError(f"Error al leer archivo {archivo_lotes}: {e!s}")
 
 
-def load_data(especie: str, linea_producto: str = None, base_dir: Path = None):
-    """Carga datos de lotes y tolerancias para una especie.
+def lineas_from_lotes(df_lotes) -> list:
+    """Extrae las líneas de producto únicas de un DataFrame de lotes ya cargado."""
+    if "LINEA PRODUCTO" not in df_lotes.columns:
+        # Intentar con nombre canónico
+        from .helpers import SchemaResolver
 
-    Args:
-        especie: Nombre de la especie
-        linea_producto: Línea de producto (opcional, para filtrar)
-        base_dir: Directorio base (default: Path("."))
+        col_linea = SchemaResolver.de(df_lotes).col(
+            ["LINEA PRODUCTO", "LINEA_PRODUCTO", "LINEAPRODUCTO"],
+        )
+        return sorted(df_lotes[col_linea].dropna().unique().tolist())
 
-    Returns:
-        dict con:
-            - 'lotes': DataFrame de lotes
-            - 'tolerancias': DataFrame de tolerancias
-            - 'disminucion': DataFrame de disminuciones
-            - 'cruce': DataFrame de cruce de variables
+    return sorted(df_lotes["LINEA PRODUCTO"].dropna().unique().tolist())
+
+
+def input_files(especie: str, base_dir: Path = None, tolerancias: str = "especie") -> dict:
+    """Rutas de los archivos de entrada de una especie (lotes, tolerancias, disminución, cruce).
 
+    Con tolerancias="consolidado" la ruta de tolerancias es F_TOLERANCIAS_TOTAL.
     """
     if base_dir is None:
         base_dir = Path()
 
     if especie not in ESPECIES_CONFIG:
         raise ValueError(f"Especie '{especie}' no encontrada")
+    if tolerancias not in FUENTES_TOLERANCIAS:
+        raise ValueError(
+            f"Fuente de tolerancias '{tolerancias}' no válida. Disponibles: {list(FUENTES_TOLERANCIAS)}",
+        )
 
-    # Cargar archivos de especie
-    archivo_lotes = base_dir / ESPECIES_CONFIG[especie]["lotes"]
-    archivo_tolerancias = base_dir / ESPECIES_CONFIG[especie]["tolerancias"]
-
-    # Cargar archivos compartidos
-    archivo_disminucion = base_dir / F_DISMINUCION
-    archivo_cruce = base_dir / F_CRUCE
-
-    # Verificar existencia
-    for archivo in [archivo_lotes, archivo_tolerancias, archivo_disminucion, archivo_cruce]:
-        if not archivo.exists():
-            raise FileNotFoundError(f"Archivo no encontrado: {archivo}")
+    if tolerancias == "consolidado":
+        archivo_tolerancias = F_TOLERANCIAS_TOTAL
+    else:
+        archivo_tolerancias = ESPECIES_CONFIG[especie]["tolerancias"]
+    return {
+        "lotes": base_dir / ESPECIES_CONFIG[especie]["lotes"],
+        "tolerancias": base_dir / archivo_tolerancias,
+        "disminucion": base_dir / F_DISMINUCION,
+        "cruce": base_dir / F_CRUCE,
+    }
 
-    # Cargar datos
-    lotes = pd.read_excel(archivo_lotes)
-    tolerancias = pd.read_excel(archivo_tolerancias)
-    disminucion = pd.read_excel(archivo_disminucion)
-    cruce = pd.read_excel(archivo_cruce)
 
-    # Normalizar columnas
-    for df in [lotes, tolerancias, disminucion, cruce]:
-        norm_cols(df)
+def filter_linea(datos: dict, linea_producto: str = None) -> dict:
+    """Filtra lotes y tolerancias por línea de producto (sin modificar `datos`).
 
-    # Filtrar por línea de producto si se especifica
+    Si todas las tolerancias ya son de la línea se devuelven sin copiar (la
+    porción del almacén consolidado sigue siendo una vista).
+    """
+    lotes, tolerancias = datos["lotes"], datos["tolerancias"]
     if linea_producto:
         if "LINEA PRODUCTO" in lotes.columns:
             lotes = lotes[lotes["LINEA PRODUCTO"] == linea_producto].copy()
         if "LINEA PRODUCTO" in tolerancias.columns:
-            tolerancias = tolerancias[tolerancias["LINEA PRODUCTO"] == linea_producto].copy()
+            mask = tolerancias["LINEA PRODUCTO"] == linea_producto
+            if not mask.all():
+                tolerancias = tolerancias[mask].copy()
 
-    return {"lotes": lotes, "tolerancias": tolerancias, "disminucion": disminucion, "cruce": cruce}
+    return {**datos, "lotes": lotes, "tolerancias": tolerancias}
+
+
+def normalizar_datos(datos: dict) -> dict:
+    """Normaliza, en el lugar, las hojas recién leídas de una especie.
+
+    Nombres de columnas sin espacios y, una sola vez, límites de tolerancia y
+    disminuciones como números (ver utils.numeros): las etapas siguientes ya no
+    vuelven a parsear texto.
+    """
+    for df in datos.values():
+        norm_cols(df)
+    normalizar_tolerancias(datos["tolerancias"], datos["cruce"])
+    disminucion = datos["disminucion"]
+    disminucion["frac"] = a_fraccion(disminucion[columna_disminucion(disminucion)])
+    return datos
+
+
+def read_inputs(archivos: dict, tolerancias: str = "especie") -> dict:
+    """Lee y normaliza los archivos de input_files.
+
+    Con tolerancias="consolidado" el archivo consolidado se lee una sola vez
+    (ver utils.tolerancias_total) y la especie recibe la porción de las líneas
+    de sus lotes, como vista sin copia.
+    """
+    for archivo in archivos.values():
+        if not archivo.exists():
+            raise FileNotFoundError(f"Archivo no encontrado: {archivo}")
+
+    lotes = norm_cols(pd.read_excel(archivos["lotes"]))
+    if tolerancias == "consolidado":
+        from .tolerancias_total import tolerancias_consolidadas
+
+        tol = tolerancias_consolidadas(archivos["tolerancias"]).para_lotes(lotes)
+    else:
+        tol = pd.read_excel(archivos["tolerancias"])
+    datos = {
+        "lotes": lotes,
+        "tolerancias": tol,
+        "disminucion": pd.read_excel(archivos["disminucion"]),
+        "cruce": pd.read_excel(archivos["cruce"]),
+    }
+    return normalizar_datos(datos)
+
+
+def load_data(
+    especie: str,
+    linea_producto: str = None,
+    base_dir: Path = None,
+    tolerancias: str = "especie",
+):
+    """Carga datos de lotes y tolerancias para una especie.
+
+    Args:
+        especie: Nombre de la especie
+        linea_producto: Línea de producto (opcional, para filtrar)
+        base_dir: Directorio base (default: Path("."))
+        tolerancias: 'especie' (Tolerancia_*.xlsx) o 'consolidado' (F_TOLERANCIAS_TOTAL)
+
+    Returns:
+        dict con:
+            - 'lotes': DataFrame de lotes
+            - 'tolerancias': DataFrame de tolerancias
+            - 'disminucion': DataFrame de disminuciones (con 'frac': fracción numérica)
+            - 'cruce': DataFrame de cruce de variables
+
+    """
+    # Archivos de especie y compartidos, normalizados
+    datos = read_inputs(input_files(especie, base_dir, tolerancias), tolerancias)
+
+    # Filtrar por línea de producto si se especifica
+    return filter_linea(datos, linea_producto)
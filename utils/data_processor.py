@@ -1,14 +1,31 @@
 """Procesamiento de lotes y asignación a mercado-cliente"""
 
+import functools
+import itertools
+
 import numpy as np
 import pandas as pd
 
+from .data_loader import columna_disminucion
 from .helpers import (
+    SchemaResolver,
     norm_cols,
     normalize_bounds,
     parse_calibre_cols,
-    pct_to_fraction,
-    pick_col,
+)
+from .instrumentation import etapa
+from .motor_sql import evaluar_duckdb
+from .numeros import a_fraccion
+from .progress import check_cancel, report
+from .reglas import (
+    combinar_estadisticas,
+    construir_reglas,
+    crudo,
+    evaluar_reglas,
+    limite_activo,
+    numerico,
+    orden_selectividad,
+    tabla_estadisticas,
 )
 
 
@@ -57,103 +74,52 @@ def pct_calibres_en_rango_y_listas(row, cal_map, cal_inf, cal_sup):
     return pct, dentro, fuera
 
 
-def process_asignacion(
-    lotes_df,
-    tolerancias_df,
-    disminucion_df,
-    cruce_df,
-    especie=None,
-    linea_producto=None,
-):
-    """Procesa asignación de lotes a mercado-cliente.
+def _reportar_shard(progress, shard_rows, acumulado, avance, info):
+    """Acumula el resumen por MC del shard y lo reporta como resultado parcial."""
+    if progress is None or len(shard_rows) == 0:
+        return acumulado
+    parte = (
+        pd.DataFrame(shard_rows)
+        .groupby("MERCADO-CLIENTE")
+        .agg(LOTES_OK=("PASA_BASE", "sum"), KILOS_ASIGNABLE=("ASIGNABLE_KG", "sum"))
+    )
+    acumulado = parte if acumulado is None else acumulado.add(parte, fill_value=0)
+    report(
+        progress,
+        "evaluacion",
+        avance,
+        resumen_mc=acumulado.sort_values("KILOS_ASIGNABLE", ascending=False).reset_index(),
+        **info,
+    )
+    return acumulado
 
-    Args:
-        lotes_df: DataFrame con datos de lotes
-        tolerancias_df: DataFrame con tolerancias por mercado-cliente
-        disminucion_df: DataFrame con porcentajes de disminución
-        cruce_df: DataFrame con cruce de variables
-        especie: Nombre de especie (para filtrar)
-        linea_producto: Línea de producto (para filtrar)
 
-    Returns:
-        dict con:
-            - 'detalle': DataFrame detallado por lote y mercado-cliente
-            - 'resumen_mc': Resumen por mercado-cliente
-            - 'resumen_lote': Resumen por lote
+def _evaluar_filas(cand, reglas, progress=None, cancel=None, lotes_por_shard=25):
+    """Motor de referencia: evalúa las reglas fila a fila sobre los pares lote x MC.
 
+    Evalúa por shards de lotes: reporta avance y permite cancelar entre shards.
     """
-    # Normalizar columnas
-    for df in [lotes_df, tolerancias_df, disminucion_df, cruce_df]:
-        norm_cols(df)
-
-    # NO filtrar aquí - el join por ESPECIE y LINEA PRODUCTO ya hace el filtrado
-
-    # Aplicar disminuciones (solo 500/600)
-    lotes_adj = lotes_df.copy()
-    cols_500_600 = [
-        c for c in lotes_adj.columns if str(c).startswith("500.0__") or str(c).startswith("600.0__")
-    ]
-    for c in cols_500_600:
-        lotes_adj[c] = pd.to_numeric(lotes_adj[c], errors="coerce")
-
-    disminucion_df["VARIABLES"] = disminucion_df["VARIABLES"].astype(str).str.strip()
-    pct_col = (
-        "% DISMINUCION" if "% DISMINUCION" in disminucion_df.columns else disminucion_df.columns[1]
-    )
-    disminucion_df["frac"] = disminucion_df[pct_col].map(pct_to_fraction)
-    dis_map = dict(zip(disminucion_df["VARIABLES"], disminucion_df["frac"]))
-    for var, frac in dis_map.items():
-        if var in lotes_adj.columns:
-            lotes_adj[var] = lotes_adj[var] * (1.0 - frac)
-
-    # Calibres
-    cal_map = parse_calibre_cols(lotes_adj.columns)
-    for col in cal_map.keys():
-        lotes_adj[col] = pd.to_numeric(lotes_adj[col], errors="coerce")
-
-    # Cruce 500/600
-    cru_eff = cruce_df.dropna(subset=["VARIABLES TOLERANCIAS", "VARIABLE DE COMPARACION"]).copy()
-    cru_eff["VARIABLES TOLERANCIAS"] = cru_eff["VARIABLES TOLERANCIAS"].astype(str).str.strip()
-    cru_eff["VARIABLE DE COMPARACION"] = cru_eff["VARIABLE DE COMPARACION"].astype(str).str.strip()
-
-    mapped_defects = cru_eff[
-        cru_eff["VARIABLE DE COMPARACION"].str.contains(r"^\d{3}\.0__", regex=True, na=False)
-    ]
-    defect_map = [
-        (t, n, cat)
-        for t, n, cat in mapped_defects[
-            ["VARIABLES TOLERANCIAS", "VARIABLE DE COMPARACION", "CATEGORIA"]
-        ].itertuples(index=False, name=None)
-        if (n in lotes_adj.columns) and (t in tolerancias_df.columns)
-    ]
-    cond_cols = [n for (_, n, cat) in defect_map if str(cat).upper() == "CONDICION"]
-    cali_cols = [n for (_, n, cat) in defect_map if str(cat).upper() == "CALIDAD"]
-
-    # Join
-    join_keys = ["ESPECIE", "LINEA PRODUCTO"]
-
-    # Verificar que las columnas existan
-    for key in join_keys:
-        if key not in lotes_adj.columns:
-            raise ValueError(
-                f"Columna '{key}' no encontrada en lotes. Columnas disponibles: {list(lotes_adj.columns)}",
-            )
-        if key not in tolerancias_df.columns:
-            raise ValueError(
-                f"Columna '{key}' no encontrada en tolerancias. Columnas disponibles: {list(tolerancias_df.columns)}",
+    cal_map = reglas["cal_map"]
+    defect_map = reglas["defect_map"]
+    cond_cols = reglas["cond_cols"]
+    cali_cols = reglas["cali_cols"]
+
+    lote_shard = pd.factorize(cand["LOTE"])[0] // max(1, int(lotes_por_shard))
+    acumulado = None
+    inicio_shard = 0
+    rows = []
+    for i, (_, r) in enumerate(cand.iterrows()):
+        if i > 0 and lote_shard[i] != lote_shard[i - 1]:
+            check_cancel(cancel)
+            acumulado = _reportar_shard(
+                progress,
+                rows[inicio_shard:],
+                acumulado,
+                i / len(cand),
+                {"filas": i, "total_filas": len(cand)},
             )
+            inicio_shard = len(rows)
 
-    cand = lotes_adj.merge(tolerancias_df, on=join_keys, how="inner", suffixes=("", "_TOL"))
-
-    if len(cand) == 0:
-        raise ValueError(
-            f"No se encontraron coincidencias entre lotes y tolerancias para la combinación especificada. "
-            f"Lotes: {len(lotes_adj)} filas, Tolerancias: {len(tolerancias_df)} filas",
-        )
-
-    # Evaluación
-    rows = []
-    for _, r in cand.iterrows():
         reasons = []
         ok_base = True
 
@@ -250,49 +216,477 @@ def process_asignacion(
             },
         )
 
+    check_cancel(cancel)
+    _reportar_shard(
+        progress,
+        rows[inicio_shard:],
+        acumulado,
+        1.0,
+        {"filas": len(cand), "total_filas": len(cand)},
+    )
+
     detalle = pd.DataFrame(rows)
+    return detalle, _estadisticas_detalle(cand, reglas, detalle)
+
+
+def _estadisticas_detalle(cand, reglas, detalle):
+    """Estadísticas por regla y MC del motor por filas, con las mismas reglas por columna.
+
+    Reutiliza COLOR_OK_%, las sumatorias y %CALIBRES_EN_RANGO ya calculados en el detalle.
+    """
+    estadisticas = []
+    for inicio in range(0, len(cand), FILAS_POR_BLOQUE):
+        bloque = cand.iloc[inicio : inicio + FILAS_POR_BLOQUE]
+        parte = detalle.iloc[inicio : inicio + FILAS_POR_BLOQUE]
+        lista = construir_reglas(
+            bloque,
+            reglas["defect_map"],
+            parte["COLOR_OK_%"].to_numpy(dtype=float),
+            parte["SUM_CONDICION"].to_numpy(dtype=float),
+            parte["SUM_CALIDAD"].to_numpy(dtype=float),
+        )
+        evaluacion = evaluar_reglas(lista, len(bloque), mensajes=False)
+        potencial = parte["KILOS_REAL"].to_numpy(dtype=float) * (
+            parte["%CALIBRES_EN_RANGO"].to_numpy(dtype=float) / 100.0
+        )
+        estadisticas.append(
+            tabla_estadisticas(
+                parte["MERCADO-CLIENTE"].to_numpy(),
+                [r.nombre for r in lista],
+                evaluacion["aplica"],
+                evaluacion["falla"],
+                potencial,
+            ),
+        )
+    return combinar_estadisticas(estadisticas)
+
+
+# Bins de color y su límite inferior (ver pct_color_ge)
+_BINS_COLOR = {"400.0__0 - 30": 0, "400.0__30-50": 30, "400.0__50-75": 50, "400.0__75-100": 75}
+
+# Filas por bloque del motor vectorizado (se corta en el límite de un shard de lotes)
+FILAS_POR_BLOQUE = 50_000
+
+# Pares de la muestra con que el modo adaptativo aprende el orden de las reglas
+FILAS_MUESTRA = 2_000
+
+
+def _listas_calibres(marca, etiquetas):
+    """Calibres marcados por fila, ordenados y unidos por ', ' (patrones repetidos se arman una vez)."""
+    n, m = marca.shape
+    if m == 0:
+        return np.full(n, "", dtype=object)
+    if m > 62:
+        return np.array([", ".join(etiquetas[f]) for f in marca], dtype=object)
+    claves = marca.astype(np.int64) @ (np.int64(1) << np.arange(m, dtype=np.int64))
+    codigos, unicas = pd.factorize(claves)
+    textos = [", ".join(etiquetas[(c >> np.arange(m)) & 1 == 1]) for c in unicas]
+    return np.asarray(textos, dtype=object)[codigos]
+
+
+def _evaluar_bloque(bloque, reglas, orden=None):
+    """Evalúa todas las reglas sobre un bloque de pares con operaciones por columna.
+
+    Reproduce _evaluar_filas: mismas comparaciones (NaN/0 = sin restricción),
+    mismo orden de suma y mismos textos en RAZONES y CALIBRES_DENTRO/FUERA.
+    Con orden (modo adaptativo, ver utils.reglas.evaluar_reglas) un par
+    rechazado no se sigue evaluando y RAZONES tiene solo su primera falla.
+
+    Returns:
+        (detalle del bloque, estadísticas por regla y MC del bloque)
+
+    """
+    n = len(bloque)
+
+    # COLOR (mismo orden de acumulación que pct_color_ge)
+    cmin = numerico(crudo(bloque, "PORC_COLOR CUBRIMIENTO MIN"))
+    acc = np.zeros(n)
+    total = np.zeros(n)
+    for b, limite in _BINS_COLOR.items():
+        val = np.nan_to_num(numerico(crudo(bloque, b, 0.0)), nan=0.0)
+        total += val
+        with np.errstate(invalid="ignore"):
+            acc += np.where(limite >= cmin, val, 0.0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        pct_color = np.where(
+            (total > 0) & (1.0001 < total) & (total <= 100.0001),
+            acc,
+            np.where(total > 0, acc / total * 100.0, 0.0),
+        )
+    color_ok_pct = np.where(limite_activo(cmin), pct_color, np.nan)
+
+    # Sumatorias (misma secuencia de sumas que el motor por filas)
+    sumas = {}
+    for nombre, cols in (("CONDICION", reglas["cond_cols"]), ("CALIDAD", reglas["cali_cols"])):
+        suma = np.zeros(n)
+        for c in cols:
+            suma = suma + np.nan_to_num(numerico(crudo(bloque, c)), nan=0.0)
+        sumas[nombre] = suma
+
+    # Calibres (normalize_bounds: 0/NaN = sin límite, rango invertido se ordena)
+    cal_map = reglas["cal_map"]
+    lo = numerico(crudo(bloque, "CALIBRE INFERIOR"))
+    hi = numerico(crudo(bloque, "CALIBRE SUPERIOR"))
+    lo[lo == 0.0] = np.nan
+    hi[hi == 0.0] = np.nan
+    ambos = ~np.isnan(lo) & ~np.isnan(hi)
+    lo, hi = np.where(ambos, np.fmin(lo, hi), lo), np.where(ambos, np.fmax(lo, hi), hi)
+    cals = np.array(list(cal_map.values()), dtype=float)
+    vals = np.empty((n, len(cal_map)))
+    for j, col in enumerate(cal_map):
+        vals[:, j] = np.nan_to_num(numerico(crudo(bloque, col, 0.0)), nan=0.0)
+    with np.errstate(invalid="ignore"):
+        en_rango = (np.isnan(lo)[:, None] | (cals[None, :] >= lo[:, None])) & (
+            np.isnan(hi)[:, None] | (cals[None, :] <= hi[:, None])
+        )
+    sum_in = np.zeros(n)
+    total = np.zeros(n)
+    for j in range(len(cal_map)):
+        total += vals[:, j]
+        sum_in += np.where(en_rango[:, j], vals[:, j], 0.0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        pct_cal = np.where(
+            (total > 0) & (1.0001 < total) & (total <= 100.0001),
+            sum_in,
+            np.where(total > 0, sum_in / total * 100.0, 0.0),
+        )
+    orden_cal = np.argsort(cals, kind="stable")
+    etiquetas = np.array([str(c) for c in cal_map.values()], dtype=object)[orden_cal]
+    positivos = (vals > 0)[:, orden_cal]
+    dentro = _listas_calibres(positivos & en_rango[:, orden_cal], etiquetas)
+    fuera = _listas_calibres(positivos & ~en_rango[:, orden_cal], etiquetas)
+
+    # Kilos: `r.get("KILOS_REAL", 0.0) or 0.0` (None y 0 -> 0.0)
+    kilos_raw = crudo(bloque, "KILOS_REAL", 0.0)
+    kilos = numerico(kilos_raw)
+    kilos[(kilos == 0) | np.equal(kilos_raw, None)] = 0.0
+    potencial = kilos * (pct_cal / 100.0)
+
+    # Reglas que bloquean PASA_BASE
+    lista = construir_reglas(
+        bloque,
+        reglas["defect_map"],
+        color_ok_pct,
+        sumas["CONDICION"],
+        sumas["CALIDAD"],
+    )
+    evaluacion = evaluar_reglas(lista, n, orden=orden)
+    ok = evaluacion["pasa"]
+    mercados = crudo(bloque, "MERCADO-CLIENTE", None)
+    estadisticas = tabla_estadisticas(
+        mercados,
+        [r.nombre for r in lista],
+        evaluacion["aplica"],
+        evaluacion["falla"],
+        potencial,
+        unica=orden is None,
+    )
+
+    detalle = pd.DataFrame(
+        {
+            "LOTE": crudo(bloque, "LOTE", None),
+            "MERCADO-CLIENTE": mercados,
+            "ESPECIE": crudo(bloque, "ESPECIE", None),
+            "LINEA PRODUCTO": crudo(bloque, "LINEA PRODUCTO", None),
+            "KILOS_REAL": kilos,
+            "ASIGNABLE_KG": np.where(ok, potencial, 0.0),
+            "PASA_BASE": ok,
+            "RAZONES": evaluacion["razones"],
+            "SUM_CALIDAD": sumas["CALIDAD"],
+            "LIM_CALIDAD": crudo(bloque, "SUMATORIA CALIDAD"),
+            "SUM_CONDICION": sumas["CONDICION"],
+            "LIM_CONDICION": crudo(bloque, "SUMATORIA CONDICION"),
+            "%CALIBRES_EN_RANGO": pct_cal,
+            "CALIBRES_DENTRO": dentro,
+            "CALIBRES_FUERA": fuera,
+            "BRIX_VAL": crudo(bloque, "PROMSOLSOL"),
+            "FIRMEZA_VAL": crudo(bloque, "PROMFIRMEZA"),
+            "COLOR_OK_%": color_ok_pct,
+            **{f"CAL_{c}": crudo(bloque, c) for c in reglas["cali_cols"]},
+            **{f"CON_{c}": crudo(bloque, c) for c in reglas["cond_cols"]},
+        },
+    ).infer_objects()
+    return detalle, estadisticas
+
+
+def _evaluar_vectorizado(
+    cand,
+    reglas,
+    progress=None,
+    cancel=None,
+    lotes_por_shard=25,
+    adaptativo=False,
+):
+    """Motor vectorizado: mismo resultado que _evaluar_filas, por bloques de pares.
+
+    Los bloques (~FILAS_POR_BLOQUE pares) se cortan en límites de shard de lotes;
+    entre bloques se reporta avance y se revisa la cancelación.
+
+    En modo adaptativo las reglas se evalúan de la más selectiva a la menos
+    (reglas['orden'] o, si no viene, el orden que deja una muestra inicial de
+    ~FILAS_MUESTRA pares evaluada completa) y solo sobre los pares que aún pasan.
+    PASA_BASE, ASIGNABLE_KG y los resúmenes no cambian; RAZONES queda con la
+    primera falla y las estadísticas cuentan solo las reglas evaluadas.
+    """
+    orden = reglas.get("orden") if adaptativo else None
+    lote_shard = pd.factorize(cand["LOTE"])[0] // max(1, int(lotes_por_shard))
+    cortes = np.flatnonzero(np.diff(lote_shard)) + 1
+    limites = [0]
+    for corte in cortes:
+        muestra = adaptativo and orden is None and len(limites) == 1
+        if corte - limites[-1] >= (FILAS_MUESTRA if muestra else FILAS_POR_BLOQUE):
+            limites.append(int(corte))
+    limites.append(len(cand))
+
+    acumulado = None
+    bloques, estadisticas = [], []
+    for inicio, fin in itertools.pairwise(limites):
+        check_cancel(cancel)
+        bloque, stats = _evaluar_bloque(cand.iloc[inicio:fin], reglas, orden)
+        if adaptativo and orden is None:
+            orden = orden_selectividad(stats)
+        bloques.append(bloque)
+        estadisticas.append(stats)
+        acumulado = _reportar_shard(
+            progress,
+            bloque,
+            acumulado,
+            fin / len(cand),
+            {"filas": fin, "total_filas": len(cand)},
+        )
+    detalle = pd.concat(bloques, ignore_index=True) if len(bloques) > 1 else bloques[0]
+    return detalle, combinar_estadisticas(estadisticas)
+
+
+# Motores de evaluación de reglas: motor(cand, reglas, ...) -> (detalle, estadísticas por regla)
+MOTORES_ASIGNACION = {
+    "filas": _evaluar_filas,
+    "vectorizado": _evaluar_vectorizado,
+    "adaptativo": functools.partial(_evaluar_vectorizado, adaptativo=True),
+    "duckdb": evaluar_duckdb,
+}
+
+# Motores con el mismo detalle que 'filas' (incluido RAZONES): intercambiables en la caché
+MOTORES_EXACTOS = ("filas", "vectorizado", "duckdb")
+
+# Motores que hacen el join lote x MC por su cuenta (fuera de memoria): reciben
+# cand=(lotes, tolerancias) sin unir y las claves del join en reglas['claves']
+MOTORES_CON_JOIN = ("duckdb",)
+
+
+def _contar_pares(lotes, tolerancias, claves):
+    """Pares lote x MC del join por claves, sin materializarlo."""
+    por_clave = (
+        lotes.groupby(claves, dropna=False)
+        .size()
+        .rename("lotes")
+        .to_frame()
+        .join(tolerancias.groupby(claves, dropna=False).size().rename("mcs"), how="inner")
+    )
+    return int((por_clave["lotes"] * por_clave["mcs"]).sum())
+
+
+def process_asignacion(
+    lotes_df,
+    tolerancias_df,
+    disminucion_df,
+    cruce_df,
+    especie=None,
+    linea_producto=None,
+    progress=None,
+    cancel=None,
+    lotes_por_shard=25,
+    instrumentacion=None,
+    motor="filas",
+    orden_reglas=None,
+):
+    """Procesa asignación de lotes a mercado-cliente.
+
+    Args:
+        lotes_df: DataFrame con datos de lotes
+        tolerancias_df: DataFrame con tolerancias por mercado-cliente
+        disminucion_df: DataFrame con porcentajes de disminución
+        cruce_df: DataFrame con cruce de variables
+        especie: Nombre de especie (para filtrar)
+        linea_producto: Línea de producto (para filtrar)
+        progress: Callback progress(etapa, avance, info) (opcional, ver utils.progress)
+        cancel: Evento de cancelación (threading.Event, opcional); se revisa entre shards
+        lotes_por_shard: Lotes evaluados entre cada reporte de avance (default: 25)
+        instrumentacion: Instrumentacion que mide cada etapa (opcional, ver
+            utils.instrumentation): disminucion, preparacion, evaluacion y resumenes
+        motor: Motor de evaluación de reglas (ver MOTORES_ASIGNACION): 'filas' (referencia)
+            o 'vectorizado', con el mismo resultado (ver benchmarks/equivalencia.py),
+            'adaptativo', que deja en RAZONES solo la primera regla que falla, o
+            'duckdb' (join y reglas en SQL fuera de memoria, ver utils.motor_sql)
+        orden_reglas: Nombres de regla de la más selectiva a la menos para el motor
+            'adaptativo' (ver utils.reglas.orden_selectividad); si es None lo aprende
+            de una muestra
+
+    Returns:
+        dict con:
+            - 'detalle': DataFrame detallado por lote y mercado-cliente
+            - 'resumen_mc': Resumen por mercado-cliente
+            - 'resumen_lote': Resumen por lote
+            - 'estadisticas_reglas': Pares evaluados, fallidos, kg perdidos y fallas
+              únicas por regla y mercado-cliente (ver utils.reglas)
+
+    """
+    if motor not in MOTORES_ASIGNACION:
+        raise ValueError(
+            f"Motor de asignación '{motor}' no válido. Disponibles: {list(MOTORES_ASIGNACION)}",
+        )
+
+    # Normalizar columnas
+    for df in [lotes_df, tolerancias_df, disminucion_df, cruce_df]:
+        norm_cols(df)
+
+    # NO filtrar aquí - el join por ESPECIE y LINEA PRODUCTO ya hace el filtrado
+
+    # Aplicar disminuciones (solo 500/600)
+    with etapa(instrumentacion, "disminucion", lotes=len(lotes_df)):
+        lotes_adj = lotes_df.copy()
+        cols_500_600 = SchemaResolver.de(lotes_adj).con_prefijo("500.0__", "600.0__")
+        for c in cols_500_600:
+            lotes_adj[c] = pd.to_numeric(lotes_adj[c], errors="coerce")
+
+        disminucion_df["VARIABLES"] = disminucion_df["VARIABLES"].astype(str).str.strip()
+        if "frac" not in disminucion_df.columns:
+            # Sin pasar por load_data: convertir aquí
+            disminucion_df["frac"] = a_fraccion(
+                disminucion_df[columna_disminucion(disminucion_df)],
+            )
+        dis_map = dict(zip(disminucion_df["VARIABLES"], disminucion_df["frac"]))
+        for var, frac in dis_map.items():
+            if var in lotes_adj.columns:
+                lotes_adj[var] = lotes_adj[var] * (1.0 - frac)
+
+        report(progress, "disminucion", 1.0)
+
+    with etapa(instrumentacion, "preparacion", lotes=len(lotes_df)) as medicion:
+        # Calibres
+        cal_map = parse_calibre_cols(lotes_adj.columns)
+        for col in cal_map.keys():
+            lotes_adj[col] = pd.to_numeric(lotes_adj[col], errors="coerce")
+
+        # Cruce 500/600
+        cru_eff = cruce_df.dropna(
+            subset=["VARIABLES TOLERANCIAS", "VARIABLE DE COMPARACION"]
+        ).copy()
+        cru_eff["VARIABLES TOLERANCIAS"] = cru_eff["VARIABLES TOLERANCIAS"].astype(str).str.strip()
+        cru_eff["VARIABLE DE COMPARACION"] = (
+            cru_eff["VARIABLE DE COMPARACION"].astype(str).str.strip()
+        )
+
+        mapped_defects = cru_eff[
+            cru_eff["VARIABLE DE COMPARACION"].str.contains(r"^\d{3}\.0__", regex=True, na=False)
+        ]
+        defect_map = [
+            (t, n, cat)
+            for t, n, cat in mapped_defects[
+                ["VARIABLES TOLERANCIAS", "VARIABLE DE COMPARACION", "CATEGORIA"]
+            ].itertuples(index=False, name=None)
+            if (n in lotes_adj.columns) and (t in tolerancias_df.columns)
+        ]
+        cond_cols = [n for (_, n, cat) in defect_map if str(cat).upper() == "CONDICION"]
+        cali_cols = [n for (_, n, cat) in defect_map if str(cat).upper() == "CALIDAD"]
+
+        # Join
+        join_keys = ["ESPECIE", "LINEA PRODUCTO"]
+
+        # Verificar que las columnas existan
+        for key in join_keys:
+            if key not in lotes_adj.columns:
+                raise ValueError(
+                    f"Columna '{key}' no encontrada en lotes. Columnas disponibles: {list(lotes_adj.columns)}",
+                )
+            if key not in tolerancias_df.columns:
+                raise ValueError(
+                    f"Columna '{key}' no encontrada en tolerancias. Columnas disponibles: {list(tolerancias_df.columns)}",
+                )
+
+        if motor in MOTORES_CON_JOIN:
+            cand = (lotes_adj, tolerancias_df)
+            n_pares = _contar_pares(lotes_adj, tolerancias_df, join_keys)
+        else:
+            cand = lotes_adj.merge(tolerancias_df, on=join_keys, how="inner", suffixes=("", "_TOL"))
+            n_pares = len(cand)
+        medicion.update(mcs=len(tolerancias_df), pares=n_pares)
+
+    if n_pares == 0:
+        raise ValueError(
+            f"No se encontraron coincidencias entre lotes y tolerancias para la combinación especificada. "
+            f"Lotes: {len(lotes_adj)} filas, Tolerancias: {len(tolerancias_df)} filas",
+        )
+
+    with etapa(
+        instrumentacion,
+        "evaluacion",
+        motor=motor,
+        lotes=len(lotes_df),
+        mcs=len(tolerancias_df),
+        pares=n_pares,
+    ):
+        detalle, estadisticas = MOTORES_ASIGNACION[motor](
+            cand,
+            {
+                "cal_map": cal_map,
+                "defect_map": defect_map,
+                "cond_cols": cond_cols,
+                "cali_cols": cali_cols,
+                "orden": orden_reglas,
+                "claves": join_keys,
+            },
+            progress=progress,
+            cancel=cancel,
+            lotes_por_shard=lotes_por_shard,
+        )
 
     if len(detalle) == 0:
         raise ValueError(
             "No se generaron filas en el procesamiento. Verifique que haya coincidencias entre lotes y tolerancias.",
         )
 
-    # Resúmenes
-    # Verificar que existe la columna MERCADO-CLIENTE
-    if "MERCADO-CLIENTE" not in detalle.columns and "MERCADO_CLIENTE" not in detalle.columns:
-        # Intentar encontrar la columna con pick_col
-        try:
-            col_mc_detalle = pick_col(
-                detalle,
-                ["MERCADO-CLIENTE", "MERCADO_CLIENTE", "MERCADOCLIENTE"],
+    with etapa(instrumentacion, "resumenes", filas=len(detalle)):
+        # Resúmenes
+        # Verificar que existe la columna MERCADO-CLIENTE
+        if "MERCADO-CLIENTE" not in detalle.columns and "MERCADO_CLIENTE" not in detalle.columns:
+            # Intentar encontrar la columna por nombre canónico
+            try:
+                col_mc_detalle = SchemaResolver.de(detalle).col(
+                    ["MERCADO-CLIENTE", "MERCADO_CLIENTE", "MERCADOCLIENTE"],
+                )
+            except KeyError:
+                raise ValueError(
+                    f"Columna MERCADO-CLIENTE no encontrada. Columnas disponibles: {list(detalle.columns)}",
+                )
+        else:
+            col_mc_detalle = (
+                "MERCADO-CLIENTE" if "MERCADO-CLIENTE" in detalle.columns else "MERCADO_CLIENTE"
             )
-        except KeyError:
-            raise ValueError(
-                f"Columna MERCADO-CLIENTE no encontrada. Columnas disponibles: {list(detalle.columns)}",
-            )
-    else:
-        col_mc_detalle = (
-            "MERCADO-CLIENTE" if "MERCADO-CLIENTE" in detalle.columns else "MERCADO_CLIENTE"
-        )
 
-    res_mc = (
-        detalle.groupby(col_mc_detalle, as_index=False)
-        .agg(LOTES_OK=("PASA_BASE", "sum"), KILOS_ASIGNABLE=("ASIGNABLE_KG", "sum"))
-        .sort_values("KILOS_ASIGNABLE", ascending=False)
-    )
+        res_mc = (
+            detalle.groupby(col_mc_detalle, as_index=False)
+            .agg(LOTES_OK=("PASA_BASE", "sum"), KILOS_ASIGNABLE=("ASIGNABLE_KG", "sum"))
+            .sort_values("KILOS_ASIGNABLE", ascending=False)
+        )
 
-    # Renombrar para consistencia
-    if col_mc_detalle != "MERCADO-CLIENTE":
-        res_mc.rename(columns={col_mc_detalle: "MERCADO-CLIENTE"}, inplace=True)
+        # Renombrar para consistencia
+        if col_mc_detalle != "MERCADO-CLIENTE":
+            res_mc.rename(columns={col_mc_detalle: "MERCADO-CLIENTE"}, inplace=True)
 
-    res_lote = (
-        detalle.groupby("LOTE", as_index=False)
-        .agg(
-            KILOS=("KILOS_REAL", "first"),
-            MEJORES_MERCADOS=("ASIGNABLE_KG", lambda s: int((s > 0).sum())),
-            TOTAL_ASIGNABLE=("ASIGNABLE_KG", "sum"),
+        res_lote = (
+            detalle.groupby("LOTE", as_index=False)
+            .agg(
+                KILOS=("KILOS_REAL", "first"),
+                MEJORES_MERCADOS=("ASIGNABLE_KG", lambda s: int((s > 0).sum())),
+                TOTAL_ASIGNABLE=("ASIGNABLE_KG", "sum"),
+            )
+            .sort_values("TOTAL_ASIGNABLE", ascending=False)
         )
-        .sort_values("TOTAL_ASIGNABLE", ascending=False)
-    )
 
-    return {"detalle": detalle, "resumen_mc": res_mc, "resumen_lote": res_lote}
+    return {
+        "detalle": detalle,
+        "resumen_mc": res_mc,
+        "resumen_lote": res_lote,
+        "estadisticas_reglas": estadisticas,
+    }
@@ -0,0 +1,80 @@
+"""Exploración de AsignacionDetalle: filtros, orden y paginación del lado del servidor"""
+
+import re
+
+import numpy as np
+import pandas as pd
+
+# Nombre de la regla al inicio de cada razón de RAZONES (ver process_asignacion):
+# "BRIX 7.1 < 8.0", "Firmeza sin dato", "Sum CALIDAD 12 > 10", "<tolerancia>: x > y"
+_REGLA = re.compile(r"^(Sum CONDICION|Sum CALIDAD|BRIX|Firmeza|Color|[^:]+(?=:))")
+
+
+def reglas_fallidas(detalle):
+    """Reglas que aparecen en RAZONES, con el número de pares lote x MC que fallan cada una.
+
+    Returns:
+        DataFrame con REGLA y PARES, de la regla más frecuente a la menos frecuente
+
+    """
+    razones = detalle["RAZONES"].fillna("")
+    razones = razones[razones != ""].str.split("; ").explode()
+    reglas = razones.str.extract(_REGLA, expand=False).dropna().rename("REGLA")
+    # Una regla cuenta una vez por par aunque aparezca en varias razones
+    pares = reglas.reset_index().drop_duplicates()["REGLA"].value_counts()
+    return pares.reset_index(name="PARES")
+
+
+def filtrar_detalle(detalle, lotes=None, mcs=None, pasa=None, regla=None):
+    """Posiciones (iloc) de las filas que cumplen los filtros; None o vacío = sin filtro.
+
+    Args:
+        lotes: LOTEs a incluir
+        mcs: MERCADO-CLIENTEs a incluir
+        pasa: True / False para PASA_BASE
+        regla: nombre de regla (de reglas_fallidas) que debe figurar en RAZONES
+
+    """
+    mask = np.ones(len(detalle), dtype=bool)
+    if lotes:
+        mask &= detalle["LOTE"].isin(lotes).to_numpy()
+    if mcs:
+        mask &= detalle["MERCADO-CLIENTE"].isin(mcs).to_numpy()
+    if pasa is not None:
+        mask &= detalle["PASA_BASE"].fillna(False).astype(bool).to_numpy() == bool(pasa)
+    if regla:
+        patron = rf"(?:^|; ){re.escape(regla)}(?:[ :]|$)"
+        mask &= detalle["RAZONES"].fillna("").str.contains(patron, regex=True).to_numpy()
+    return np.flatnonzero(mask)
+
+
+def ordenar_posiciones(detalle, posiciones, columna=None, ascendente=True):
+    """Reordena las posiciones por una columna (orden estable; NaN al final)."""
+    if columna is None or len(posiciones) == 0:
+        return posiciones
+    valores = detalle[columna].iloc[posiciones].reset_index(drop=True)
+    orden = valores.sort_values(ascending=ascendente, kind="stable", na_position="last").index
+    return posiciones[orden.to_numpy()]
+
+
+def pagina_detalle(detalle, posiciones, pagina=1, filas_por_pagina=100):
+    """Materializa solo una página de las posiciones filtradas y ordenadas.
+
+    Returns:
+        (DataFrame de la página, número total de páginas)
+
+    """
+    paginas = max(1, -(-len(posiciones) // filas_por_pagina))
+    pagina = min(max(1, int(pagina)), paginas)
+    inicio = (pagina - 1) * filas_por_pagina
+    pos = posiciones[inicio : inicio + filas_por_pagina]
+    return detalle.iloc[pos], paginas
+
+
+def columnas_orden(detalle):
+    """Columnas por las que se puede ordenar: numéricas y MERCADO-CLIENTE."""
+    return [
+        c
+        for c in detalle.columns
+        if c == "MERCADO-CLIENTE" or pd.api.types.is_numeric_dtype(detalle[c])
+    ]
@@ -0,0 +1,82 @@
+"""Diagnóstico de rendimiento de un análisis: etapas medidas, tamaños de entrada y memoria"""
+
+import pandas as pd
+
+from .cache import nbytes
+
+# Columnas del desglose por etapa: registro de utils.instrumentation -> columna
+_COLUMNAS_ETAPAS = {
+    "origen": "ORIGEN",
+    "segundos": "SEGUNDOS",
+    "cpu_s": "CPU_S",
+    "rss_pico_mb": "RSS_PICO_MB",
+    "lotes": "LOTES",
+    "mcs": "MCS",
+    "pares": "PARES",
+}
+
+
+def desglose_etapas(registros):
+    """Tabla de etapas medidas en orden de ejecución, con las sub-etapas indentadas.
+
+    Args:
+        registros: registros de una Instrumentacion (ver utils.instrumentation)
+
+    Returns:
+        DataFrame con ETAPA, ORIGEN (capas de la caché), SEGUNDOS, CPU_S,
+        RSS_PICO_MB, LOTES, MCS, PARES, US_POR_PAR (microsegundos por par lote x
+        MC, comparable entre tamaños) y %_TOTAL (sobre las etapas de primer nivel)
+
+    """
+    df = pd.DataFrame(registros)
+    if df.empty:
+        return df
+    df = df.sort_values("inicio_s", kind="stable").reset_index(drop=True)
+    partes = df["etapa"].str.split(".")
+    nivel = partes.str.len() - 1
+    total = df.loc[nivel == 0, "segundos"].sum()
+
+    tabla = pd.DataFrame(
+        {"ETAPA": [f"{'· ' * n}{p[-1]}" for n, p in zip(nivel, partes)]},
+    )
+    for campo, columna in _COLUMNAS_ETAPAS.items():
+        tabla[columna] = df.get(campo)
+    pares = pd.to_numeric(tabla["PARES"], errors="coerce")
+    tabla["US_POR_PAR"] = (tabla["SEGUNDOS"] / pares * 1e6).where(pares > 0)
+    tabla["%_TOTAL"] = (tabla["SEGUNDOS"] / total * 100) if total > 0 else None
+    return tabla
+
+
+def motor_evaluacion(registros):
+    """Motor de evaluación de reglas usado en la asignación medida, o None si no se calculó."""
+    for registro in registros or ():
+        if registro["etapa"].endswith("evaluacion") and "motor" in registro:
+            return registro["motor"]
+    return None
+
+
+def tamanos_entrada(resultados, datos):
+    """Tamaños de entrada de un análisis.
+
+    Args:
+        resultados: dict de process_species_linea / PipelineCache.run
+        datos: datos de carga de la línea (ver PipelineCache.datos)
+
+    Returns:
+        dict con lotes, mcs, pares (lote x MC evaluados) y reglas_cruce (filas de
+        Cruce con variable de tolerancia y de comparación)
+
+    """
+    cruce = datos["cruce"]
+    reglas = cruce.dropna(subset=["VARIABLES TOLERANCIAS", "VARIABLE DE COMPARACION"])
+    return {
+        "lotes": len(datos["lotes"]),
+        "mcs": len(datos["tolerancias"]),
+        "pares": len(resultados["asignacion"]["detalle"]),
+        "reglas_cruce": len(reglas),
+    }
+
+
+def memoria_mb(obj):
+    """Memoria aproximada (MB) de los DataFrames y arrays contenidos en obj."""
+    return nbytes(obj) / 2**20
@@ -0,0 +1,148 @@
+"""Comparación de dos resultados (otra configuración, otro archivo de tolerancias...)"""
+
+import numpy as np
+import pandas as pd
+
+# Tablas de tolerancias (VARIABLE x C1..CK) que se comparan
+TABLAS_TOL = ["tol_criticos", "tol_laxos", "tol_sugeridas", "tol_sug_mono"]
+# Columnas del resumen en kilos; las demás son conteos
+KILOS_RESUMEN = ("KILOS_A", "KILOS_B", "DELTA_KILOS")
+
+
+def _estado(en_a, en_b, cambio, etiqueta_cambio):
+    return np.select(
+        [~en_b, ~en_a, cambio],
+        ["solo_a", "solo_b", etiqueta_cambio],
+        default="igual",
+    )
+
+
+def diff_clusters_mc(a, b, tol_kg=0.5):
+    """MCs que cambiaron de cluster o de KILOS_ASIGNABLE (más de tol_kg)."""
+    cols = ["MERCADO-CLIENTE", "KILOS_ASIGNABLE", "CLUSTER"]
+    m = a[cols].merge(b[cols], on="MERCADO-CLIENTE", how="outer", suffixes=("_A", "_B"))
+    en_a = m["CLUSTER_A"].notna().to_numpy()
+    en_b = m["CLUSTER_B"].notna().to_numpy()
+    m["DELTA_KILOS"] = m["KILOS_ASIGNABLE_B"].fillna(0.0) - m["KILOS_ASIGNABLE_A"].fillna(0.0)
+    cambio_cluster = (m["CLUSTER_A"] != m["CLUSTER_B"]).to_numpy()
+    cambio_kilos = (m["DELTA_KILOS"].abs() > tol_kg).to_numpy()
+    m["ESTADO"] = _estado(
+        en_a,
+        en_b,
+        cambio_cluster | cambio_kilos,
+        np.where(cambio_cluster, "cambio_cluster", "cambio_kilos"),
+    )
+    m = m[m["ESTADO"] != "igual"]
+    return m.sort_values("DELTA_KILOS", key=np.abs, ascending=False).reset_index(drop=True)
+
+
+def diff_resumen_mc(a, b):
+    """Variación de LOTES_OK y KILOS_ASIGNABLE por MERCADO-CLIENTE (todas las filas)."""
+    m = a.merge(b, on="MERCADO-CLIENTE", how="outer", suffixes=("_A", "_B"))
+    kilos_a = m["KILOS_ASIGNABLE_A"].fillna(0.0)
+    m["DELTA_KILOS"] = m["KILOS_ASIGNABLE_B"].fillna(0.0) - kilos_a
+    m["DELTA_PCT"] = (m["DELTA_KILOS"] / kilos_a.where(kilos_a != 0)).mul(100).round(2)
+    m["DELTA_LOTES_OK"] = m["LOTES_OK_B"].fillna(0) - m["LOTES_OK_A"].fillna(0)
+    return m.sort_values("DELTA_KILOS", key=np.abs, ascending=False).reset_index(drop=True)
+
+
+def diff_detalle(a, b, tol_kg=0.5):
+    """Pares LOTE x MERCADO-CLIENTE que cambiaron de pasa/falla o de kilos asignables."""
+    key = ["LOTE", "MERCADO-CLIENTE"]
+    cols = [*key, "KILOS_REAL", "ASIGNABLE_KG", "PASA_BASE", "RAZONES"]
+    m = a[cols].merge(
+        b[cols],
+        on=key,
+        how="outer",
+        suffixes=("_A", "_B"),
+        indicator=True,
+    )
+    en_a = (m["_merge"] != "right_only").to_numpy()
+    en_b = (m["_merge"] != "left_only").to_numpy()
+    pasa_a = m["PASA_BASE_A"].fillna(False).astype(bool).to_numpy()
+    pasa_b = m["PASA_BASE_B"].fillna(False).astype(bool).to_numpy()
+    m["DELTA_KG"] = m["ASIGNABLE_KG_B"].fillna(0.0) - m["ASIGNABLE_KG_A"].fillna(0.0)
+    cambio_pasa = pasa_a != pasa_b
+    cambio_kg = (m["DELTA_KG"].abs() > tol_kg).to_numpy()
+    m["ESTADO"] = _estado(
+        en_a,
+        en_b,
+        cambio_pasa | cambio_kg,
+        np.where(cambio_pasa, np.where(pasa_b, "falla→pasa", "pasa→falla"), "cambio_kg"),
+    )
+    m = m[m["ESTADO"] != "igual"].drop(columns="_merge")
+    return m.sort_values(["ESTADO", *key]).reset_index(drop=True)
+
+
+def _largo(df, tabla):
+    """VARIABLE x C1..CK -> filas (TABLA, VARIABLE, CLUSTER, VALOR)."""
+    largo = df.melt(id_vars="VARIABLE", var_name="CLUSTER", value_name="VALOR")
+    largo["CLUSTER"] = largo["CLUSTER"].str.lstrip("C").astype(int)
+    largo.insert(0, "TABLA", tabla)
+    return largo
+
+
+def diff_tolerancias(a, b, tablas=TABLAS_TOL, atol=1e-9):
+    """Celdas VARIABLE x CLUSTER cuyo valor cambió entre las tablas de tolerancias."""
+    key = ["TABLA", "VARIABLE", "CLUSTER"]
+    largo_a = pd.concat([_largo(a[t], t) for t in tablas if t in a], ignore_index=True)
+    largo_b = pd.concat([_largo(b[t], t) for t in tablas if t in b], ignore_index=True)
+    m = largo_a.merge(largo_b, on=key, how="outer", suffixes=("_A", "_B"))
+    va = m["VALOR_A"].to_numpy(dtype=float)
+    vb = m["VALOR_B"].to_numpy(dtype=float)
+    iguales = np.isclose(va, vb, atol=atol, rtol=0.0) | (np.isnan(va) & np.isnan(vb))
+    m = m[~iguales].copy()
+    m["DELTA"] = m["VALOR_B"] - m["VALOR_A"]
+    return m.reset_index(drop=True)
+
+
+def diff_results(a, b, tol_kg=0.5):
+    """Compara dos resultados de process_species_linea / PipelineCache.load_run.
+
+    Todas las comparaciones son joins vectorizados sobre las claves naturales:
+    MERCADO-CLIENTE, LOTE x MERCADO-CLIENTE y VARIABLE x CLUSTER.
+
+    Args:
+        a, b: dicts con 'asignacion' y 'clusters' (a = base, b = comparado)
+        tol_kg: diferencia mínima de kilos para considerar un cambio
+
+    Returns:
+        dict con:
+            - 'resumen': DataFrame de una fila con los conteos de cambios
+            - 'clusters_mc': MCs que cambiaron de cluster o de kilos asignables
+            - 'resumen_mc': delta de LOTES_OK y KILOS_ASIGNABLE por MC
+            - 'detalle': pares LOTE x MC que cambiaron de pasa/falla o de kilos
+            - 'tolerancias': celdas de Tol_* que cambiaron (formato largo)
+
+    """
+    clusters_mc = diff_clusters_mc(
+        a["clusters"]["clusters_mc"], b["clusters"]["clusters_mc"], tol_kg
+    )
+    resumen_mc = diff_resumen_mc(a["asignacion"]["resumen_mc"], b["asignacion"]["resumen_mc"])
+    detalle = diff_detalle(a["asignacion"]["detalle"], b["asignacion"]["detalle"], tol_kg)
+    tolerancias = diff_tolerancias(a["clusters"], b["clusters"])
+
+    resumen = pd.DataFrame(
+        [
+            {
+                "MC_CAMBIO_CLUSTER": int((clusters_mc["ESTADO"] == "cambio_cluster").sum()),
+                "MC_CAMBIO_KILOS": int((clusters_mc["ESTADO"] == "cambio_kilos").sum()),
+                "MC_SOLO_A": int((clusters_mc["ESTADO"] == "solo_a").sum()),
+                "MC_SOLO_B": int((clusters_mc["ESTADO"] == "solo_b").sum()),
+                "LOTE_MC_PASA_A_FALLA": int((detalle["ESTADO"] == "pasa→falla").sum()),
+                "LOTE_MC_FALLA_A_PASA": int((detalle["ESTADO"] == "falla→pasa").sum()),
+                "LOTE_MC_CAMBIO_KG": int((detalle["ESTADO"] == "cambio_kg").sum()),
+                "TOL_CELDAS_CAMBIADAS": len(tolerancias),
+                "KILOS_A": float(resumen_mc["KILOS_ASIGNABLE_A"].sum()),
+                "KILOS_B": float(resumen_mc["KILOS_ASIGNABLE_B"].sum()),
+                "DELTA_KILOS": float(resumen_mc["DELTA_KILOS"].sum()),
+            },
+        ],
+    )
+    return {
+        "resumen": resumen,
+        "clusters_mc": clusters_mc,
+        "resumen_mc": resumen_mc,
+        "detalle": detalle,
+        "tolerancias": tolerancias,
+    }
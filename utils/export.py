@@ -0,0 +1,217 @@
+"""Exportación de resultados a Excel y formatos columnares (Parquet/Arrow/CSV)"""
+
+import json
+import math
+import zipfile
+from datetime import datetime
+from io import BytesIO
+from pathlib import Path
+
+import pandas as pd
+
+# Hojas del Excel completo: (sección de resultados, clave, nombre de hoja)
+HOJAS_RESULTADOS = [
+    ("clusters", "clusters_mc", "ClustersMC"),
+    ("clusters", "clusters_summary", "Clusters_Summary"),
+    ("clusters", "clusters_calidad", "Clusters_Calidad"),
+    ("clusters", "tol_criticos", "Tol_Criticos"),
+    ("clusters", "tol_laxos", "Tol_Laxos"),
+    ("clusters", "tol_crit_mono", "Tol_Crit_Mono"),
+    ("clusters", "tol_lax_mono", "Tol_Lax_Mono"),
+    ("clusters", "tol_crit_src", "Tol_Crit_Src"),
+    ("clusters", "tol_lax_src", "Tol_Lax_Src"),
+    ("clusters", "tol_sugeridas", "Tol_Sugeridas"),
+    ("clusters", "tol_sug_mono", "Tol_Sug_Mono"),
+    ("asignacion", "detalle", "AsignacionDetalle"),
+    ("asignacion", "resumen_mc", "ResumenMC"),
+    ("asignacion", "resumen_lote", "ResumenLote"),
+    ("asignacion", "estadisticas_reglas", "EstadisticasReglas"),
+]
+
+# Tablas recalculadas que se agregan al Excel de ediciones
+HOJAS_RECALCULADAS = [
+    ("tol_criticos", "Tol_Criticos_Recalc"),
+    ("tol_laxos", "Tol_Laxos_Recalc"),
+    ("tol_sugeridas", "Tol_Sugeridas_Recalc"),
+    ("tol_sug_mono", "Tol_Sug_Mono_Recalc"),
+]
+
+XLSX_MIME = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+# Formatos de exportación: extensión y MIME del archivo descargable
+FORMATOS_EXPORT = {
+    "xlsx": {"extension": ".xlsx", "mime": XLSX_MIME},
+    "parquet": {"extension": ".parquet.zip", "mime": "application/zip"},
+    "arrow": {"extension": ".arrow.zip", "mime": "application/zip"},
+    "csv": {"extension": ".csv.zip", "mime": "application/zip"},
+}
+
+
+def _celda(v):
+    """Valor escribible por xlsxwriter (NaN/NaT/NA como celda vacía, como pandas)."""
+    if v is None or v is pd.NaT or v is pd.NA:
+        return None
+    if isinstance(v, float) and not math.isfinite(v):
+        return None if math.isnan(v) else ("inf" if v > 0 else "-inf")
+    if isinstance(v, (str, int, float, bool, pd.Timestamp)):
+        return v
+    return str(v)
+
+
+def _escribir_hoja(workbook, nombre, df, fmt_header):
+    """Escribe un DataFrame fila a fila (compatible con constant_memory)."""
+    ws = workbook.add_worksheet(nombre)
+    ws.write_row(0, 0, [str(c) for c in df.columns], fmt_header)
+    for i, fila in enumerate(df.itertuples(index=False, name=None), start=1):
+        ws.write_row(i, 0, [_celda(v) for v in fila])
+
+
+def write_excel_bytes(hojas) -> bytes:
+    """Genera un Excel en memoria a partir de pares (nombre de hoja, DataFrame).
+
+    Usa el modo constant_memory de xlsxwriter: cada fila se vuelca al archivo
+    temporal apenas se escribe, por lo que la memoria no crece con el tamaño
+    de AsignacionDetalle. Las hojas con DataFrame None se omiten.
+    """
+    # Import diferido: xlsxwriter se carga recién con la primera exportación
+    import xlsxwriter
+
+    output = BytesIO()
+    workbook = xlsxwriter.Workbook(
+        output,
+        {"constant_memory": True, "default_date_format": "yyyy-mm-dd hh:mm:ss"},
+    )
+    fmt_header = workbook.add_format({"bold": True, "border": 1, "align": "center"})
+    for nombre, df in hojas:
+        if df is not None:
+            _escribir_hoja(workbook, nombre, df, fmt_header)
+    workbook.close()
+    return output.getvalue()
+
+
+def _arrow_table(df):
+    """DataFrame -> pyarrow.Table; columnas object con tipos mezclados pasan a texto."""
+    try:
+        import pyarrow as pa
+    except ImportError as e:
+        raise ImportError("Exportar a Parquet/Arrow requiere 'pip install pyarrow'") from e
+
+    try:
+        return pa.Table.from_pandas(df, preserve_index=False)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        df = df.copy()
+        for col in df.columns[df.dtypes == object]:
+            df[col] = df[col].map(lambda v: v if v is None or pd.isna(v) else str(v))
+        return pa.Table.from_pandas(df, preserve_index=False)
+
+
+def _tabla_bytes(df, formato) -> bytes:
+    if formato == "csv":
+        return df.to_csv(index=False).encode("utf-8")
+
+    table = _arrow_table(df)
+    output = BytesIO()
+    if formato == "parquet":
+        import pyarrow.parquet as pq
+
+        pq.write_table(table, output)
+    else:
+        import pyarrow as pa
+
+        with pa.ipc.new_file(output, table.schema) as writer:
+            writer.write_table(table)
+    return output.getvalue()
+
+
+def write_bundle_bytes(hojas, formato="parquet", metadata=None) -> bytes:
+    """Empaqueta tablas como archivos Parquet, Arrow (IPC) o CSV en un zip.
+
+    El zip incluye manifest.json con el formato, la fecha de generación, la
+    metadata recibida (especie, línea, run_id...) y, por tabla, el archivo,
+    número de filas y columnas con su tipo.
+
+    Args:
+        hojas: pares (nombre de tabla, DataFrame); los DataFrame None se omiten
+        formato: 'parquet', 'arrow' o 'csv'
+        metadata: dict opcional a incluir en el manifiesto
+
+    """
+    if formato not in ("parquet", "arrow", "csv"):
+        raise ValueError(f"Formato no soportado: {formato}")
+
+    tablas = []
+    output = BytesIO()
+    with zipfile.ZipFile(output, "w") as zf:
+        for nombre, df in hojas:
+            if df is None:
+                continue
+            archivo = f"{nombre}.{formato}"
+            # Parquet ya viene comprimido
+            compresion = zipfile.ZIP_STORED if formato == "parquet" else zipfile.ZIP_DEFLATED
+            zf.writestr(archivo, _tabla_bytes(df, formato), compress_type=compresion)
+            tablas.append(
+                {
+                    "nombre": nombre,
+                    "archivo": archivo,
+                    "filas": len(df),
+                    "columnas": [{"nombre": str(c), "tipo": str(t)} for c, t in df.dtypes.items()],
+                },
+            )
+        manifest = {
+            "formato": formato,
+            "generado": datetime.now().isoformat(timespec="seconds"),
+            **(metadata or {}),
+            "tablas": tablas,
+        }
+        zf.writestr("manifest.json", json.dumps(manifest, ensure_ascii=False, indent=2))
+    return output.getvalue()
+
+
+def write_tables_bytes(hojas, formato="xlsx", metadata=None) -> bytes:
+    """Exporta tablas en cualquiera de FORMATOS_EXPORT (Excel o zip con manifiesto)."""
+    if formato == "xlsx":
+        return write_excel_bytes(hojas)
+    return write_bundle_bytes(hojas, formato, metadata)
+
+
+def export_path(destino, formato) -> Path:
+    """Ruta de salida con la extensión del formato (p.ej. salida.xlsx -> salida.parquet.zip)."""
+    destino = Path(destino)
+    return destino.with_name(
+        destino.name.removesuffix(destino.suffix) + FORMATOS_EXPORT[formato]["extension"]
+    )
+
+
+def write_tables_file(hojas, destino, formato="xlsx", metadata=None) -> Path:
+    """Escribe las tablas a disco en el formato indicado. Devuelve la ruta escrita."""
+    ruta = export_path(destino, formato)
+    ruta.write_bytes(write_tables_bytes(hojas, formato, metadata))
+    return ruta
+
+
+def tablas_resultados(resultados):
+    """Pares (nombre de hoja, DataFrame) de resultados, en el orden del Excel completo."""
+    return [(hoja, resultados[seccion].get(clave)) for seccion, clave, hoja in HOJAS_RESULTADOS]
+
+
+def resultados_to_excel_bytes(resultados) -> bytes:
+    """Convierte resultados de process_species_linea a Excel en memoria."""
+    return write_excel_bytes(tablas_resultados(resultados))
+
+
+def resultados_to_bytes(resultados, formato="xlsx") -> bytes:
+    """Exporta resultados de process_species_linea en el formato indicado."""
+    metadata = {
+        "especie": resultados.get("especie"),
+        "linea_producto": resultados.get("linea_producto"),
+        "run_id": resultados.get("run_id"),
+    }
+    return write_tables_bytes(tablas_resultados(resultados), formato, metadata)
+
+
+def ediciones_to_excel_bytes(tol_sug_mono, clusters_mc, clusters_editados=None) -> bytes:
+    """Excel con las tablas editadas y, si hay, las tolerancias recalculadas."""
+    hojas = [("Tol_Sug_Mono_Editada", tol_sug_mono), ("ClustersMC_Editada", clusters_mc)]
+    if clusters_editados is not None:
+        hojas += [(hoja, clusters_editados[clave]) for clave, hoja in HOJAS_RECALCULADAS]
+    return write_excel_bytes(hojas)
@@ -1,10 +1,13 @@
 """Funciones auxiliares comunes"""
 
+import functools
 import re
 import unicodedata
 
 import pandas as pd
 
+from .numeros import a_numero, fraccion
+
 
 def norm(s):
     """Normaliza string: strip."""
@@ -21,56 +24,116 @@ def canon(s: str) -> str:
     """Canonicaliza string para comparación.
     Normaliza unicode, quita acentos, espacios, guiones, etc.
     """
-    s = unicodedata.normalize("NFKD", str(s))
+    return _canon(str(s))
+
+
+@functools.lru_cache(maxsize=8192)
+def _canon(s):
+    # Memoizado por texto: nombres de columnas y variables se repiten en cada llamada
+    s = unicodedata.normalize("NFKD", s)
     s = "".join(ch for ch in s if not unicodedata.combining(ch))
     s = s.upper().strip()
     return s.replace(" ", "").replace("_", "").replace("-", "").replace("/", "")
 
 
+class SchemaResolver:
+    """Búsqueda de columnas por nombre canónico, compilada una vez por esquema.
+
+    Los nombres canónicos se calculan al construirlo; las búsquedas (col) y los
+    grupos por prefijo (con_prefijo) se memoizan. Usar SchemaResolver.de(df) para
+    compartir el resolver entre todos los DataFrames con las mismas columnas.
+    """
+
+    def __init__(self, columnas):
+        self.columnas = tuple(columnas)
+        self.canonicas = tuple(canon(c) for c in self.columnas)
+        # Igual que {canon(c): c}: con nombres canónicos repetidos gana el último
+        self._exactas = dict(zip(self.canonicas, self.columnas))
+        self._busquedas = {}
+        self._prefijos = {}
+
+    @classmethod
+    def de(cls, df):
+        """Resolver del esquema de df (uno por tupla de columnas, reutilizado)."""
+        return _resolver(tuple(df.columns))
+
+    def col(self, candidates):
+        """Columna para candidates, con la misma regla que pick_col.
+
+        Coincidencia exacta de nombre canónico en el orden de candidates; si no
+        hay, la primera columna cuyo nombre canónico contiene algún candidato.
+        """
+        clave = tuple(candidates)
+        if clave not in self._busquedas:
+            self._busquedas[clave] = self._buscar(clave)
+        encontrada = self._busquedas[clave]
+        if encontrada is None:
+            raise KeyError(
+                f"No se encontró ninguna de {candidates}. Columnas disponibles: {list(self.columnas)}",
+            )
+        return encontrada
+
+    def _buscar(self, candidates):
+        claves = [canon(cand) for cand in candidates]
+        for clave in claves:
+            if clave in self._exactas:
+                return self._exactas[clave]
+        for c, nombre in zip(self.columnas, self.canonicas):
+            if any(clave in nombre for clave in claves):
+                return c
+        return None
+
+    def con_prefijo(self, *prefijos):
+        """Columnas (tupla, en orden) cuyo nombre empieza con alguno de los prefijos."""
+        if prefijos not in self._prefijos:
+            self._prefijos[prefijos] = tuple(
+                c for c in self.columnas if str(c).startswith(prefijos)
+            )
+        return self._prefijos[prefijos]
+
+
+def _resolver(columnas):
+    # Los tipos van en la clave: 1 y 1.0 son iguales para el caché pero no como nombres
+    return _resolver_tipado(columnas, tuple(map(type, columnas)))
+
+
+@functools.lru_cache(maxsize=256)
+def _resolver_tipado(columnas, _tipos):
+    return SchemaResolver(columnas)
+
+
 def pick_col(df, candidates):
     """Busca una columna en el dataframe usando nombres canónicos.
     Intenta coincidencias exactas primero, luego parciales.
     """
-    cmap = {canon(c): c for c in df.columns}
-    # Primero intenta coincidencias exactas
-    for cand in candidates:
-        if canon(cand) in cmap:
-            return cmap[canon(cand)]
-    # Luego intenta coincidencias parciales
-    for c in df.columns:
-        if any(canon(cand) in canon(c) for cand in candidates):
-            return c
-    raise KeyError(
-        f"No se encontró ninguna de {candidates}. Columnas disponibles: {list(df.columns)}",
-    )
+    return SchemaResolver.de(df).col(candidates)
 
 
 def pct_to_fraction(x) -> float:
     """Convierte porcentaje a fracción.
     '96,6%' -> 0.966 ; '96.6' -> 0.966 ; 0.966 -> 0.966
     """
-    if pd.isna(x):
-        return 0.0
-    s = str(x).strip().replace("%", "").replace(",", ".")
-    try:
-        v = float(s)
-    except Exception:
-        v = pd.to_numeric(x, errors="coerce")
-        if pd.isna(v):
-            return 0.0
-    return v / 100.0 if v > 1.0 else v
+    return fraccion(x)
+
+
+def parse_quantiles_arg(s: str):
+    """Acepta '0.9,0.7,0.5' o '90,70,50'. Convierte a [0..1]. Ignora espacios."""
+    if s is None:
+        return None
+    parts = [p.strip() for p in s.split(",") if p.strip() != ""]
+    out = []
+    for p in parts:
+        try:
+            x = float(p.replace("%", ""))
+        except ValueError:
+            continue
+        out.append(min(max(x / 100.0 if x > 1.0 else x, 0.0), 1.0))
+    return out if out else None
 
 
 def to_num_series(ser: pd.Series) -> pd.Series:
-    """Convierte serie a numérica, limpiando formato."""
-    return (
-        ser.astype(str)
-        .str.replace("%", "", regex=False)
-        .str.replace(",", ".", regex=False)
-        .str.replace("\xa0", "", regex=False)
-        .str.replace(r"[^0-9\.\-]", "", regex=True)
-        .pipe(pd.to_numeric, errors="coerce")
-    )
+    """Convierte serie a numérica, limpiando formato (ver utils.numeros.a_numero)."""
+    return a_numero(ser)
 
 
 def normalize_bounds(inf, sup):
@@ -89,9 +152,8 @@ def normalize_bounds(inf, sup):
 def parse_calibre_cols(cols):
     """Devuelve dict {col_name: int_calibre} para columnas 100.0__XX"""
     cal_map = {}
-    for c in cols:
-        if str(c).startswith("100.0__"):
-            m = re.search(r"100\.0__([0-9]+)", str(c))
-            if m:
-                cal_map[c] = int(m.group(1))
+    for c in _resolver(tuple(cols)).con_prefijo("100.0__"):
+        m = re.search(r"100\.0__([0-9]+)", str(c))
+        if m:
+            cal_map[c] = int(m.group(1))
     return cal_map
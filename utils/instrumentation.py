@@ -0,0 +1,161 @@
+"""Instrumentación por etapa del pipeline: tiempo, CPU, memoria y volumen de filas
+
+Uso:
+    inst = Instrumentacion(sink_jsonl("metricas.jsonl"), sink_logger())
+    resultados = process_species_linea(especie, linea, instrumentacion=inst)
+    resultados["instrumentacion"]   # lista de registros (también en inst.registros)
+
+Cada etapa produce un registro (dict) con:
+    etapa        nombre con la ruta de etapas anidadas ("asignacion.evaluacion")
+    estado       'ok' o 'error' (la etapa terminó con una excepción)
+    inicio_s     segundos desde la creación de la Instrumentacion hasta el inicio de la
+                 etapa (ordenar por inicio_s da el árbol de etapas en orden)
+    segundos     tiempo de pared
+    cpu_s        tiempo de CPU del hilo que ejecuta la etapa
+    rss_pico_mb  cuánto subió el pico de memoria (RSS) del proceso durante la etapa;
+                 0 si no superó un pico anterior, None si la plataforma no lo informa
+    + conteos de filas de la etapa (lotes, mcs, pares, ...) y el contexto de la
+      Instrumentacion (por ejemplo especie y linea_producto)
+
+Sin instrumentación (None) las etapas usan un contexto nulo: el costo es una
+llamada a función por etapa, no por fila.
+"""
+
+import json
+import logging
+import sys
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from pathlib import Path
+
+import pandas as pd
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# ru_maxrss está en KB en Linux y en bytes en macOS
+_RSS_A_MB = 1 / 2**20 if sys.platform == "darwin" else 1 / 2**10
+
+logger = logging.getLogger(__name__)
+
+
+def rss_pico_mb():
+    """Pico de memoria residente del proceso (MB), o None si no está disponible."""
+    if resource is None:
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * _RSS_A_MB
+
+
+class Instrumentacion:
+    """Mide etapas del pipeline y envía cada registro a los sinks.
+
+    Los registros quedan además en memoria (`registros`), que es el reporte que
+    se devuelve junto a los resultados. Un sink es cualquier callable sink(registro).
+    Usar una instancia por ejecución: la ruta de etapas anidadas es de un solo hilo.
+
+    Args:
+        *sinks: destinos adicionales de cada registro (ver sink_logger, sink_jsonl)
+        **contexto: campos que se agregan a todos los registros
+    """
+
+    def __init__(self, *sinks, **contexto):
+        self.sinks = list(sinks)
+        self.contexto = contexto
+        self.registros = []
+        self._pila = []
+        self._lock = threading.Lock()
+        self._t0 = time.perf_counter()
+
+    @contextmanager
+    def etapa(self, nombre, **conteos):
+        """Mide el bloque como una etapa; el registro se puede completar dentro del bloque."""
+        ruta = ".".join([*self._pila, nombre])
+        registro = {"etapa": ruta, **self.contexto, **conteos}
+        self._pila.append(nombre)
+        rss0 = rss_pico_mb()
+        cpu0 = time.thread_time()
+        t0 = time.perf_counter()
+        estado = "error"
+        try:
+            yield registro
+            estado = "ok"
+        finally:
+            segundos = time.perf_counter() - t0
+            cpu_s = time.thread_time() - cpu0
+            rss1 = rss_pico_mb()
+            self._pila.pop()
+            registro.update(
+                estado=estado,
+                inicio_s=t0 - self._t0,
+                segundos=segundos,
+                cpu_s=cpu_s,
+                rss_pico_mb=None if rss0 is None else max(0.0, rss1 - rss0),
+            )
+            self._emitir(registro)
+
+    def _emitir(self, registro):
+        with self._lock:
+            self.registros.append(registro)
+        for sink in self.sinks:
+            try:
+                sink(registro)
+            except Exception:
+                # Un sink que falla no debe interrumpir el pipeline
+                logger.exception("Error en sink de instrumentación")
+
+    def reporte(self):
+        """Registros como DataFrame (una fila por etapa, en orden de término)."""
+        return pd.DataFrame(self.registros)
+
+
+def etapa(instrumentacion, nombre, **conteos):
+    """Contexto de medición de una etapa; nulo si instrumentacion es None.
+
+    Devuelve siempre un dict dentro del bloque, así el llamador puede agregar
+    conteos sin revisar si la instrumentación está activa.
+    """
+    if instrumentacion is None:
+        return nullcontext({})
+    return instrumentacion.etapa(nombre, **conteos)
+
+
+def sink_logger(log=None, nivel=logging.INFO):
+    """Sink que escribe una línea de log por etapa."""
+    log = log or logger
+
+    def _sink(registro):
+        conteos = {
+            k: v
+            for k, v in registro.items()
+            if k not in ("etapa", "estado", "inicio_s", "segundos", "cpu_s", "rss_pico_mb")
+        }
+        rss = registro["rss_pico_mb"]
+        log.log(
+            nivel,
+            "[%s] %s %.3fs (cpu %.3fs, rss +%s MB) %s",
+            registro["etapa"],
+            registro["estado"],
+            registro["segundos"],
+            registro["cpu_s"],
+            "?" if rss is None else f"{rss:.1f}",
+            conteos,
+        )
+
+    return _sink
+
+
+def sink_jsonl(path):
+    """Sink que agrega cada registro como una línea JSON al archivo (lo crea si no existe)."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    lock = threading.Lock()
+
+    def _sink(registro):
+        linea = json.dumps(registro, ensure_ascii=False, default=str)
+        with lock, path.open("a", encoding="utf-8") as f:
+            f.write(linea + "\n")
+
+    return _sink
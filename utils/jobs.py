@@ -0,0 +1,103 @@
+"""Ejecución de procesos en segundo plano con avance y cancelación"""
+
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from .progress import ETAPAS, ProcesoCancelado, avance_total
+
+
+class Job:
+    """Proceso en segundo plano.
+
+    La función recibe los kwargs `progress` y `cancel` (ver utils.progress).
+    El estado se lee desde el hilo de la app mientras el proceso avanza:
+    estado, etapa, avance (0..1 global), parcial (último info reportado por
+    etapa), resultado y error.
+    """
+
+    def __init__(self, fn, kwargs):
+        self.id = uuid.uuid4().hex[:8]
+        self.fn = fn
+        self.kwargs = kwargs
+        self.cancel_event = threading.Event()
+        self.estado = "pendiente"
+        self.etapa = None
+        self.avance = 0.0
+        self.parcial = {}
+        self.resultado = None
+        self.error = None
+        self.inicio = None
+        self.fin = None
+        self._future = None
+
+    def _progress(self, etapa, avance, info):
+        self.etapa = etapa
+        self.avance = max(self.avance, avance_total(etapa, avance))
+        if info:
+            self.parcial = {**self.parcial, etapa: info}
+
+    def _run(self):
+        self.estado = "ejecutando"
+        self.inicio = time.time()
+        try:
+            self.resultado = self.fn(
+                progress=self._progress, cancel=self.cancel_event, **self.kwargs
+            )
+            self.avance = 1.0
+            self.estado = "completado"
+        except ProcesoCancelado:
+            self.estado = "cancelado"
+        except Exception as e:
+            self.error = e
+            self.estado = "error"
+        finally:
+            self.fin = time.time()
+
+    def cancel(self):
+        """Solicita la cancelación; el proceso se detiene en el próximo punto de control."""
+        self.cancel_event.set()
+        if self._future is not None and self._future.cancel():
+            self.estado = "cancelado"
+
+    @property
+    def terminado(self):
+        return self.estado in ("completado", "cancelado", "error")
+
+    @property
+    def duracion(self):
+        if self.inicio is None:
+            return 0.0
+        return (self.fin or time.time()) - self.inicio
+
+    def descripcion_etapa(self):
+        """Texto legible de la etapa actual (p.ej. 'evaluacion (3/5)')."""
+        if self.etapa is None:
+            return "en cola"
+        pos = list(ETAPAS).index(self.etapa) + 1 if self.etapa in ETAPAS else "?"
+        return f"{self.etapa} ({pos}/{len(ETAPAS)})"
+
+
+class JobManager:
+    """Pool de hilos para ejecutar procesos del pipeline fuera del hilo de la app."""
+
+    def __init__(self, max_workers=2):
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="carozos-job")
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def submit(self, fn, **kwargs) -> Job:
+        job = Job(fn, kwargs)
+        with self._lock:
+            self._jobs[job.id] = job
+        job._future = self._pool.submit(job._run)
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def forget(self, job_id):
+        with self._lock:
+            self._jobs.pop(job_id, None)
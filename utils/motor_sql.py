@@ -0,0 +1,438 @@
+"""Motor de asignación en SQL sobre DuckDB embebido (opcional: pip install duckdb)
+
+Para historiales de lotes que no caben cómodos en memoria una vez unidos con
+las tolerancias: lotes y tolerancias (solo las columnas que usan las reglas) se
+escriben como Parquet en un directorio de trabajo y DuckDB hace el join lote x
+MC y la evaluación de las reglas por tramos de lotes. El join nunca se
+materializa en pandas; DuckDB usa el mismo directorio para volcar a disco lo
+que no entre en su límite de memoria.
+
+Reproduce _evaluar_vectorizado: mismas comparaciones (NaN/0 = sin
+restricción), mismo orden de suma en color, sumatorias y calibres, y los
+mismos textos en RAZONES y CALIBRES_DENTRO/FUERA (DuckDB convierte DOUBLE a
+texto con la misma representación que Python). Las columnas que se copian tal
+cual al detalle (LOTE, BRIX_VAL, LIM_*, CAL_*, CON_*, ...) se toman de los
+DataFrames originales por posición, y las estadísticas por regla se calculan
+con utils.reglas sobre las máscaras que devuelve la consulta.
+
+Configuración (variables de entorno):
+  CAROZOS_DUCKDB_DIR      directorio de trabajo (Parquet y volcado a disco);
+                          default: una carpeta temporal por ejecución
+  CAROZOS_DUCKDB_MEMORIA  límite de memoria de DuckDB (ej. '2GB'; default: el de DuckDB)
+"""
+
+import itertools
+import os
+import tempfile
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from .progress import check_cancel
+from .reglas import MEDIDAS, combinar_estadisticas, tabla_estadisticas
+
+# Bins de color y su límite inferior (ver data_processor.pct_color_ge)
+_BINS_COLOR = {"400.0__0 - 30": 0, "400.0__30-50": 30, "400.0__50-75": 50, "400.0__75-100": 75}
+
+
+def _q(nombre):
+    """Identificador SQL entre comillas."""
+    return '"' + str(nombre).replace('"', '""') + '"'
+
+
+def _texto(ser):
+    """Columna object como texto (None si falta): DuckDB no infiere tipos mezclados."""
+    if ser.dtype != object:
+        return ser
+    return ser.map(
+        lambda v: None if v is None or (isinstance(v, float) and np.isnan(v)) else str(v)
+    )
+
+
+class _Columnas:
+    """Columnas de los pares lote x MC (como en el merge con suffixes=('', '_TOL')).
+
+    Cada columna usada se lee una vez en la consulta, con alias c0, c1, ...
+    """
+
+    def __init__(self, lotes, tolerancias, claves):
+        self.lotes, self.tolerancias, self.claves = lotes, tolerancias, claves
+        self.alias = {}
+
+    def origen(self, col):
+        """'l' (lotes, incluidas las claves), 't' (tolerancias) o None si no existe."""
+        if col in self.lotes.columns:
+            return "l"
+        if col in self.tolerancias.columns:
+            return "t"
+        return None
+
+    def ref(self, col):
+        """Alias SQL de la columna cruda, o None si no existe en los pares."""
+        if self.origen(col) is None:
+            return None
+        return self.alias.setdefault(col, f"c{len(self.alias)}")
+
+    def num(self, col, default="NULL"):
+        """Valor numérico (utils.reglas.numerico): NULL si falta, es NaN o no es número."""
+        ref = self.ref(col)
+        if ref is None:
+            return default
+        return f"NULLIF(TRY_CAST({ref} AS DOUBLE), 'nan'::DOUBLE)"
+
+    def txt(self, col):
+        """Valor crudo como lo escribe un f-string (NaN o ausente -> 'nan')."""
+        ref = self.ref(col)
+        return "'nan'" if ref is None else f"COALESCE(CAST({ref} AS VARCHAR), 'nan')"
+
+    def tabla(self, origen):
+        """DataFrame con __fila y las columnas usadas de lotes ('l') o tolerancias ('t')."""
+        df = self.lotes if origen == "l" else self.tolerancias
+        usadas = [*self.claves, *(c for c in self.alias if self.origen(c) == origen)]
+        tabla = pd.DataFrame({c: _texto(df[c]) for c in dict.fromkeys(usadas)})
+        tabla.insert(0, "__fila", np.arange(len(df), dtype=np.int64))
+        return tabla.reset_index(drop=True)
+
+
+def _suma(terminos):
+    """Suma en el mismo orden que el motor por filas: ((0.0 + a) + b) + ..."""
+    expr = "0.0"
+    for t in terminos:
+        expr = f"({expr} + {t})"
+    return expr
+
+
+def _activo(x):
+    """Límite definido y mayor que 0 (utils.reglas.limite_activo)."""
+    return f"COALESCE({x} > 0, false)"
+
+
+def _pct(parte, total):
+    """Porcentaje como pct_color_ge / pct_calibres_en_rango_y_listas: ya en % o relativo al total."""
+    return (
+        f"CASE WHEN {total} > 0 AND 1.0001 < {total} AND {total} <= 100.0001 THEN {parte} "
+        f"WHEN {total} > 0 THEN {parte} / {total} * 100.0 ELSE 0.0 END"
+    )
+
+
+def consulta_asignacion(cols, reglas):
+    """SQL de la evaluación de un tramo de lotes (parámetros: primera y última+1 fila de lotes).
+
+    Args:
+        cols: _Columnas de los pares
+        reglas: dict de process_asignacion (cal_map, defect_map, cond_cols, cali_cols)
+
+    Returns:
+        (sql, nombres de regla en el orden de utils.reglas.construir_reglas)
+
+    """
+    calc = {}
+
+    # COLOR
+    cmin = cols.num("PORC_COLOR CUBRIMIENTO MIN")
+    valores = {b: f"COALESCE({cols.num(b, '0.0')}, 0.0)" for b in _BINS_COLOR}
+    total = _suma(valores.values())
+    acc = _suma(
+        f"CASE WHEN {lim} >= {cmin} THEN {valores[b]} ELSE 0.0 END"
+        for b, lim in _BINS_COLOR.items()
+    )
+    calc["color_ok"] = f"CASE WHEN {_activo(cmin)} THEN {_pct(acc, total)} END"
+
+    # Sumatorias
+    for nombre, lista in (("sum_cond", reglas["cond_cols"]), ("sum_cali", reglas["cali_cols"])):
+        calc[nombre] = _suma(f"COALESCE({cols.num(c)}, 0.0)" for c in lista)
+
+    # Calibres (normalize_bounds: 0/NaN = sin límite, rango invertido se ordena)
+    lo = f"NULLIF({cols.num('CALIBRE INFERIOR')}, 0.0)"
+    hi = f"NULLIF({cols.num('CALIBRE SUPERIOR')}, 0.0)"
+    # LEAST/GREATEST ignoran NULL: solo se ordena con los dos límites definidos
+    ambos = f"{lo} IS NOT NULL AND {hi} IS NOT NULL"
+    calc["cal_lo"] = f"CASE WHEN {ambos} THEN LEAST({lo}, {hi}) ELSE {lo} END"
+    calc["cal_hi"] = f"CASE WHEN {ambos} THEN GREATEST({lo}, {hi}) ELSE {hi} END"
+    cal_map = reglas["cal_map"]
+    for j, col in enumerate(cal_map):
+        calc[f"cal_v{j}"] = f"COALESCE({cols.num(col, '0.0')}, 0.0)"
+
+    # Kilos: `r.get("KILOS_REAL", 0.0) or 0.0` (0 -> 0.0; NaN se mantiene)
+    calc["kilos"] = (
+        "0.0" if cols.ref("KILOS_REAL") is None else f"TRY_CAST({cols.ref('KILOS_REAL')} AS DOUBLE)"
+    )
+
+    en_rango = {
+        j: f"((cal_lo IS NULL OR {cal} >= cal_lo) AND (cal_hi IS NULL OR {cal} <= cal_hi))"
+        for j, cal in enumerate(cal_map.values())
+    }
+    total_cal = _suma(f"cal_v{j}" for j in range(len(cal_map)))
+    sum_in = _suma(f"CASE WHEN {en_rango[j]} THEN cal_v{j} ELSE 0.0 END" for j in en_rango)
+    orden_cal = sorted(range(len(cal_map)), key=lambda j: list(cal_map.values())[j])
+    etiquetas = [str(c) for c in cal_map.values()]
+
+    def _lista(dentro):
+        partes = [
+            f"CASE WHEN cal_v{j} > 0 AND {'' if dentro else 'NOT '}{en_rango[j]} "
+            f"THEN '{etiquetas[j]}' END"
+            for j in orden_cal
+        ]
+        return f"concat_ws(', ', {', '.join(partes)})" if partes else "''"
+
+    derivados = {
+        "pct_cal": _pct(sum_in, total_cal),
+        "dentro": _lista(True),
+        "fuera": _lista(False),
+    }
+
+    # Reglas que bloquean PASA_BASE: (nombre, aplica, falla, mensaje)
+    brix_tol, brix = cols.num("BRIX"), cols.num("PROMSOLSOL")
+    lo_f, hi_f, firm = (
+        cols.num("FIRMEZA INFERIOR"),
+        cols.num("FIRMEZAS SUPERIORES"),
+        cols.num("PROMFIRMEZA"),
+    )
+    bajo = f"({_activo(lo_f)} AND COALESCE({firm} < {lo_f}, false))"
+    alto = f"({_activo(hi_f)} AND COALESCE({firm} > {hi_f}, false))"
+    firm_txt = cols.txt("PROMFIRMEZA")
+    reglas_sql = [
+        (
+            "BRIX",
+            _activo(brix_tol),
+            f"({brix} IS NULL OR {brix} < {brix_tol})",
+            f"'BRIX ' || {cols.txt('PROMSOLSOL')} || ' < ' || {cols.txt('BRIX')}",
+        ),
+        (
+            "Firmeza",
+            f"({_activo(lo_f)} OR {_activo(hi_f)})",
+            f"({firm} IS NULL OR {bajo} OR {alto})",
+            (
+                f"CASE WHEN {firm} IS NULL THEN 'Firmeza sin dato' ELSE concat_ws('; ', "
+                f"CASE WHEN {bajo} THEN 'Firmeza ' || {firm_txt} || ' < ' || "
+                f"{cols.txt('FIRMEZA INFERIOR')} END, "
+                f"CASE WHEN {alto} THEN 'Firmeza ' || {firm_txt} || ' > ' || "
+                f"{cols.txt('FIRMEZAS SUPERIORES')} END) END"
+            ),
+        ),
+        (
+            "Color",
+            _activo(cmin),
+            f"color_ok < {cmin}",
+            (
+                f"'Color ' || printf('%.1f', color_ok) || '% < ' || "
+                f"{cols.txt('PORC_COLOR CUBRIMIENTO MIN')} || '%'"
+            ),
+        ),
+    ]
+    for tol_name, nect_name, _cat in reglas["defect_map"]:
+        tol, x = cols.num(tol_name), cols.num(nect_name)
+        literal = str(tol_name).replace("'", "''")
+        reglas_sql.append(
+            (
+                tol_name,
+                f"{tol} IS NOT NULL",
+                f"COALESCE({x} > {tol}, false)",
+                f"'{literal}: ' || {cols.txt(nect_name)} || ' > ' || {cols.txt(tol_name)}",
+            ),
+        )
+    for nombre, suma in (("CONDICION", "sum_cond"), ("CALIDAD", "sum_cali")):
+        lim = cols.num(f"SUMATORIA {nombre}")
+        reglas_sql.append(
+            (
+                f"Sum {nombre}",
+                _activo(lim),
+                f"{suma} > {lim}",
+                (
+                    f"'Sum {nombre} ' || CAST({suma} AS VARCHAR) || ' > ' || "
+                    f"{cols.txt(f'SUMATORIA {nombre}')}"
+                ),
+            ),
+        )
+
+    flags = {}
+    for j, (_, aplica, falla, _) in enumerate(reglas_sql):
+        flags[f"a{j}"] = aplica
+        flags[f"f{j}"] = f"(a{j} AND COALESCE({falla}, false))"
+    razones = ", ".join(f"CASE WHEN f{j} THEN {r[3]} END" for j, r in enumerate(reglas_sql))
+    pasa = " OR ".join(f"f{j}" for j in range(len(reglas_sql))) or "false"
+
+    claves = " AND ".join(f"l.{_q(c)} IS NOT DISTINCT FROM t.{_q(c)}" for c in cols.claves)
+    crudas = ", ".join(f"{cols.origen(c)}.{_q(c)} AS {alias}" for c, alias in cols.alias.items())
+
+    def _select(exprs):
+        return ", ".join(f"{expr} AS {nombre}" for nombre, expr in exprs.items())
+
+    sql = f"""
+        WITH pares AS (
+            SELECT l.__fila AS __fl, t.__fila AS __ft{", " + crudas if crudas else ""}
+            FROM lotes l JOIN tolerancias t ON {claves}
+            WHERE l.__fila >= $inicio AND l.__fila < $fin
+        ),
+        calc AS (SELECT *, {_select(calc)} FROM pares),
+        derivados AS (SELECT *, {_select(derivados)} FROM calc),
+        aplica AS (SELECT *, {_select({k: v for k, v in flags.items() if k[0] == "a"})} FROM derivados),
+        falla AS (SELECT *, {_select({k: v for k, v in flags.items() if k[0] == "f"})} FROM aplica)
+        SELECT __fl, __ft, kilos, kilos * (pct_cal / 100.0) AS potencial, NOT ({pasa}) AS pasa,
+            concat_ws('; ', {razones or "NULL"}) AS razones, sum_cali, sum_cond, pct_cal,
+            dentro, fuera, color_ok, {", ".join(flags)}
+        FROM falla
+        ORDER BY __fl, __ft
+    """
+    return sql, [r[0] for r in reglas_sql]
+
+
+def _conectar(directorio):
+    try:
+        import duckdb
+    except ImportError as e:
+        raise ImportError("El motor de asignación 'duckdb' requiere 'pip install duckdb'") from e
+
+    con = duckdb.connect()
+    con.execute(f"SET temp_directory = '{directorio.as_posix()}'")
+    memoria = os.environ.get("CAROZOS_DUCKDB_MEMORIA")
+    if memoria:
+        con.execute(f"SET memory_limit = '{memoria}'")
+    return con
+
+
+def _tramos(lotes, pares_por_lote, lotes_por_shard, filas_por_bloque):
+    """Límites [inicio, fin) de filas de lotes: shards completos hasta ~filas_por_bloque pares."""
+    shard = pd.factorize(lotes["LOTE"])[0] // max(1, int(lotes_por_shard))
+    cortes = np.flatnonzero(np.diff(shard)) + 1
+    acumulados = np.concatenate([[0], np.cumsum(pares_por_lote)])
+    limites = [0]
+    for corte in cortes:
+        if acumulados[corte] - acumulados[limites[-1]] >= filas_por_bloque:
+            limites.append(int(corte))
+    limites.append(len(lotes))
+    return limites
+
+
+def evaluar_duckdb(cand, reglas, progress=None, cancel=None, lotes_por_shard=25):
+    """Motor SQL: mismo resultado que _evaluar_vectorizado, con el join hecho en DuckDB.
+
+    Args:
+        cand: (lotes, tolerancias) sin unir (ver MOTORES_CON_JOIN en utils.data_processor)
+        reglas: dict de process_asignacion, con 'claves' del join
+
+    Returns:
+        (detalle, estadísticas por regla y MC)
+
+    """
+    # Import diferido: data_processor registra este motor
+    from .data_processor import FILAS_POR_BLOQUE, _reportar_shard
+
+    lotes, tolerancias = cand
+    claves = reglas["claves"]
+    cols = _Columnas(lotes, tolerancias, claves)
+    sql, nombres = consulta_asignacion(cols, reglas)
+
+    # Pares de cada fila de lotes (para cortar los tramos en ~FILAS_POR_BLOQUE pares)
+    mcs_por_clave = tolerancias.groupby(claves, dropna=False).size().rename("__mcs")
+    pares_por_lote = (
+        lotes[claves].join(mcs_por_clave, on=claves)["__mcs"].fillna(0).to_numpy(dtype=np.int64)
+    )
+    total_pares = int(pares_por_lote.sum())
+    limites = _tramos(lotes, pares_por_lote, lotes_por_shard, FILAS_POR_BLOQUE)
+
+    # Columnas que pasan tal cual al detalle: valores crudos de los DataFrames originales
+    crudas = {
+        "LOTE": "LOTE",
+        "MERCADO-CLIENTE": "MERCADO-CLIENTE",
+        "ESPECIE": "ESPECIE",
+        "LINEA PRODUCTO": "LINEA PRODUCTO",
+        "LIM_CALIDAD": "SUMATORIA CALIDAD",
+        "LIM_CONDICION": "SUMATORIA CONDICION",
+        "BRIX_VAL": "PROMSOLSOL",
+        "FIRMEZA_VAL": "PROMFIRMEZA",
+        **{f"CAL_{c}": c for c in reglas["cali_cols"]},
+        **{f"CON_{c}": c for c in reglas["cond_cols"]},
+    }
+
+    def _crudo(col, fl, ft, default=np.nan):
+        origen = cols.origen(col)
+        if origen is None:
+            return np.full(len(fl), default, dtype=object)
+        df, pos = (lotes, fl) if origen == "l" else (tolerancias, ft)
+        return df[col].to_numpy()[pos]
+
+    base = os.environ.get("CAROZOS_DUCKDB_DIR")
+    if base:
+        Path(base).mkdir(parents=True, exist_ok=True)
+    with tempfile.TemporaryDirectory(dir=base) as tmp:
+        directorio = Path(tmp)
+        con = _conectar(directorio)
+        try:
+            # Tablas columnares en disco: la consulta las lee por tramos
+            for nombre, origen in (("lotes", "l"), ("tolerancias", "t")):
+                ruta = directorio / f"{nombre}.parquet"
+                con.register("__df", cols.tabla(origen))
+                con.execute(f"COPY (SELECT * FROM __df) TO '{ruta.as_posix()}' (FORMAT parquet)")
+                con.unregister("__df")
+                con.execute(
+                    f"CREATE VIEW {nombre} AS SELECT * FROM read_parquet('{ruta.as_posix()}')"
+                )
+
+            acumulado = None
+            bloques, estadisticas = [], []
+            hechos = 0
+            for inicio, fin in itertools.pairwise(limites):
+                check_cancel(cancel)
+                res = con.execute(sql, {"inicio": inicio, "fin": fin}).df()
+                if len(res) == 0:
+                    continue
+                fl, ft = res["__fl"].to_numpy(), res["__ft"].to_numpy()
+                valores = {c: _crudo(col, fl, ft) for c, col in crudas.items()}
+                for c in ("LOTE", "MERCADO-CLIENTE", "ESPECIE", "LINEA PRODUCTO"):
+                    valores[c] = _crudo(crudas[c], fl, ft, None)
+                aplica = res[[f"a{j}" for j in range(len(nombres))]].to_numpy(dtype=bool)
+                falla = res[[f"f{j}" for j in range(len(nombres))]].to_numpy(dtype=bool)
+                pasa = res["pasa"].to_numpy(dtype=bool)
+                potencial = res["potencial"].to_numpy(dtype=float)
+                kilos = res["kilos"].to_numpy(dtype=float)
+                kilos[kilos == 0] = 0.0
+                bloque = pd.DataFrame(
+                    {
+                        "LOTE": valores["LOTE"],
+                        "MERCADO-CLIENTE": valores["MERCADO-CLIENTE"],
+                        "ESPECIE": valores["ESPECIE"],
+                        "LINEA PRODUCTO": valores["LINEA PRODUCTO"],
+                        "KILOS_REAL": kilos,
+                        "ASIGNABLE_KG": np.where(pasa, potencial, 0.0),
+                        "PASA_BASE": pasa,
+                        "RAZONES": res["razones"].to_numpy(dtype=object),
+                        "SUM_CALIDAD": res["sum_cali"].to_numpy(dtype=float),
+                        "LIM_CALIDAD": valores["LIM_CALIDAD"],
+                        "SUM_CONDICION": res["sum_cond"].to_numpy(dtype=float),
+                        "LIM_CONDICION": valores["LIM_CONDICION"],
+                        "%CALIBRES_EN_RANGO": res["pct_cal"].to_numpy(dtype=float),
+                        "CALIBRES_DENTRO": res["dentro"].to_numpy(dtype=object),
+                        "CALIBRES_FUERA": res["fuera"].to_numpy(dtype=object),
+                        "BRIX_VAL": valores["BRIX_VAL"],
+                        "FIRMEZA_VAL": valores["FIRMEZA_VAL"],
+                        "COLOR_OK_%": res["color_ok"].to_numpy(dtype=float),
+                        **{c: valores[c] for c in crudas if c[:4] in ("CAL_", "CON_")},
+                    },
+                ).infer_objects()
+                bloques.append(bloque)
+                estadisticas.append(
+                    tabla_estadisticas(
+                        valores["MERCADO-CLIENTE"],
+                        nombres,
+                        aplica,
+                        falla,
+                        potencial,
+                    ),
+                )
+                hechos += len(res)
+                acumulado = _reportar_shard(
+                    progress,
+                    bloque,
+                    acumulado,
+                    hechos / max(total_pares, 1),
+                    {"filas": hechos, "total_filas": total_pares},
+                )
+        finally:
+            con.close()
+
+    if not bloques:
+        return pd.DataFrame(), pd.DataFrame(columns=["REGLA", "MERCADO-CLIENTE", *MEDIDAS])
+    detalle = pd.concat(bloques, ignore_index=True) if len(bloques) > 1 else bloques[0]
+    return detalle, combinar_estadisticas(estadisticas)
@@ -0,0 +1,93 @@
+"""Conversión numérica de celdas con formato local ('96,6%', espacios duros, texto mezclado)
+
+Las columnas de tolerancias y disminución tienen muy pocos valores distintos:
+cada conversión parsea una vez cada valor único y reparte el resultado con los
+códigos de pd.factorize. Las columnas que ya son numéricas no se vuelven a
+parsear, así que convertir en la carga (normalizar_tolerancias) deja sin costo
+las conversiones posteriores del pipeline.
+"""
+
+import re
+
+import numpy as np
+import pandas as pd
+
+# Limpieza de to_num_series en una pasada: '%' y espacio duro fuera, ',' decimal -> '.'
+_TRADUCCION = str.maketrans({"%": None, "\xa0": None, ",": "."})
+_NO_NUMERICO = re.compile(r"[^0-9\.\-]")
+
+# Límites de Tolerancias que se comparan como números (además de las variables de Cruce)
+TOLERANCIAS_NUMERICAS = [
+    "BRIX",
+    "FIRMEZA INFERIOR",
+    "FIRMEZAS SUPERIORES",
+    "PORC_COLOR CUBRIMIENTO MIN",
+    "SUMATORIA CONDICION",
+    "SUMATORIA CONDICIÓN",
+    "SUMATORIA CALIDAD",
+    "CALIBRE INFERIOR",
+    "CALIBRE SUPERIOR",
+]
+
+
+def fraccion(x) -> float:
+    """Convierte porcentaje a fracción.
+    '96,6%' -> 0.966 ; '96.6' -> 0.966 ; 0.966 -> 0.966
+    """
+    if pd.isna(x):
+        return 0.0
+    s = str(x).strip().replace("%", "").replace(",", ".")
+    try:
+        v = float(s)
+    except Exception:
+        v = pd.to_numeric(x, errors="coerce")
+        if pd.isna(v):
+            return 0.0
+    return v / 100.0 if v > 1.0 else v
+
+
+def a_numero(ser: pd.Series) -> pd.Series:
+    """Serie numérica con la limpieza de to_num_series, parseando cada valor único una vez.
+
+    Quita '%', espacios duros y todo carácter que no sea dígito, '.' o '-', con ','
+    como separador decimal; lo que no queda como número es NaN. Una serie ya
+    numérica se devuelve tal cual.
+    """
+    if ser.dtype.kind in "iuf":
+        return ser
+    codigos, unicos = pd.factorize(ser.astype(str))
+    limpios = [_NO_NUMERICO.sub("", u.translate(_TRADUCCION)) for u in unicos]
+    valores = pd.to_numeric(pd.Series(limpios, dtype=object), errors="coerce").to_numpy()
+    return pd.Series(valores[codigos], index=ser.index, name=ser.name)
+
+
+def a_fraccion(ser: pd.Series) -> pd.Series:
+    """Serie de fracciones (ver fraccion), evaluando cada valor único una vez; NaN -> 0.0."""
+    codigos, unicos = pd.factorize(ser)
+    # NaN tiene código -1: toma el 0.0 agregado al final
+    valores = np.array([fraccion(u) for u in unicos] + [0.0], dtype=float)
+    return pd.Series(valores[codigos], index=ser.index, name=ser.name)
+
+
+def normalizar_tolerancias(tolerancias, cruce):
+    """Convierte a número, en el lugar, los límites de Tolerancias y las variables de Cruce.
+
+    Args:
+        tolerancias: hoja de tolerancias (columnas ya normalizadas)
+        cruce: hoja Cruce de Variables (define las tolerancias de defectos)
+
+    Returns:
+        tolerancias, con las columnas de límites numéricas
+
+    """
+    variables = list(TOLERANCIAS_NUMERICAS)
+    if "VARIABLES TOLERANCIAS" in cruce.columns:
+        variables += cruce["VARIABLES TOLERANCIAS"].dropna().astype(str).str.strip().tolist()
+    for col in dict.fromkeys(variables):
+        if col in tolerancias.columns:
+            serie = tolerancias[col]
+            numeros = a_numero(serie)
+            # Sin reasignar las columnas que ya eran numéricas (vistas del almacén consolidado)
+            if numeros is not serie:
+                tolerancias[col] = numeros
+    return tolerancias
@@ -2,9 +2,12 @@
 
 from pathlib import Path
 
-from .cluster_processor import process_clusters
+from .cluster_editor import build_cluster_state
+from .cluster_processor import prepare_tolerancias, process_clusters
 from .data_loader import load_data
 from .data_processor import process_asignacion
+from .instrumentation import etapa
+from .progress import check_cancel, report
 
 
 def process_species_linea(
@@ -14,6 +17,11 @@ def process_species_linea(
     qmin=None,
     qmax=None,
     base_dir: Path = None,
+    method="quantiles",
+    progress=None,
+    cancel=None,
+    instrumentacion=None,
+    motor="filas",
 ):
     """Procesa una combinación ESPECIE + LÍNEA PRODUCTO y genera todos los resultados.
 
@@ -24,42 +32,108 @@ def process_species_linea(
         qmin: Lista de cuantiles MIN (default: [0.9, 0.7, 0.5, 0.3, 0.1])
         qmax: Lista de cuantiles MAX (default: [0.1, 0.3, 0.5, 0.7, 0.9])
         base_dir: Directorio base (default: Path("."))
+        method: Método de clustering: 'quantiles', 'ckmeans' o 'jenks' (default: 'quantiles')
+        progress: Callback progress(etapa, avance, info) por etapa (opcional, ver utils.progress)
+        cancel: Evento de cancelación (threading.Event, opcional)
+        instrumentacion: Instrumentacion que mide cada etapa y sub-etapa (opcional,
+            ver utils.instrumentation)
+        motor: Motor de evaluación de reglas de la asignación (ver
+            utils.data_processor.MOTORES_ASIGNACION; default: 'filas')
 
     Returns:
         dict con todos los resultados:
-            - 'asignacion': resultados de asignación (detalle, resumen_mc, resumen_lote)
+            - 'asignacion': resultados de asignación (detalle, resumen_mc, resumen_lote,
+              estadisticas_reglas)
             - 'clusters': resultados de clusters (todos los DataFrames de tolerancias)
+            - 'estado_clusters': estado para re-calcular tolerancias al editar clusters
+              (ver utils.cluster_editor.update_clusters)
+            - 'instrumentacion': registros por etapa (solo si se pasó instrumentacion)
 
     """
     if base_dir is None:
         base_dir = Path()
 
     # Cargar datos
-    datos = load_data(especie, linea_producto, base_dir)
+    report(progress, "carga", 0.0)
+    with etapa(instrumentacion, "carga") as medicion:
+        datos = load_data(especie, linea_producto, base_dir)
+        medicion.update(lotes=len(datos["lotes"]), mcs=len(datos["tolerancias"]))
+    report(progress, "carga", 1.0)
+    check_cancel(cancel)
 
     # Procesar asignación
-    asignacion = process_asignacion(
-        datos["lotes"],
-        datos["tolerancias"],
-        datos["disminucion"],
-        datos["cruce"],
-        especie=especie,
-        linea_producto=linea_producto,
-    )
+    with etapa(instrumentacion, "asignacion"):
+        asignacion = process_asignacion(
+            datos["lotes"],
+            datos["tolerancias"],
+            datos["disminucion"],
+            datos["cruce"],
+            especie=especie,
+            linea_producto=linea_producto,
+            progress=progress,
+            cancel=cancel,
+            instrumentacion=instrumentacion,
+            motor=motor,
+        )
+    check_cancel(cancel)
 
-    # Procesar clusters
-    clusters = process_clusters(
-        asignacion["resumen_mc"],
-        datos["tolerancias"],
-        datos["cruce"],
+    # Procesar clusters (tolerancias parseadas una sola vez)
+    with etapa(instrumentacion, "preparacion_tolerancias", mcs=len(datos["tolerancias"])):
+        prepared = prepare_tolerancias(datos["tolerancias"], datos["cruce"])
+    resultado_clusters = run_clusters(
+        asignacion,
+        datos,
+        prepared,
         k=k,
         qmin=qmin,
         qmax=qmax,
+        method=method,
+        progress=progress,
+        instrumentacion=instrumentacion,
     )
 
-    return {
+    resultados = {
         "asignacion": asignacion,
-        "clusters": clusters,
+        **resultado_clusters,
         "especie": especie,
         "linea_producto": linea_producto,
     }
+    if instrumentacion is not None:
+        resultados["instrumentacion"] = instrumentacion.registros
+    return resultados
+
+
+def run_clusters(
+    asignacion,
+    datos,
+    prepared,
+    k=5,
+    qmin=None,
+    qmax=None,
+    method="quantiles",
+    progress=None,
+    instrumentacion=None,
+):
+    """Etapa de clustering: tolerancias por cluster + estado para ediciones incrementales.
+
+    Returns:
+        dict con 'clusters' y 'estado_clusters'
+
+    """
+    report(progress, "clustering", 0.0)
+    with etapa(instrumentacion, "clustering", mcs=len(asignacion["resumen_mc"]), k=k):
+        clusters = process_clusters(
+            asignacion["resumen_mc"],
+            datos["tolerancias"],
+            datos["cruce"],
+            k=k,
+            qmin=qmin,
+            qmax=qmax,
+            method=method,
+            prepared=prepared,
+            instrumentacion=instrumentacion,
+        )
+        with etapa(instrumentacion, "estado"):
+            estado = build_cluster_state(clusters, prepared, k, qmin, qmax, method)
+    report(progress, "clustering", 1.0)
+    return {"clusters": clusters, "estado_clusters": estado}
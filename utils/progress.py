@@ -0,0 +1,38 @@
+"""Reporte de progreso y cancelación para las etapas del pipeline"""
+
+# Etapas del pipeline y su peso aproximado en el avance total
+ETAPAS = {
+    "carga": 0.10,
+    "disminucion": 0.05,
+    "evaluacion": 0.72,
+    "clustering": 0.13,
+}
+
+
+class ProcesoCancelado(Exception):
+    """Se lanza cuando el usuario cancela un proceso en curso."""
+
+
+def report(progress, etapa: str, avance: float, **info):
+    """Notifica avance de una etapa (0..1) al callback progress(etapa, avance, info).
+
+    No hace nada si progress es None.
+    """
+    if progress is not None:
+        progress(etapa, min(max(float(avance), 0.0), 1.0), info)
+
+
+def check_cancel(cancel):
+    """Lanza ProcesoCancelado si el evento de cancelación está activo."""
+    if cancel is not None and cancel.is_set():
+        raise ProcesoCancelado("Proceso cancelado por el usuario")
+
+
+def avance_total(etapa: str, avance: float) -> float:
+    """Convierte el avance de una etapa en avance global del pipeline (0..1)."""
+    previo = 0.0
+    for nombre, peso in ETAPAS.items():
+        if nombre == etapa:
+            return previo + peso * avance
+        previo += peso
+    return previo
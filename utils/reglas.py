@@ -0,0 +1,265 @@
+"""Reglas de asignación evaluadas por columna: fallas, estadísticas por regla y orden adaptativo
+
+Cada regla que bloquea PASA_BASE (BRIX, Firmeza, Color, cada defecto de Cruce,
+Sum CONDICION y Sum CALIDAD) se evalúa sobre arrays de un bloque de pares
+lote x MC. De las máscaras de falla salen, con reducciones por columna, las
+estadísticas por (regla, MERCADO-CLIENTE):
+
+    EVALUADOS    pares en que la regla aplica (límite definido y evaluado)
+    FALLIDOS     pares que la regla rechaza
+    KG_PERDIDOS  kilos que esos pares habrían asignado (KILOS_REAL x %calibres)
+    UNICA        pares en que fue la única regla que falló (NaN en modo adaptativo)
+    KG_UNICA     kilos de esos pares: lo que se recupera relajando solo esta regla
+
+Los nombres de regla son los mismos que reconoce utils.detalle.reglas_fallidas.
+"""
+
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+MEDIDAS = ["EVALUADOS", "FALLIDOS", "KG_PERDIDOS", "UNICA", "KG_UNICA"]
+
+# evaluar(sel) -> (aplica, falla) para las filas sel del bloque (slice o posiciones);
+# mensajes(pos) -> textos de RAZONES para las posiciones pos que fallan
+Regla = namedtuple("Regla", ["nombre", "evaluar", "mensajes"])
+
+
+def crudo(bloque, col, default=np.nan):
+    """Valores de una columna tal como los entrega r.get(col, default) en el motor por filas."""
+    if col in bloque.columns:
+        return bloque[col].to_numpy()
+    return np.full(len(bloque), default, dtype=object)
+
+
+def numerico(valores):
+    """Valores como float (NaN si faltan o no son numéricos)."""
+    return pd.to_numeric(pd.Series(valores), errors="coerce").to_numpy(dtype=float)
+
+
+def limite_activo(limite):
+    """Límite definido y mayor que 0 (NaN y 0 = sin restricción)."""
+    return ~np.isnan(limite) & (limite > 0)
+
+
+def construir_reglas(bloque, defect_map, color_ok_pct, suma_cond, suma_cali):
+    """Reglas de un bloque en el orden en que el motor por filas escribe RAZONES.
+
+    Args:
+        bloque: pares lote x MC (merge de lotes y tolerancias)
+        defect_map: (tolerancia, variable, categoría) de la hoja Cruce
+        color_ok_pct, suma_cond, suma_cali: valores ya calculados por par
+
+    """
+    reglas = []
+
+    tol_brix, brix = crudo(bloque, "BRIX"), crudo(bloque, "PROMSOLSOL")
+
+    def _brix(sel):
+        tol, val = numerico(tol_brix[sel]), numerico(brix[sel])
+        aplica = limite_activo(tol)
+        return aplica, aplica & (np.isnan(val) | (val < tol))
+
+    reglas.append(
+        Regla(
+            "BRIX",
+            _brix,
+            lambda pos: [f"BRIX {b} < {t}" for b, t in zip(brix[pos], tol_brix[pos])],
+        ),
+    )
+
+    low, high = crudo(bloque, "FIRMEZA INFERIOR"), crudo(bloque, "FIRMEZAS SUPERIORES")
+    firm = crudo(bloque, "PROMFIRMEZA")
+
+    def _firmeza_partes(sel):
+        lo, hi, f = numerico(low[sel]), numerico(high[sel]), numerico(firm[sel])
+        con_lo, con_hi = limite_activo(lo), limite_activo(hi)
+        return con_lo | con_hi, np.isnan(f), con_lo & (f < lo), con_hi & (f > hi)
+
+    def _firmeza(sel):
+        aplica, sin_dato, bajo, alto = _firmeza_partes(sel)
+        return aplica, aplica & (sin_dato | bajo | alto)
+
+    def _firmeza_mensajes(pos):
+        _, sin_dato, bajo, alto = _firmeza_partes(pos)
+        mensajes = []
+        for f, lo, hi, s, b, a in zip(firm[pos], low[pos], high[pos], sin_dato, bajo, alto):
+            if s:
+                mensajes.append("Firmeza sin dato")
+            else:
+                partes = [f"Firmeza {f} < {lo}"] if b else []
+                partes += [f"Firmeza {f} > {hi}"] if a else []
+                mensajes.append("; ".join(partes))
+        return mensajes
+
+    reglas.append(Regla("Firmeza", _firmeza, _firmeza_mensajes))
+
+    cmin = crudo(bloque, "PORC_COLOR CUBRIMIENTO MIN")
+
+    def _color(sel):
+        minimo = numerico(cmin[sel])
+        aplica = limite_activo(minimo)
+        return aplica, aplica & (color_ok_pct[sel] < minimo)
+
+    reglas.append(
+        Regla(
+            "Color",
+            _color,
+            lambda pos: [f"Color {p:.1f}% < {c}%" for p, c in zip(color_ok_pct[pos], cmin[pos])],
+        ),
+    )
+
+    for tol_name, nect_name, _cat in defect_map:
+        tol_raw, x_raw = crudo(bloque, tol_name), crudo(bloque, nect_name)
+
+        def _defecto(sel, tol_raw=tol_raw, x_raw=x_raw):
+            tol, x = numerico(tol_raw[sel]), numerico(x_raw[sel])
+            aplica = ~np.isnan(tol)
+            return aplica, aplica & ~np.isnan(x) & (x > tol)
+
+        reglas.append(
+            Regla(
+                tol_name,
+                _defecto,
+                lambda pos, t=tol_name, x=x_raw, v=tol_raw: [
+                    f"{t}: {a} > {b}" for a, b in zip(x[pos], v[pos])
+                ],
+            ),
+        )
+
+    for nombre, suma in (("CONDICION", suma_cond), ("CALIDAD", suma_cali)):
+        lim_raw = crudo(bloque, f"SUMATORIA {nombre}")
+
+        def _sumatoria(sel, suma=suma, lim_raw=lim_raw):
+            lim = numerico(lim_raw[sel])
+            aplica = limite_activo(lim)
+            return aplica, aplica & (suma[sel] > lim)
+
+        reglas.append(
+            Regla(
+                f"Sum {nombre}",
+                _sumatoria,
+                lambda pos, s=suma, lr=lim_raw, nm=nombre: [
+                    f"Sum {nm} {float(a)} > {b}" for a, b in zip(s[pos], lr[pos])
+                ],
+            ),
+        )
+    return reglas
+
+
+def evaluar_reglas(reglas, n, orden=None, mensajes=True):
+    """Aplica las reglas a las n filas de un bloque.
+
+    Sin orden evalúa todas las reglas en todas las filas y RAZONES acumula cada
+    falla en el orden del motor por filas. Con orden (nombres, de la regla más
+    selectiva a la menos) evalúa cada regla solo en los pares que aún pasan: un
+    par rechazado no se sigue evaluando y RAZONES tiene solo su primera falla.
+
+    Returns:
+        dict con 'pasa' (bool), 'razones' (str, vacío si mensajes=False),
+        'aplica' y 'falla' (bool, filas x reglas)
+
+    """
+    with np.errstate(invalid="ignore"):
+        pasa = np.ones(n, dtype=bool)
+        razones = np.full(n, "", dtype=object)
+        aplica = np.zeros((n, len(reglas)), dtype=bool)
+        falla = np.zeros((n, len(reglas)), dtype=bool)
+
+        if orden is None:
+            for j, regla in enumerate(reglas):
+                aplica[:, j], falla[:, j] = regla.evaluar(slice(None))
+                pasa &= ~falla[:, j]
+                pos = np.flatnonzero(falla[:, j])
+                if mensajes and len(pos):
+                    previas = razones[pos]
+                    razones[pos] = [
+                        m if not p else f"{p}; {m}" for p, m in zip(previas, regla.mensajes(pos))
+                    ]
+            return {"pasa": pasa, "razones": razones, "aplica": aplica, "falla": falla}
+
+        rango = {nombre: i for i, nombre in enumerate(orden)}
+        secuencia = sorted(
+            range(len(reglas)), key=lambda j: rango.get(reglas[j].nombre, len(rango))
+        )
+        vivos = np.arange(n)
+        for j in secuencia:
+            if len(vivos) == 0:
+                break
+            aplica[vivos, j], fallan = reglas[j].evaluar(vivos)
+            pos = vivos[fallan]
+            falla[pos, j] = True
+            pasa[pos] = False
+            if mensajes and len(pos):
+                razones[pos] = reglas[j].mensajes(pos)
+            vivos = vivos[~fallan]
+    return {"pasa": pasa, "razones": razones, "aplica": aplica, "falla": falla}
+
+
+def tabla_estadisticas(mercados, nombres, aplica, falla, potencial, unica=True):
+    """Estadísticas por (REGLA, MERCADO-CLIENTE) de un bloque, con reducciones por columna.
+
+    Args:
+        mercados: MERCADO-CLIENTE de cada par
+        nombres: nombre de cada regla (columnas de aplica/falla)
+        aplica, falla: matrices bool pares x reglas (ver evaluar_reglas)
+        potencial: kilos que asignaría cada par si pasara las reglas
+        unica: si es False (modo adaptativo) UNICA y KG_UNICA quedan en NaN
+
+    """
+    codigos, mcs = pd.factorize(pd.Series(mercados), sort=False)
+    k = len(mcs)
+    sola = falla & (falla.sum(axis=1) == 1)[:, None]
+    filas = []
+    for j, nombre in enumerate(nombres):
+        medidas = {
+            "EVALUADOS": np.bincount(codigos, weights=aplica[:, j], minlength=k),
+            "FALLIDOS": np.bincount(codigos, weights=falla[:, j], minlength=k),
+            "KG_PERDIDOS": np.bincount(
+                codigos, weights=np.where(falla[:, j], potencial, 0.0), minlength=k
+            ),
+            "UNICA": np.bincount(codigos, weights=sola[:, j], minlength=k),
+            "KG_UNICA": np.bincount(
+                codigos, weights=np.where(sola[:, j], potencial, 0.0), minlength=k
+            ),
+        }
+        if not unica:
+            medidas["UNICA"] = medidas["KG_UNICA"] = np.full(k, np.nan)
+        filas.append(pd.DataFrame({"REGLA": nombre, "MERCADO-CLIENTE": mcs, **medidas}))
+    if not filas:
+        return pd.DataFrame(columns=["REGLA", "MERCADO-CLIENTE", *MEDIDAS])
+    return pd.concat(filas, ignore_index=True)
+
+
+def combinar_estadisticas(tablas):
+    """Suma las estadísticas de varios bloques (UNICA sigue en NaN si algún bloque no la midió)."""
+    tabla = pd.concat(tablas, ignore_index=True)
+    g = tabla.groupby(["REGLA", "MERCADO-CLIENTE"], sort=False)
+    sumas = g[MEDIDAS].sum()
+    unicas = ["UNICA", "KG_UNICA"]
+    sumas[unicas] = sumas[unicas].where(g[unicas].count().eq(g.size(), axis=0))
+    sumas = sumas.reset_index()
+    for m in ("EVALUADOS", "FALLIDOS", "UNICA"):
+        if sumas[m].notna().all():
+            sumas[m] = sumas[m].astype(int)
+    return sumas
+
+
+def resumen_reglas(estadisticas):
+    """Estadísticas por regla (todas los MCs), de la regla que más pares rechaza a la que menos.
+
+    Returns:
+        DataFrame con REGLA, las MEDIDAS y TASA_FALLO (FALLIDOS / EVALUADOS)
+
+    """
+    resumen = estadisticas.groupby("REGLA", sort=False, as_index=False)[MEDIDAS].sum(min_count=1)
+    resumen["TASA_FALLO"] = resumen["FALLIDOS"] / resumen["EVALUADOS"].where(
+        resumen["EVALUADOS"] > 0,
+    )
+    return resumen.sort_values("FALLIDOS", ascending=False, kind="stable").reset_index(drop=True)
+
+
+def orden_selectividad(estadisticas):
+    """Nombres de regla de la que más pares rechaza a la que menos (orden del modo adaptativo)."""
+    return resumen_reglas(estadisticas)["REGLA"].tolist()
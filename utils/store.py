@@ -0,0 +1,154 @@
+"""Almacén persistente de resultados, direccionado por contenido"""
+
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+from pathlib import Path
+
+import pandas as pd
+
+META = "meta.json"
+
+
+class ResultStore:
+    """Directorio de resultados en Parquet, una carpeta por entrada.
+
+    La clave de cada entrada es un id derivado de los hashes de los archivos de
+    entrada y de los parámetros (ver utils.cache.run_id), por lo que repetir un
+    análisis con los mismos datos encuentra el resultado ya guardado.
+
+    Cada carpeta contiene un Parquet por tabla (`<seccion>__<tabla>.parquet`) y
+    meta.json con la metadata de la entrada. El último acceso se registra en la
+    fecha de modificación de meta.json; al superar max_bytes se eliminan las
+    entradas usadas hace más tiempo (LRU).
+    """
+
+    def __init__(self, root=".carozos_store", max_bytes=512 * 2**20):
+        self.root = Path(root)
+        self.max_bytes = int(max_bytes)
+        self._lock = threading.Lock()
+
+    def _dir(self, entry_id):
+        return self.root / str(entry_id)
+
+    def __contains__(self, entry_id):
+        return (self._dir(entry_id) / META).exists()
+
+    def get(self, entry_id):
+        """Devuelve {seccion: {tabla: DataFrame}} o None si la entrada no existe."""
+        carpeta = self._dir(entry_id)
+        meta_path = carpeta / META
+        try:
+            meta = json.loads(meta_path.read_text(encoding="utf-8"))
+            secciones = {}
+            for seccion, tablas in meta["tablas"].items():
+                secciones[seccion] = {
+                    tabla: pd.read_parquet(carpeta / f"{seccion}__{tabla}.parquet")
+                    for tabla in tablas
+                }
+            os.utime(meta_path)
+        except (FileNotFoundError, KeyError, json.JSONDecodeError):
+            return None
+        return secciones
+
+    def put(self, entry_id, secciones, meta=None):
+        """Guarda {seccion: {tabla: DataFrame}} con su metadata y aplica el presupuesto.
+
+        La entrada se escribe en una carpeta temporal y se renombra al final,
+        así un lector nunca ve una entrada a medio escribir.
+        """
+        self.root.mkdir(parents=True, exist_ok=True)
+        tmp = self.root / f".tmp-{entry_id}-{uuid.uuid4().hex[:6]}"
+        tmp.mkdir()
+        try:
+            tablas = {}
+            for seccion, dfs in secciones.items():
+                tablas[seccion] = []
+                for tabla, df in dfs.items():
+                    if isinstance(df, pd.DataFrame):
+                        df.to_parquet(tmp / f"{seccion}__{tabla}.parquet")
+                        tablas[seccion].append(tabla)
+            bytes_total = sum(f.stat().st_size for f in tmp.iterdir())
+            meta = {
+                **(meta or {}),
+                "id": str(entry_id),
+                "creado": time.strftime("%Y-%m-%d %H:%M:%S"),
+                "bytes": bytes_total,
+                "tablas": tablas,
+            }
+            (tmp / META).write_text(
+                json.dumps(meta, ensure_ascii=False, indent=2, default=str),
+                encoding="utf-8",
+            )
+            with self._lock:
+                destino = self._dir(entry_id)
+                if destino.exists():
+                    shutil.rmtree(destino, ignore_errors=True)
+                tmp.rename(destino)
+        finally:
+            shutil.rmtree(tmp, ignore_errors=True)
+        self.evict()
+
+    def entries(self):
+        """Metadata de todas las entradas, con 'ultimo_acceso', de la más reciente a la más antigua."""
+        if not self.root.exists():
+            return []
+        out = []
+        for meta_path in self.root.glob(f"*/{META}"):
+            try:
+                meta = json.loads(meta_path.read_text(encoding="utf-8"))
+                meta["ultimo_acceso"] = meta_path.stat().st_mtime
+            except (FileNotFoundError, json.JSONDecodeError):
+                continue
+            out.append(meta)
+        return sorted(out, key=lambda m: m["ultimo_acceso"], reverse=True)
+
+    def list_runs(self, **filtros):
+        """DataFrame con las entradas (una fila por entrada) que cumplen los filtros.
+
+        Ej.: store.list_runs(tipo="clusters", especie="Durazno Blanco")
+        """
+        filas = [
+            {k: v for k, v in m.items() if k != "tablas"}
+            for m in self.entries()
+            if all(m.get(k) == v for k, v in filtros.items())
+        ]
+        df = pd.DataFrame(filas)
+        if not df.empty:
+            df["ultimo_acceso"] = pd.to_datetime(df["ultimo_acceso"], unit="s").dt.floor("s")
+        return df
+
+    def size(self):
+        return sum(m.get("bytes", 0) for m in self.entries())
+
+    def discard(self, entry_id):
+        with self._lock:
+            shutil.rmtree(self._dir(entry_id), ignore_errors=True)
+
+    def evict(self):
+        """Elimina las entradas menos usadas hasta quedar bajo max_bytes. Devuelve cuántas."""
+        entradas = self.entries()
+        total = sum(m.get("bytes", 0) for m in entradas)
+        eliminadas = 0
+        for meta in reversed(entradas):
+            if total <= self.max_bytes:
+                break
+            self.discard(meta["id"])
+            total -= meta.get("bytes", 0)
+            eliminadas += 1
+        return eliminadas
+
+    def clear(self):
+        for meta in self.entries():
+            self.discard(meta["id"])
+
+    def stats(self):
+        entradas = self.entries()
+        return {
+            "entradas": len(entradas),
+            "bytes": sum(m.get("bytes", 0) for m in entradas),
+            "max_bytes": self.max_bytes,
+        }
@@ -0,0 +1,210 @@
+"""Tolerancias consolidadas (Tolerancias_Total_Dividido.xlsx) como almacén en memoria
+
+El archivo consolidado tiene en una sola hoja (TOTAL NORM) las tolerancias de
+todas las especies. Se lee y normaliza una vez por versión del archivo; las
+filas quedan ordenadas por (ESPECIE, LINEA PRODUCTO) y cada partición es un
+rango contiguo, así que la porción de una especie o línea es una vista
+(df.iloc[a:b]) que comparte memoria con el almacén, sin copiar datos.
+
+Las columnas quedan con el layout de los archivos por especie (MERCADO y
+CLIENTE ya están en MERCADO-CLIENTE). verificar_consolidado() compara el
+consolidado con los archivos Tolerancia_*.xlsx de cada especie.
+"""
+
+import threading
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from .helpers import norm_cols
+from .numeros import a_numero
+
+HOJA_TOLERANCIAS_TOTAL = "TOTAL NORM"
+CLAVES = ["ESPECIE", "LINEA PRODUCTO"]
+# Columnas de texto: todas las demás son límites numéricos
+COLUMNAS_TEXTO = ["MERCADO-CLIENTE", *CLAVES]
+# Columnas del consolidado que no están en los archivos por especie
+COLUMNAS_EXTRA = ["MERCADO", "CLIENTE"]
+
+
+class ToleranciasConsolidadas:
+    """Hoja consolidada particionada por (ESPECIE, LINEA PRODUCTO).
+
+    Args:
+        tolerancias: hoja TOTAL NORM tal como se lee del Excel
+
+    """
+
+    def __init__(self, tolerancias):
+        tol = norm_cols(tolerancias.copy())
+        tol = tol.drop(columns=[c for c in COLUMNAS_EXTRA if c in tol.columns])
+        for col in CLAVES:
+            if col not in tol.columns:
+                raise ValueError(
+                    f"Columna '{col}' no encontrada en las tolerancias consolidadas. "
+                    f"Columnas disponibles: {list(tol.columns)}",
+                )
+            tol[col] = tol[col].astype(str).str.strip()
+        # Límites como número una sola vez (normalizar_tolerancias ya no los reconvierte)
+        for col in tol.columns:
+            if col not in COLUMNAS_TEXTO:
+                tol[col] = a_numero(tol[col])
+        # Orden estable: dentro de cada partición se mantiene el orden del archivo
+        self.df = tol.sort_values(CLAVES, kind="stable").reset_index(drop=True)
+        self.particiones = {
+            clave: (int(pos[0]), int(pos[-1]) + 1)
+            for clave, pos in self.df.groupby(CLAVES, sort=False).indices.items()
+        }
+
+    def claves(self):
+        """Pares (ESPECIE, LINEA PRODUCTO) del consolidado, en orden."""
+        return list(self.particiones)
+
+    def vista(self, claves):
+        """Filas de los pares indicados; vista sin copia si forman un rango contiguo.
+
+        Args:
+            claves: pares (ESPECIE, LINEA PRODUCTO); los que no existen se ignoran
+
+        Returns:
+            DataFrame (vista del almacén si los rangos son contiguos, copia si no)
+
+        """
+        rangos = sorted(self.particiones[c] for c in dict.fromkeys(claves) if c in self.particiones)
+        if not rangos:
+            return self.df.iloc[0:0]
+        unidos = [list(rangos[0])]
+        for a, b in rangos[1:]:
+            if a == unidos[-1][1]:
+                unidos[-1][1] = b
+            else:
+                unidos.append([a, b])
+        if len(unidos) == 1:
+            return self.df.iloc[unidos[0][0] : unidos[0][1]]
+        return pd.concat([self.df.iloc[a:b] for a, b in unidos])
+
+    def para_lotes(self, lotes):
+        """Tolerancias de los pares (ESPECIE, LINEA PRODUCTO) presentes en lotes.
+
+        Raises:
+            ValueError: si ningún par de lotes está en el consolidado
+
+        """
+        pares = [
+            (str(e).strip(), str(linea).strip())
+            for e, linea in lotes[CLAVES].drop_duplicates().itertuples(index=False, name=None)
+        ]
+        tolerancias = self.vista(pares)
+        if tolerancias.empty:
+            raise ValueError(
+                f"Las tolerancias consolidadas no tienen ninguna de las líneas {pares}. "
+                f"Disponibles: {self.claves()}",
+            )
+        return tolerancias
+
+
+_almacenes = {}
+_almacenes_lock = threading.Lock()
+
+
+def tolerancias_consolidadas(path):
+    """Almacén del archivo consolidado, leído una vez por versión del archivo.
+
+    La clave es (ruta, tamaño, mtime): si el archivo cambia se vuelve a leer y
+    la versión anterior se descarta.
+    """
+    path = Path(path).resolve()
+    st = path.stat()
+    clave = (path, st.st_size, st.st_mtime_ns)
+    with _almacenes_lock:
+        almacen = _almacenes.get(clave)
+        if almacen is None:
+            almacen = ToleranciasConsolidadas(
+                pd.read_excel(path, sheet_name=HOJA_TOLERANCIAS_TOTAL),
+            )
+            for previa in [k for k in _almacenes if k[0] == path]:
+                del _almacenes[previa]
+            _almacenes[clave] = almacen
+    return almacen
+
+
+def _comparar(especie, separado, consolidado):
+    """Filas de diferencias (por celda) entre las tolerancias de una especie y su porción."""
+    celdas = []
+    sep = separado.drop_duplicates("MERCADO-CLIENTE").set_index("MERCADO-CLIENTE")
+    con = consolidado.drop_duplicates("MERCADO-CLIENTE").set_index("MERCADO-CLIENTE")
+    comunes_mc = sep.index.intersection(con.index)
+    for col in sep.columns.intersection(con.columns).difference(CLAVES, sort=False):
+        a = a_numero(sep.loc[comunes_mc, col]).to_numpy(dtype=float)
+        b = con.loc[comunes_mc, col].to_numpy(dtype=float)
+        distintas = ~((a == b) | (np.isnan(a) & np.isnan(b)))
+        celdas.extend(
+            {
+                "ESPECIE": especie,
+                "MERCADO-CLIENTE": mc,
+                "COLUMNA": col,
+                "ARCHIVO_ESPECIE": va,
+                "CONSOLIDADO": vb,
+            }
+            for mc, va, vb in zip(comunes_mc[distintas], a[distintas], b[distintas])
+        )
+    return celdas
+
+
+def verificar_consolidado(base_dir=None, path=None):
+    """Compara el consolidado con los archivos de tolerancias de cada especie.
+
+    Args:
+        base_dir: directorio base (default: Path("."))
+        path: archivo consolidado (default: base_dir / F_TOLERANCIAS_TOTAL)
+
+    Returns:
+        dict con:
+            - 'resumen': una fila por especie con FILAS_ESPECIE, FILAS_CONSOLIDADO,
+              MC_SOLO_ESPECIE, MC_SOLO_CONSOLIDADO, CELDAS_DISTINTAS y ESTADO
+              ('ok', 'diferencias', 'sin líneas' o 'sin archivo')
+            - 'celdas': una fila por celda distinta (ESPECIE, MERCADO-CLIENTE,
+              COLUMNA, ARCHIVO_ESPECIE, CONSOLIDADO)
+
+    """
+    from .data_loader import ESPECIES_CONFIG, F_TOLERANCIAS_TOTAL
+
+    base_dir = Path() if base_dir is None else Path(base_dir)
+    almacen = tolerancias_consolidadas(base_dir / F_TOLERANCIAS_TOTAL if path is None else path)
+    filas, celdas = [], []
+    for especie, config in ESPECIES_CONFIG.items():
+        fila = {"ESPECIE": especie, "LINEAS": ""}
+        archivo = base_dir / config["tolerancias"]
+        if not archivo.exists():
+            filas.append({**fila, "ESTADO": "sin archivo"})
+            continue
+        separado = norm_cols(pd.read_excel(archivo))
+        pares = list(
+            dict.fromkeys(
+                (str(e).strip(), str(linea).strip())
+                for e, linea in separado[CLAVES].itertuples(index=False, name=None)
+            ),
+        )
+        consolidado = almacen.vista(pares)
+        mcs_sep = set(separado["MERCADO-CLIENTE"].astype(str))
+        mcs_con = set(consolidado["MERCADO-CLIENTE"].astype(str))
+        diferencias = _comparar(especie, separado, consolidado) if len(consolidado) else []
+        celdas.extend(diferencias)
+        fila.update(
+            LINEAS=", ".join(f"{e}/{linea}" for e, linea in pares),
+            FILAS_ESPECIE=len(separado),
+            FILAS_CONSOLIDADO=len(consolidado),
+            MC_SOLO_ESPECIE=len(mcs_sep - mcs_con),
+            MC_SOLO_CONSOLIDADO=len(mcs_con - mcs_sep),
+            CELDAS_DISTINTAS=len(diferencias),
+        )
+        if consolidado.empty:
+            fila["ESTADO"] = "sin líneas"
+        elif diferencias or mcs_sep != mcs_con or len(separado) != len(consolidado):
+            fila["ESTADO"] = "diferencias"
+        else:
+            fila["ESTADO"] = "ok"
+        filas.append(fila)
+    columnas = ["ESPECIE", "MERCADO-CLIENTE", "COLUMNA", "ARCHIVO_ESPECIE", "CONSOLIDADO"]
+    return {"resumen": pd.DataFrame(filas), "celdas": pd.DataFrame(celdas, columns=columnas)}
@@ -0,0 +1,177 @@
+"""Vigilancia de los archivos de entrada (Data/, Disminucion, Cruce) para invalidar la caché
+
+Los analistas reemplazan Lotes_*.xlsx y Tolerancia_*.xlsx durante el día. Las
+claves de PipelineCache ya incluyen los hashes de los archivos, así que nunca
+se sirve un resultado de otra versión; lo que hace InputWatcher es enterarse
+del cambio sin esperar al próximo clic: descarta de memoria (y opcionalmente
+del store) solo lo que dependía de la versión anterior y, si se pide,
+reconstruye en segundo plano la carga y los análisis descartados.
+
+Un archivo de especie (lotes, tolerancias) afecta solo a su especie; los
+compartidos (F_DISMINUCION, F_CRUCE, y el consolidado con
+tolerancias='consolidado') afectan a todas. La vigilancia es por polling: un
+stat por archivo en cada intervalo, y el hash de contenido solo cuando cambia
+el tamaño o la fecha de modificación (sin dependencias de inotify). Un
+archivo modificado se procesa cuando su tamaño y fecha se repiten en dos
+revisiones seguidas, así no se lee una copia a medio escribir.
+"""
+
+import threading
+import time
+import zipfile
+from collections import deque
+
+from .cache import file_hash
+from .data_loader import get_especies_disponibles, input_files
+
+
+def _firma(path):
+    """(tamaño, mtime) del archivo, o None si no existe."""
+    try:
+        st = path.stat()
+    except FileNotFoundError:
+        return None
+    return st.st_size, st.st_mtime_ns
+
+
+class InputWatcher:
+    """Vigila los archivos de entrada de un PipelineCache e invalida lo que depende de ellos.
+
+    Args:
+        pipeline: utils.cache.PipelineCache a invalidar
+        intervalo: segundos entre revisiones (start)
+        reconstruir: si es True, tras invalidar recarga las especies afectadas y
+            re-ejecuta los análisis que estaban en memoria
+        descartar_store: si es True, descarta además los análisis guardados con
+            la versión anterior (ver PipelineCache.invalidar)
+        on_cambio: callback opcional on_cambio(evento) tras cada cambio procesado
+        especies: especies a vigilar (default: todas)
+
+    """
+
+    def __init__(
+        self,
+        pipeline,
+        intervalo=5.0,
+        reconstruir=False,
+        descartar_store=False,
+        on_cambio=None,
+        especies=None,
+    ):
+        self.pipeline = pipeline
+        self.intervalo = float(intervalo)
+        self.reconstruir = reconstruir
+        self.descartar_store = descartar_store
+        self.on_cambio = on_cambio
+        self.especies = get_especies_disponibles() if especies is None else list(especies)
+        # ruta -> (firma, hash) de la última revisión
+        self._vistos = {}
+        # ruta -> firma nueva vista una vez, a la espera de repetirse
+        self._pendientes = {}
+        self.eventos = deque(maxlen=20)
+        self._lock = threading.Lock()
+        self._detener = threading.Event()
+        self._hilo = None
+
+    def dependencias(self):
+        """{ruta: [(especie, nombre)]}: qué especies usan cada archivo y con qué nombre."""
+        dependencias = {}
+        for especie in self.especies:
+            archivos = input_files(especie, self.pipeline.base_dir, self.pipeline.tolerancias)
+            for nombre, ruta in archivos.items():
+                dependencias.setdefault(ruta, []).append((especie, nombre))
+        return dependencias
+
+    def revisar(self):
+        """Una revisión: detecta archivos cambiados, invalida y (opcional) reconstruye.
+
+        La primera revisión solo registra el estado actual de los archivos; un
+        cambio se procesa en la revisión en que su firma se repite.
+
+        Returns:
+            dict del evento ('hora', 'archivos', 'especies', 'descartadas' y, con
+            reconstruir, 'reconstruccion'), o None si nada cambió
+
+        """
+        with self._lock:
+            cambios, archivos = {}, []
+            for ruta, usos in self.dependencias().items():
+                firma = _firma(ruta)
+                previo = self._vistos.get(ruta)
+                if previo is not None and previo[0] == firma:
+                    self._pendientes.pop(ruta, None)
+                    continue
+                if previo is not None and self._pendientes.get(ruta) != firma:
+                    self._pendientes[ruta] = firma
+                    continue
+                self._pendientes.pop(ruta, None)
+                h = file_hash(ruta) if firma is not None else None
+                self._vistos[ruta] = (firma, h)
+                # Primera vez, o fecha cambiada con el mismo contenido
+                if previo is None or previo[1] == h:
+                    continue
+                archivos.append(str(ruta))
+                if previo[1] is not None:
+                    for especie, nombre in usos:
+                        cambios.setdefault(especie, {})[nombre] = previo[1]
+            if not archivos:
+                return None
+
+            invalidadas = self.pipeline.invalidar(cambios, store=self.descartar_store)
+            runs = invalidadas.pop("runs")
+            evento = {
+                "hora": time.time(),
+                "archivos": archivos,
+                "especies": sorted(cambios),
+                "descartadas": invalidadas,
+            }
+            if self.reconstruir and cambios:
+                evento["reconstruccion"] = self._reconstruir(sorted(cambios), runs)
+            self.eventos.append(evento)
+        if self.on_cambio is not None:
+            self.on_cambio(evento)
+        return evento
+
+    def _reconstruir(self, especies, runs):
+        """Recarga las especies y re-ejecuta los análisis descartados con los archivos nuevos."""
+        t0 = time.perf_counter()
+        warm = self.pipeline.warm(especies)
+        errores = {}
+        for params in runs:
+            try:
+                self.pipeline.run(**params)
+            except (FileNotFoundError, ValueError, KeyError, zipfile.BadZipFile) as e:
+                errores[f"{params['especie']} | {params['linea_producto']}"] = str(e)
+        return {
+            "segundos": time.perf_counter() - t0,
+            "carga": {especie: info["origen"] for especie, info in warm["especies"].items()},
+            "runs": len(runs) - len(errores),
+            "errores": errores,
+        }
+
+    def start(self):
+        """Revisa cada `intervalo` segundos en un hilo de fondo (daemon)."""
+        if self._hilo is not None and self._hilo.is_alive():
+            return self
+        self._detener.clear()
+        self.revisar()
+        self._hilo = threading.Thread(target=self._loop, name="InputWatcher", daemon=True)
+        self._hilo.start()
+        return self
+
+    def _loop(self):
+        while not self._detener.wait(self.intervalo):
+            try:
+                self.revisar()
+            except (OSError, zipfile.BadZipFile):
+                # Archivo a medio copiar o bloqueado: se reintenta en la próxima revisión
+                continue
+
+    def stop(self):
+        self._detener.set()
+        if self._hilo is not None:
+            self._hilo.join()
+            self._hilo = None
+
+    def ultimo_evento(self):
+        return self.eventos[-1] if self.eventos else None